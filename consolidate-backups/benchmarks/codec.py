@@ -0,0 +1,122 @@
+"""
+Compare apischema with the hand-written codec when decoding backups.
+
+Usage: python -m benchmarks.codec [--records N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from apischema import deserialize
+
+from src.codec import decode_backup, use_aliases_in_apischema
+from src.model import Backup, CompletedActivity, JsonDict
+
+
+@dataclass(frozen=True)
+class UnslottedCompletedActivity:
+    """Same as CompletedActivity, but without __slots__ like it used to be"""
+
+    id: str
+    activity_id: str
+    date: datetime.datetime
+    duration: str
+    intensity: str
+    notes: str
+    last_modified: datetime.datetime | None = None
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--records", type=int, default=50_000)
+    return parser
+
+
+def build_backup_data(records: int) -> JsonDict:
+    start = datetime.datetime.fromisoformat("2020-01-01 00:00:00+00:00")
+    return {
+        "date": start.isoformat(),
+        "activities": [
+            {"id": "act_000001", "name": "name", "otherNames": [], "notes": None}
+        ],
+        "completedActivities": [
+            {
+                "id": f"cpa_{i:010d}",
+                "activityId": "act_000001",
+                "date": (start + datetime.timedelta(hours=i)).isoformat(),
+                "duration": "medium",
+                "intensity": "high",
+                "notes": f"note {i}",
+                "lastModified": (start + datetime.timedelta(hours=i)).isoformat(),
+            }
+            for i in range(records)
+        ],
+        "trainings": [],
+        "trainables": [],
+        "shortcuts": [],
+    }
+
+
+def measure_time(decode: Callable[[], Any], repeat: int = 3) -> float:
+    """Return the best elapsed seconds out of `repeat` runs"""
+    elapsed: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def measure_memory(build: Callable[[], Any]) -> int:
+    """Return the bytes retained by the result of `build`"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = build()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main(records: int) -> None:
+    data = build_backup_data(records=records)
+
+    use_aliases_in_apischema()
+    assert decode_backup(data) == deserialize(Backup, data)
+    apischema_time = measure_time(lambda: deserialize(Backup, data))
+    codec_time = measure_time(lambda: decode_backup(data))
+
+    # build both variants from the same field values, to only compare the size of
+    # the instances themselves
+    fields = [
+        (cpa.id, cpa.activity_id, cpa.date, cpa.duration, cpa.intensity, cpa.notes)
+        for cpa in decode_backup(data).completed_activities
+    ]
+    unslotted_size = measure_memory(
+        lambda: [UnslottedCompletedActivity(*values) for values in fields]
+    )
+    slotted_size = measure_memory(
+        lambda: [CompletedActivity(*values) for values in fields]
+    )
+
+    print(f"decoding a backup with {records} completed activities:")
+    print(f"  apischema: {apischema_time:.3f}s")
+    print(f"  codec:     {codec_time:.3f}s ({apischema_time / codec_time:.1f}x faster)")
+    print(f"memory retained by {records} completed activities:")
+    print(f"  without __slots__: {unslotted_size / 1024 / 1024:.1f} MiB")
+    print(
+        f"  with __slots__:    {slotted_size / 1024 / 1024:.1f} MiB"
+        f" ({1 - slotted_size / unslotted_size:.0%} less)"
+    )
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser().parse_args()
+    main(records=args.records)
@@ -0,0 +1,212 @@
+"""
+Generate a deterministic series of daily backups, as the webapp would export
+them over time, to benchmark the consolidation pipeline.
+
+Every day some completed activities are logged, some recent ones are edited and
+some are deleted. Optionally, completed activities older than a retention period
+are removed from the app, like the app used to do after backing them up.
+
+Usage: python -m benchmarks.generator --output-dir DIR [--days N] [--seed N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import random
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Iterator
+
+from src.codec import encode_backup
+from src.io import write_json
+from src.model import (
+    Activity,
+    Backup,
+    CompletedActivity,
+    Duration,
+    Intensity,
+    Trainable,
+    Training,
+    TrainingActivity,
+)
+
+DURATIONS: tuple[Duration, ...] = ("short", "medium", "long")
+INTENSITIES: tuple[Intensity, ...] = ("low", "medium", "high")
+DEFAULT_START = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@dataclass(frozen=True)
+class GeneratorConfig:
+    days: int = 365  # one backup per day
+    activities: int = 50
+    trainables: int = 20
+    trainings: int = 5
+    completed_activities_per_day: int = 5
+    edits_per_day: int = 1  # recent completed activities edited every day
+    deletions_per_day: float = 0.2  # on average, recent ones deleted every day
+    retention_days: int | None = None  # older completed activities are pruned
+    seed: int = 0
+    start: datetime.datetime = DEFAULT_START
+
+
+@dataclass(frozen=True)
+class GeneratedSeries:
+    backups: list[Backup]
+    deleted_ids: list[str]  # completed activities deleted by the user
+
+
+def _id(prefix: str, number: int) -> str:
+    return f"{prefix}_{number:010d}"
+
+
+def generate_backup_series(config: GeneratorConfig) -> GeneratedSeries:
+    """Backups are listed from the earliest to the latest"""
+    rng = random.Random(config.seed)
+
+    trainables = [
+        Trainable(
+            id=_id("tra", i),
+            name=f"trainable {i}",
+            notes=f"notes of trainable {i}",
+            last_modified=config.start,
+        )
+        for i in range(config.trainables)
+    ]
+    activities = [
+        Activity(
+            id=_id("act", i),
+            name=f"activity {i}",
+            other_names=[f"alias {i}"] if i % 3 == 0 else [],
+            last_modified=config.start,
+            trainable_ids=(
+                [trainable.id for trainable in rng.sample(trainables, k=2)]
+                if len(trainables) >= 2
+                else []
+            ),
+            notes="",
+        )
+        for i in range(config.activities)
+    ]
+    trainings = [
+        Training(
+            id=_id("trn", i),
+            name=f"training {i}",
+            activities=[
+                TrainingActivity(
+                    activityId=activity.id,
+                    duration=rng.choice(DURATIONS),
+                    intensity=rng.choice(INTENSITIES),
+                )
+                for activity in rng.sample(activities, k=min(3, len(activities)))
+            ],
+            last_modified=config.start,
+            is_oneoff=False,
+        )
+        for i in range(config.trainings)
+    ]
+    shortcuts = [activity.id for activity in activities[:5]]
+
+    # completed activities currently in the app, in insertion order
+    completed: dict[str, CompletedActivity] = {}
+    deleted_ids: list[str] = []
+    backups: list[Backup] = []
+    next_id = 0
+
+    for day in range(config.days):
+        today = config.start + datetime.timedelta(days=day)
+
+        for _ in range(config.completed_activities_per_day):
+            date = today + datetime.timedelta(minutes=rng.randrange(24 * 60))
+            completed[_id("cpa", next_id)] = CompletedActivity(
+                id=_id("cpa", next_id),
+                activity_id=rng.choice(activities).id,
+                date=date,
+                duration=rng.choice(DURATIONS),
+                intensity=rng.choice(INTENSITIES),
+                notes="",
+                last_modified=date,
+            )
+            next_id += 1
+
+        # edits and deletions happen among the most recent completed activities,
+        # which are the ones inside the time range of the following backups
+        recent = list(completed)[-config.completed_activities_per_day * 7 :]
+        for id in rng.sample(recent, k=min(config.edits_per_day, len(recent))):
+            completed[id] = replace(
+                completed[id],
+                notes=f"edited on day {day}",
+                last_modified=today + datetime.timedelta(hours=23),
+            )
+        deletions = int(config.deletions_per_day) + (
+            rng.random() < config.deletions_per_day % 1
+        )
+        for id in rng.sample(recent, k=min(deletions, len(recent))):
+            del completed[id]
+            deleted_ids.append(id)
+
+        if config.retention_days is not None:
+            oldest = today - datetime.timedelta(days=config.retention_days)
+            for id in [id for id, cpa in completed.items() if cpa.date < oldest]:
+                del completed[id]
+
+        backups.append(
+            Backup(
+                date=today + datetime.timedelta(hours=23, minutes=59),
+                activities=activities,
+                completed_activities=list(completed.values()),
+                trainings=trainings,
+                trainables=trainables,
+                shortcuts=shortcuts,
+            )
+        )
+
+    return GeneratedSeries(backups=backups, deleted_ids=deleted_ids)
+
+
+def write_backup_series(backups: list[Backup], output_dir: Path) -> list[Path]:
+    """Write each backup with the same file name the webapp gives to backups"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths: list[Path] = []
+    for backup in backups:
+        path = output_dir / f"fitness-tracker__backup_{backup.date:%Y%m-%d-%H%M}.json"
+        write_json(path=path, data=encode_backup(backup))
+        paths.append(path)
+    return paths
+
+
+def iter_config_fields() -> Iterator[str]:
+    yield from (
+        name for name in GeneratorConfig.__dataclass_fields__ if name != "start"
+    )
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = GeneratorConfig()
+    for name in iter_config_fields():
+        default = getattr(defaults, name)
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            type=float if isinstance(default, float) else int,
+            default=default,
+        )
+
+
+def config_from_args(args: argparse.Namespace) -> GeneratorConfig:
+    return GeneratorConfig(
+        **{name: getattr(args, name) for name in iter_config_fields()}
+    )
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--output-dir", required=True)
+    add_config_arguments(parser)
+    return parser
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser().parse_args()
+    series = generate_backup_series(config_from_args(args))
+    paths = write_backup_series(series.backups, output_dir=Path(args.output_dir))
+    print(f"{len(paths)} backups written to {args.output_dir}")
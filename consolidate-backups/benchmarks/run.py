@@ -0,0 +1,290 @@
+"""
+Measure the time and peak memory of each stage of the consolidation pipeline on
+a generated series of backups, and compare them against a stored baseline.
+
+Usage: python -m benchmarks.run [--days N] [--save-baseline] [--tolerance 0.2]
+
+Exits with status 1 if any stage is slower, or uses more memory, than the
+baseline by more than the tolerance.
+
+Timings depend on the machine, so the baseline stores them relative to a
+reference workload, timed on each run: a baseline saved on one machine can be
+compared against on another, within the noise of that scaling.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.generator import (
+    GeneratorConfig,
+    add_config_arguments,
+    config_from_args,
+    generate_backup_series,
+    iter_config_fields,
+    write_backup_series,
+)
+from src.cli.consolidate import _consolidate
+from src.domain import Decision, Decisions, is_backup_corrupted, merge_backups
+from src.export import export_tables, iter_backup_records
+from src.io import read_backup_file
+from src.sqlite import bulk_load_backup
+
+DEFAULT_BASELINE_PATH = Path(__file__).parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.2  # 20% worse than the baseline is a regression
+# below these, differences are noise rather than regressions
+MIN_SECONDS = 0.01
+MIN_PEAK_MIB = 1.0
+
+
+@dataclass(frozen=True)
+class StageResult:
+    seconds: float
+    peak_mib: float
+
+
+def _reference_workload() -> None:
+    # pure Python work like that of the stages: building, serializing, parsing
+    # and sorting records
+    records = [{"id": f"cpa_{i:06d}", "notes": str(i) * 8} for i in range(20_000)]
+    sorted(json.loads(json.dumps(records)), key=lambda record: record["notes"])
+
+
+def time_reference(repeat: int) -> float:
+    """Time the best of `repeat` runs of the reference workload"""
+    elapsed: list[float] = []
+    for _ in range(max(repeat, 3)):
+        start = time.perf_counter()
+        _reference_workload()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def measure(stage: Callable[[], Any], repeat: int) -> StageResult:
+    """
+    Time the best of `repeat` runs, then run the stage once more under
+    tracemalloc, which slows it down, to find its peak memory
+    """
+    elapsed: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        elapsed.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return StageResult(seconds=min(elapsed), peak_mib=peak / 1024 / 1024)
+
+
+def run_stages(
+    config: GeneratorConfig, work_dir: Path, repeat: int
+) -> dict[str, StageResult]:
+    results: dict[str, StageResult] = {}
+
+    series = generate_backup_series(config)
+    backups_dir = work_dir / "backups"
+    results["generate"] = measure(
+        lambda: write_backup_series(series.backups, output_dir=backups_dir), repeat
+    )
+    paths = sorted(backups_dir.glob("fitness-tracker__*.json"))
+
+    results["read_backup_file"] = measure(
+        lambda: [read_backup_file(path=path) for path in paths], repeat
+    )
+    backups = [read_backup_file(path=path) for path in paths]
+
+    results["is_backup_corrupted"] = measure(
+        lambda: [is_backup_corrupted(backup=backup) for backup in backups], repeat
+    )
+
+    reviewed_at = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    def build_decisions() -> Decisions:
+        # every deletion is already decided, so that no stage prompts the user
+        return Decisions(
+            decisions=[
+                Decision(id=id, reviewed_at=reviewed_at, must_be_deleted=True)
+                for id in series.deleted_ids
+            ],
+            path=work_dir / "decisions.csv",
+        )
+
+    results["merge_backups"] = measure(
+        lambda: merge_backups(
+            a=backups[-2], b=backups[-1], decisions=build_decisions()
+        ),
+        repeat,
+    )
+    results["consolidate"] = measure(
+        lambda: _consolidate(
+            backups=backups, decisions=build_decisions(), interactive=False
+        ),
+        repeat,
+    )
+    consolidated, _ = _consolidate(
+        backups=backups, decisions=build_decisions(), interactive=False
+    )
+
+    def load_sqlite() -> None:
+        path = work_dir / "backup.sqlite"
+        path.unlink(missing_ok=True)
+        db = sqlite3.connect(path, isolation_level=None)
+        try:
+            bulk_load_backup(db=db, backup=consolidated)
+        finally:
+            db.close()
+
+    results["sqlite"] = measure(load_sqlite, repeat)
+    results["csv"] = measure(
+        lambda: export_tables(
+            records=iter_backup_records(consolidated),
+            output_dir=work_dir,
+            prefix="backup",
+        ),
+        repeat,
+    )
+
+    return results
+
+
+def compare(
+    results: dict[str, StageResult],
+    baseline: dict[str, StageResult],
+    tolerance: float,
+) -> list[str]:
+    """Print a comparison table and return the regressions found"""
+    regressions: list[str] = []
+    print(f"{'stage':<20} {'seconds':>9} {'vs base':>8} {'peak MiB':>9} {'vs base':>8}")
+    for stage, result in results.items():
+        base = baseline.get(stage)
+        time_ratio = result.seconds / base.seconds if base else None
+        memory_ratio = result.peak_mib / base.peak_mib if base else None
+        print(
+            f"{stage:<20} {result.seconds:>9.3f} {_format_ratio(time_ratio):>8}"
+            f" {result.peak_mib:>9.1f} {_format_ratio(memory_ratio):>8}"
+        )
+        if time_ratio and time_ratio > 1 + tolerance and result.seconds > MIN_SECONDS:
+            regressions.append(f"{stage} is {time_ratio:.2f}x slower")
+        if (
+            memory_ratio
+            and memory_ratio > 1 + tolerance
+            and result.peak_mib > MIN_PEAK_MIB
+        ):
+            regressions.append(f"{stage} uses {memory_ratio:.2f}x more memory")
+    return regressions
+
+
+def _format_ratio(ratio: float | None) -> str:
+    return "-" if ratio is None else f"{ratio:.2f}x"
+
+
+def read_baseline(
+    path: Path, config: GeneratorConfig, reference_seconds: float
+) -> dict[str, StageResult] | None:
+    """
+    Read the baseline at `path`, with its timings scaled to this machine, where
+    the reference workload takes `reference_seconds`
+    """
+    if not path.exists():
+        return None
+
+    data = json.loads(path.read_text())
+    if data["config"] != _config_to_json(config):
+        print(f"ignoring baseline at {path}, it was measured with another config")
+        return None
+
+    return {
+        stage: StageResult(
+            seconds=result["relative_seconds"] * reference_seconds,
+            peak_mib=result["peak_mib"],
+        )
+        for stage, result in data["stages"].items()
+    }
+
+
+def write_baseline(
+    path: Path,
+    config: GeneratorConfig,
+    results: dict[str, StageResult],
+    reference_seconds: float,
+) -> None:
+    data = {
+        "config": _config_to_json(config),
+        # in multiples of the time taken by the reference workload
+        "stages": {
+            stage: {
+                "relative_seconds": result.seconds / reference_seconds,
+                "peak_mib": result.peak_mib,
+            }
+            for stage, result in results.items()
+        },
+    }
+    path.write_text(json.dumps(data, indent=2) + "\n")
+
+
+def _config_to_json(config: GeneratorConfig) -> dict[str, Any]:
+    return {name: getattr(config, name) for name in iter_config_fields()}
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    add_config_arguments(parser)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="timed runs per stage, the best counts"
+    )
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE_PATH))
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store these results as the new baseline",
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    return parser
+
+
+def main(args: argparse.Namespace) -> int:
+    config = config_from_args(args)
+    baseline_path = Path(args.baseline)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_stages(config=config, work_dir=Path(work_dir), repeat=args.repeat)
+    reference_seconds = time_reference(repeat=args.repeat)
+
+    if args.save_baseline:
+        write_baseline(
+            path=baseline_path,
+            config=config,
+            results=results,
+            reference_seconds=reference_seconds,
+        )
+        print(f"baseline written to {baseline_path}")
+        compare(results=results, baseline={}, tolerance=args.tolerance)
+        return 0
+
+    baseline = (
+        read_baseline(
+            path=baseline_path, config=config, reference_seconds=reference_seconds
+        )
+        or {}
+    )
+    regressions = compare(results=results, baseline=baseline, tolerance=args.tolerance)
+    for regression in regressions:
+        print(f"regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(_build_cli_parser().parse_args()))
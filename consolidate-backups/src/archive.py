@@ -0,0 +1,253 @@
+"""
+Archive of backups stored as a base snapshot plus, for every following backup,
+the records added, changed or removed since the previous one.
+
+Consecutive backups are almost identical, so the archive is orders of magnitude
+smaller than the backup files, and any of them can still be reconstructed
+exactly.
+
+The archive is a JSON lines file with one entry per backup, in the order they
+were archived. The first entry holds the whole backup, the rest only what
+changed, by section:
+
+    {"source": "fitness-tracker__backup_...", "date": "...", "base": {...}}
+    {"source": "...", "date": "...", "sections": {"completedActivities": {
+        "upserted": [{...}], "removed": ["cpa_..."]}}}
+
+Records are matched by id, and their position is only stored (as `order`) when
+it cannot be deduced from the previous backup. Sections that cannot be matched by
+id (e.g.: shortcuts, sections with duplicated ids or missing sections) are stored
+in full as `{"records": [...]}` whenever they change.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from src.codec import (
+    SECTION_DECODERS,
+    decode_backup,
+    decode_datetime,
+    encode_activity,
+    encode_backup,
+    encode_completed_activity,
+    encode_trainable,
+    encode_training,
+)
+from src.manifest import BackupFilename, FileHash
+from src.model import Backup, JsonDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_PATH = Path("fitness-tracker__archive.jsonl")
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+# section in the backup file, attribute in `Backup`, encoder of its records, and
+# whether its records can be matched by id
+SECTIONS: tuple[tuple[str, str, Callable[[Any], Any], bool], ...] = (
+    ("activities", "activities", encode_activity, True),
+    ("completedActivities", "completed_activities", encode_completed_activity, True),
+    ("trainings", "trainings", encode_training, True),
+    ("trainables", "trainables", encode_trainable, True),
+    ("shortcuts", "shortcuts", _identity, False),
+)
+
+
+class ArchiveMismatch(Exception): ...
+
+
+@dataclass(frozen=True)
+class ArchivedBackup:
+    source: BackupFilename
+    backup: Backup
+
+
+def _has_unique_ids(records: list[Any]) -> bool:
+    return len({record.id for record in records}) == len(records)
+
+
+def diff_section(
+    previous: list[Any] | None,
+    current: list[Any] | None,
+    encode: Callable[[Any], Any],
+    by_id: bool = True,
+) -> JsonDict | None:
+    """Describe how to turn `previous` into `current`, None if they are equal"""
+    if previous == current:
+        return None
+
+    if (
+        not by_id
+        or previous is None
+        or current is None
+        or not _has_unique_ids(previous)
+        or not _has_unique_ids(current)
+    ):
+        return {"records": None if current is None else list(map(encode, current))}
+
+    previous_by_id = {record.id: record for record in previous}
+    current_ids = [record.id for record in current]
+    current_id_set = set(current_ids)
+
+    upserted: list[Any] = []
+    added_ids: list[str] = []
+    for record in current:
+        known = previous_by_id.get(record.id)
+        if known is None:
+            upserted.append(record)
+            added_ids.append(record.id)
+        elif known.last_modified != record.last_modified or known != record:
+            upserted.append(record)
+    removed = [id for id in previous_by_id if id not in current_id_set]
+
+    delta: JsonDict = {}
+    if upserted:
+        delta["upserted"] = list(map(encode, upserted))
+    if removed:
+        delta["removed"] = removed
+
+    # kept records stay in place and added ones go last, as `apply_section` does
+    expected_ids = [id for id in previous_by_id if id in current_id_set] + added_ids
+    if expected_ids != current_ids:
+        delta["order"] = current_ids
+
+    return delta
+
+
+def apply_section(
+    previous: list[Any] | None,
+    delta: JsonDict,
+    decode: Callable[[Any], Any],
+) -> list[Any] | None:
+    if "records" in delta:
+        records = delta["records"]
+        return None if records is None else list(map(decode, records))
+
+    by_id = {record.id: record for record in previous or []}
+    for id in delta.get("removed", []):
+        del by_id[id]
+    for data in delta.get("upserted", []):
+        record = decode(data)
+        by_id[record.id] = record
+
+    if "order" in delta:
+        return [by_id[id] for id in delta["order"]]
+    return list(by_id.values())
+
+
+def diff_backups(previous: Backup, current: Backup) -> JsonDict:
+    """Changes of every section from `previous` to `current`, by section"""
+    sections: JsonDict = {}
+    for section, attribute, encode, by_id in SECTIONS:
+        delta = diff_section(
+            previous=getattr(previous, attribute),
+            current=getattr(current, attribute),
+            encode=encode,
+            by_id=by_id,
+        )
+        if delta is not None:
+            sections[section] = delta
+    return sections
+
+
+def apply_diff(previous: Backup, date: str, sections: JsonDict) -> Backup:
+    values = {
+        attribute: (
+            apply_section(
+                previous=getattr(previous, attribute),
+                delta=sections[section],
+                decode=SECTION_DECODERS[section],
+            )
+            if section in sections
+            else getattr(previous, attribute)
+        )
+        for section, attribute, _, _ in SECTIONS
+    }
+    return Backup(date=decode_datetime(date, "date"), **values)
+
+
+def _read_entries(path: Path) -> Iterator[tuple[bytes, JsonDict]]:
+    with path.open("rb") as file_handler:
+        for line in file_handler:
+            if line.strip():
+                yield line, json.loads(line)
+
+
+def _to_backup(entry: JsonDict, previous: Backup | None) -> Backup:
+    if "base" in entry:
+        return decode_backup(entry["base"])
+    if previous is None:
+        raise ArchiveMismatch(f"{entry['source']} is a delta without a base backup")
+    return apply_diff(previous=previous, date=entry["date"], sections=entry["sections"])
+
+
+def iter_archive(path: Path) -> Iterator[ArchivedBackup]:
+    """Reconstruct every archived backup, in the order they were archived"""
+    previous: Backup | None = None
+    for _, entry in _read_entries(path):
+        previous = _to_backup(entry, previous=previous)
+        yield ArchivedBackup(source=entry["source"], backup=previous)
+
+
+def read_archive_hashes(path: Path) -> dict[BackupFilename, FileHash]:
+    """
+    Hash of the entry of every archived backup, which changes if the backup, or
+    any backup archived before it, changes
+    """
+    hashes: dict[BackupFilename, FileHash] = {}
+    digest = hashlib.sha256()
+    for line, entry in _read_entries(path):
+        digest.update(line)
+        hashes[entry["source"]] = digest.hexdigest()
+    return hashes
+
+
+def append_to_archive(path: Path, backups: Iterable[ArchivedBackup]) -> int:
+    """
+    Append the backups that are not archived yet, and return how many there were.
+
+    Every entry is checked to reconstruct its backup exactly before writing it.
+    """
+    previous: Backup | None = None
+    archived: set[BackupFilename] = set()
+    if path.exists():
+        for archived_backup in iter_archive(path):
+            previous = archived_backup.backup
+            archived.add(archived_backup.source)
+
+    appended = 0
+    with path.open("a") as file_handler:
+        for archived_backup in backups:
+            source, backup = archived_backup.source, archived_backup.backup
+            if source in archived:
+                logger.debug(f"{source} is already archived, skipping")
+                continue
+
+            entry: JsonDict = {"source": source, "date": backup.date.isoformat()}
+            if previous is None:
+                entry["base"] = encode_backup(backup)
+            else:
+                entry["sections"] = diff_backups(previous=previous, current=backup)
+
+            # compare against the decoded entry, so that what is read later is
+            # guaranteed to be the same as what was archived
+            entry = json.loads(json.dumps(entry))
+            if _to_backup(entry, previous=previous) != backup:
+                raise ArchiveMismatch(f"{source} cannot be reconstructed exactly")
+
+            file_handler.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            logger.debug(f"archived {source}")
+            previous = backup
+            archived.add(source)
+            appended += 1
+
+    return appended
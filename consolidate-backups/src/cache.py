@@ -0,0 +1,126 @@
+"""
+On-disk cache of already deserialized backups.
+
+Backup files never change once they are written, so the result of parsing and
+validating a backup can be safely reused as long as the file content and the
+model definitions (see `SCHEMA_VERSION`) stay the same.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from src.model import SCHEMA_VERSION, Backup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+    / "fitness-tracker"
+    / "backups"
+)
+DEFAULT_CACHE_MAX_SIZE = 512 * 1024 * 1024  # bytes
+
+CacheKey = str
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file_handler:
+        while chunk := file_handler.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class BackupCache:
+    path: Path = DEFAULT_CACHE_DIR
+    max_size: int = DEFAULT_CACHE_MAX_SIZE  # bytes
+    rebuild: bool = False  # ignore cached entries, but refresh them
+    # size of the entries, in bytes: scanned on the first `put`, then kept up to
+    # date so that the directory is only scanned again to evict entries. Entries
+    # written by other processes are only counted on the next scan
+    _size: int | None = field(default=None, init=False, repr=False, compare=False)
+
+    def key_for(self, path: Path) -> CacheKey:
+        return f"{hash_file(path)}__v{SCHEMA_VERSION}"
+
+    def _entry_path(self, key: CacheKey) -> Path:
+        return self.path / f"{key}.pickle"
+
+    def get(self, key: CacheKey) -> Backup | None:
+        if self.rebuild:
+            return None
+
+        entry_path = self._entry_path(key)
+        try:
+            with entry_path.open("rb") as file_handler:
+                backup = pickle.load(file_handler)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            logger.warning(f"discarding unreadable cache entry {entry_path}")
+            entry_path.unlink(missing_ok=True)
+            return None
+
+        # the modification time is used as last access time for LRU eviction
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass  # evicted by another process in the meantime
+
+        return backup
+
+    def put(self, key: CacheKey, backup: Backup) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry_path = self._entry_path(key)
+
+        # write to a temporary file first, so that concurrent readers never see
+        # a partially written entry
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("wb") as file_handler:
+            pickle.dump(backup, file_handler, protocol=pickle.HIGHEST_PROTOCOL)
+        size = tmp_path.stat().st_size
+        replaced_size = _file_size(entry_path)
+        os.replace(tmp_path, entry_path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._scan())
+        else:
+            self._size += size - replaced_size
+
+        if self._size > self.max_size:
+            self._evict()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        entries: list[tuple[float, int, Path]] = []
+        for entry_path in self.path.glob("*.pickle"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return entries
+
+    def _evict(self) -> None:
+        entries = self._scan()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            logger.debug(f"evicting cache entry {entry_path}")
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
+        self._size = total_size
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,60 @@
+"""
+Turn the answers of a review file, written by `consolidate --batch`, into
+decisions about the completed activities missing from later backups.
+
+Purpose: review all the missing completed activities in one go, instead of
+answering one prompt at a time while the consolidation waits.
+"""
+
+from __future__ import annotations
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+from src.domain import Decisions
+from src.review import DEFAULT_REVIEW_PATH, apply_review_file
+
+logger = logging.getLogger(__name__)
+
+DECISIONS_PATH = Path("decisions__deleted-completed-activities.csv")
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--verbose", action="store_true", help="show debug logs")
+    parser.add_argument(
+        "--path",
+        default=str(DEFAULT_REVIEW_PATH),
+        help=f"review file with the answers (default: {DEFAULT_REVIEW_PATH})",
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+def main(review_path: Path, decisions_path: Path = DECISIONS_PATH) -> None:
+    with Decisions.from_file(path=decisions_path) as decisions:
+        result = apply_review_file(path=review_path, decisions=decisions)
+
+    logger.info(f"{result.decided} decisions saved to {decisions_path}")
+    if result.pending:
+        logger.warning(f"{result.pending} completed activities are still unanswered")
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format=(
+            "%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s"
+            if args.verbose
+            else "%(levelname)s:%(message)s"
+        ),
+    )
+
+    logger.debug(f"{sys.argv=}")
+
+    main(review_path=Path(args.path))
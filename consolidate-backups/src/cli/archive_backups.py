@@ -0,0 +1,112 @@
+"""
+Append the backups of a directory to a delta archive, which stores a base backup
+plus only the records that changed in each following backup, or extract the
+archived backups back into files.
+
+Purpose: keep years of daily backups in a fraction of the disk space, and let
+consolidate read them from the archive with --archive.
+"""
+
+from __future__ import annotations
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+from typing import Iterator
+
+from src.archive import (
+    DEFAULT_ARCHIVE_PATH,
+    ArchivedBackup,
+    append_to_archive,
+    iter_archive,
+    read_archive_hashes,
+)
+from src.io import dump_backup, read_backup_file
+
+logger = logging.getLogger(__name__)
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--verbose", action="store_true", help="show debug logs")
+    parser.add_argument(
+        "--path", help="directory to search for JSON-like fitness-tracker backups"
+    )
+    parser.add_argument(
+        "--archive",
+        default=str(DEFAULT_ARCHIVE_PATH),
+        help=f"archive to append the backups to (default: {DEFAULT_ARCHIVE_PATH})",
+    )
+    parser.add_argument(
+        "--extract",
+        metavar="DIR",
+        help="instead of archiving, write every archived backup in this directory",
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+def _read_backups(paths: list[Path]) -> Iterator[ArchivedBackup]:
+    for path in paths:
+        yield ArchivedBackup(source=path.name, backup=read_backup_file(path=path))
+
+
+def archive(search_dir: Path, archive_path: Path) -> int:
+    archived = read_archive_hashes(archive_path) if archive_path.exists() else {}
+    paths = [
+        path
+        for path in sorted(search_dir.glob("fitness-tracker__*.json"))
+        if path.name not in archived
+    ]
+    logger.info(f"archiving {len(paths)} new backups into {archive_path}")
+    appended = append_to_archive(path=archive_path, backups=_read_backups(paths))
+
+    backups_size = sum(
+        path.stat().st_size for path in search_dir.glob("fitness-tracker__*.json")
+    )
+    logger.info(
+        f"{len(archived) + appended} backups archived in"
+        f" {archive_path.stat().st_size / 1024:.1f} KiB, backup files take"
+        f" {backups_size / 1024:.1f} KiB"
+    )
+    return appended
+
+
+def extract(archive_path: Path, output_dir: Path) -> int:
+    """
+    The backups are written as the webapp does, although not byte for byte: e.g.:
+    dates use `+00:00` instead of `Z`
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    extracted = 0
+    for archived_backup in iter_archive(archive_path):
+        path = output_dir / archived_backup.source
+        logger.debug(f"extracting {path}")
+        with path.open("w") as file_handler:
+            dump_backup(backup=archived_backup.backup, file_handler=file_handler)
+        extracted += 1
+
+    logger.info(f"{extracted} backups extracted to {output_dir}")
+    return extracted
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format=(
+            "%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s"
+            if args.verbose
+            else "%(levelname)s:%(message)s"
+        ),
+    )
+
+    logger.debug(f"{sys.argv=}")
+
+    if args.extract:
+        extract(archive_path=Path(args.archive), output_dir=Path(args.extract))
+    else:
+        archive(search_dir=Path(args.path), archive_path=Path(args.archive))
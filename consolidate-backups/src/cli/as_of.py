@@ -0,0 +1,91 @@
+"""
+Rebuild the data as it was at a given date, from the record versions kept by
+consolidate --versions, and write it as a backup file.
+
+Purpose: see what the data looked like on any date instantly, without merging
+again the backups taken until then.
+"""
+
+from __future__ import annotations
+
+import datetime
+import sys
+import argparse
+import logging
+from contextlib import closing
+from pathlib import Path
+
+from src.io import dump_backup
+from src.versions import as_of, open_versions
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackupYet(Exception): ...
+
+
+def _parse_datetime(value: str) -> datetime.datetime:
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        raise argparse.ArgumentTypeError(f"expected a time zone in {value!r}")
+    return moment
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--verbose", action="store_true", help="show debug logs")
+    parser.add_argument(
+        "--path", help="SQLite database created by consolidate --versions"
+    )
+    parser.add_argument(
+        "--date",
+        type=_parse_datetime,
+        help="ISO 8601 date with time zone, e.g.: 2020-06-01T00:00:00+00:00",
+    )
+    parser.add_argument(
+        "--output", help="file where the backup is written to (default: stdout)"
+    )
+    return parser
+
+
+def parse_cli_argument() -> argparse.Namespace:
+    return _build_cli_parser().parse_args()
+
+
+def main(
+    versions_path: Path, moment: datetime.datetime, output_path: Path | None = None
+) -> None:
+    with closing(open_versions(versions_path)) as db:
+        backup = as_of(db=db, moment=moment)
+
+    if backup is None:
+        raise NoBackupYet(f"there are no backups from {moment} or before")
+
+    logger.info(f"rebuilt the data as of {moment}, from the backup of {backup.date}")
+    if output_path is None:
+        dump_backup(backup=backup, file_handler=sys.stdout)
+        return
+
+    with output_path.open("w") as file_handler:
+        dump_backup(backup=backup, file_handler=file_handler)
+
+
+if __name__ == "__main__":
+    args = parse_cli_argument()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format=(
+            "%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s"
+            if args.verbose
+            else "%(levelname)s:%(message)s"
+        ),
+    )
+
+    logger.debug(f"{sys.argv=}")
+
+    main(
+        versions_path=Path(args.path),
+        moment=args.date,
+        output_path=Path(args.output) if args.output else None,
+    )
@@ -1,8 +1,9 @@
 """
-Convert a single backup file into CSVs (one per object type).
+Convert a single backup file into CSVs (one per object type, plus one per list
+of references between them), or into Parquet files.
 
 Purpose: easier visual inspection - which sometimes is more convenient than
-writing SQL queries.
+writing SQL queries - and faster analytics loads.
 """
 
 from __future__ import annotations
@@ -12,9 +13,17 @@ import argparse
 import logging
 from pathlib import Path
 
-import pandas as pd
-
-from src.io import read_backup_file
+from typing import get_args
+
+from src.cache import BackupCache
+from src.export import (
+    DEFAULT_CHUNK_ROWS,
+    Format,
+    export_tables,
+    iter_backup_records,
+)
+from src.instrumentation import add_profile_arguments, profiling, stage
+from src.io import iter_backup_file, read_backup_file
 from src.domain import is_backup_corrupted
 
 logger = logging.getLogger(__name__)
@@ -24,29 +33,71 @@ def _build_cli_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
     parser.add_argument("--verbose", action="store_true", help="show debug logs")
     parser.add_argument("--path", help="JSON backup file to be converted into CSVs")
+    parser.add_argument(
+        "--format",
+        choices=get_args(Format),
+        default="csv",
+        help="output file format, parquet requires pyarrow",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help="maximum amount of rows per table held in memory before writing them",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="read the backup record by record instead of loading it whole, which"
+        " skips the cache and the corruption check",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read nor write the cache of already parsed backups",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="ignore the cache of already parsed backups, but refresh it",
+    )
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
     return args
 
 
-def main(backup_path: Path) -> None:
-    backup = read_backup_file(path=backup_path)
-    is_backup_corrupted(backup=backup)
-
-    output_dir = Path.cwd()
-
-    prefix = backup_path.name
-    activities_path = output_dir / f"{prefix}__activities.csv"
-    completed_activities_path = output_dir / f"{prefix}__completed-activities.csv"
-    trainables_path = output_dir / f"{prefix}__trainables.csv"
-    trainings_path = output_dir / f"{prefix}__trainings.csv"
-
-    pd.DataFrame(backup.activities).to_csv(activities_path, index=False)
-    pd.DataFrame(backup.completed_activities).to_csv(
-        completed_activities_path, index=False
-    )
-    pd.DataFrame(backup.trainables).to_csv(trainables_path, index=False)
-    pd.DataFrame(backup.trainings).to_csv(trainings_path, index=False)
+def _build_cache(args: argparse.Namespace) -> BackupCache | None:
+    if args.no_cache:
+        return None
+    return BackupCache(rebuild=args.rebuild_cache)
+
+
+def main(
+    backup_path: Path,
+    cache: BackupCache | None = None,
+    format: Format = "csv",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    stream: bool = False,
+) -> None:
+    if stream:
+        records = iter_backup_file(path=backup_path)
+    else:
+        backup = read_backup_file(path=backup_path, cache=cache)
+        is_backup_corrupted(backup=backup)
+        records = iter_backup_records(backup)
+
+    with stage("export", file=backup_path):
+        paths = export_tables(
+            records=records,
+            output_dir=Path.cwd(),
+            prefix=backup_path.name,
+            format=format,
+            chunk_rows=chunk_rows,
+        )
+    for table, path in paths.items():
+        logger.info(f"{table} written to {path}")
 
 
 if __name__ == "__main__":
@@ -63,4 +114,14 @@ if __name__ == "__main__":
 
     logger.debug(f"{sys.argv=}")
 
-    main(backup_path=Path(args.path))
+    with profiling(
+        summary_path=Path(args.profile) if args.profile else None,
+        dump_path=Path(args.profile_dump) if args.profile_dump else None,
+    ):
+        main(
+            backup_path=Path(args.path),
+            cache=_build_cache(args),
+            format=args.format,
+            chunk_rows=args.chunk_rows,
+            stream=args.stream,
+        )
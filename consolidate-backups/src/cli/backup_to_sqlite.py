@@ -8,27 +8,30 @@ from __future__ import annotations
 
 import sqlite3
 import sys
+import time
 import argparse
 import logging
 from pathlib import Path
+from typing import Literal, TypeAlias, get_args
 
-import pandas as pd
-
-from src.io import read_backup_file
+from src.cache import BackupCache, hash_file
+from src.instrumentation import add_profile_arguments, profiling, stage
+from src.io import backup_stem, read_backup_file
 from src.domain import is_backup_corrupted, ActivityId, TrainableId
+from src.model import Backup
+from src.sqlite import (
+    bulk_load_backup,
+    create_indexes,
+    create_schema,
+    create_search_index,
+    has_search_index,
+    refresh_rollups,
+    sync_backup,
+)
 
 logger = logging.getLogger(__name__)
 
-queries_dir = Path(__file__).parent
-CREATE_ACTIVITIES_TABLE_QUERY_PATH = queries_dir / "create-activities-table.sql"
-CREATE_COMPLETED_ACTIVITIES_TABLE_QUERY_PATH = (
-    queries_dir / "create-completed-activities-table.sql"
-)
-CREATE_TRAINABLES_TABLE_QUERY_PATH = queries_dir / "create-trainables-table.sql"
-CREATE_ACTIVITIES_TRAINABLES_TABLE_QUERY_PATH = (
-    queries_dir / "create-activity-trainables-table.sql"
-)
-CREATE_HISTORY_VIEW_PATH = queries_dir / "create-history-view.sql"
+Loader: TypeAlias = Literal["native", "pandas"]
 
 
 def _build_cli_parser() -> argparse.ArgumentParser:
@@ -37,78 +40,192 @@ def _build_cli_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--path", help="JSON backup file to be converted into an SQLite database"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read nor write the cache of already parsed backups",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="ignore the cache of already parsed backups, but refresh it",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=get_args(Loader),
+        default="native",
+        help="how to write a new database: streaming rows straight from the backup"
+        " (native) or through pandas DataFrames (pandas)",
+    )
+    parser.add_argument(
+        "--sync",
+        metavar="DATABASE",
+        help="insert or update the changed records into an existing SQLite database,"
+        " instead of creating a new one from scratch",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="add a full-text search index over names and notes, see the search CLI;"
+        " once added, syncing keeps it up to date",
+    )
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
     return args
 
 
-def main(backup_path: Path) -> None:
-    backup = read_backup_file(path=backup_path)
-    is_backup_corrupted(backup=backup)
+def _build_cache(args: argparse.Namespace) -> BackupCache | None:
+    if args.no_cache:
+        return None
+    return BackupCache(rebuild=args.rebuild_cache)
 
-    output_path = Path.cwd() / f"{backup_path.stem}.sqlite"
-    output_path.unlink(missing_ok=True)
 
-    with sqlite3.connect(output_path) as db:
-        for path in (
-            #
-            # tables
-            CREATE_ACTIVITIES_TABLE_QUERY_PATH,
-            CREATE_COMPLETED_ACTIVITIES_TABLE_QUERY_PATH,
-            CREATE_TRAINABLES_TABLE_QUERY_PATH,
-            #
-            # through-models
-            CREATE_ACTIVITIES_TRAINABLES_TABLE_QUERY_PATH,
-            #
-            # views
-            CREATE_HISTORY_VIEW_PATH,
-        ):
-            query = path.read_text().strip()
-            db.execute(query)
-
-        activities = pd.DataFrame(
-            activity.to_df_row() for activity in backup.activities
-        )
-        activities.drop(columns=["trainable_ids"], inplace=True)
-        activities.to_sql(
-            name="activities",
-            con=db,
-            if_exists="replace",
-            index=False,
-            chunksize=1_000,
-        )
+def _add_search_index(db: sqlite3.Connection) -> None:
+    logger.info("building full-text search index")
+    with stage("search_index"):
+        _build_search_index(db)
 
-        _activities_trainables: list[dict[str, str]] = []
-        for activity in backup.activities:
-            for trainable_id in activity.trainable_ids:
-                _activities_trainables.append(
-                    {"activity_id": activity.id, "trainable_id": trainable_id}
-                )
 
-        activities_trainables = pd.DataFrame(_activities_trainables)
-        activities_trainables.to_sql(
-            name="activities_trainables",
-            con=db,
-            if_exists="replace",
-            index=False,
-            chunksize=1_000,
-        )
+def _build_search_index(db: sqlite3.Connection) -> None:
+    db.execute("BEGIN")
+    try:
+        create_search_index(db)
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+
+def _sync(
+    backup_path: Path,
+    database_path: Path,
+    cache: BackupCache | None,
+    search_index: bool = False,
+) -> None:
+    backup = read_backup_file(path=backup_path, cache=cache)
+    is_backup_corrupted(backup=backup)
+
+    logger.info(f"syncing {backup_path} into {database_path}")
+    db = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        with stage("sync_sqlite", file=backup_path) as current:
+            result = sync_backup(
+                db=db,
+                backup=backup,
+                file_name=backup_path.name,
+                file_hash=hash_file(backup_path),
+            )
+            current.records = sum(result.upserted.values()) + sum(
+                result.deleted.values()
+            )
+        if search_index and not has_search_index(db):
+            _add_search_index(db)
+    finally:
+        db.close()
+
+    for table, count in result.upserted.items():
+        logger.info(f"{table}: {count} rows inserted or updated")
+    for table, count in result.deleted.items():
+        logger.info(f"{table}: {count} rows deleted")
+
+
+def _load_with_pandas(db: sqlite3.Connection, backup: Backup) -> int:
+    # imported here because pandas is slow to import and the native loader is
+    # the default
+    import pandas as pd
+
+    # rows are appended to the tables of the schema, so that their primary keys
+    # are kept and the database can be synced later on, as with the native loader
+    create_schema(db, indexes=False)
+
+    activities = pd.DataFrame(activity.to_df_row() for activity in backup.activities)
+    activities.drop(columns=["trainable_ids"], inplace=True)
+
+    _activities_trainables: list[dict[str, str]] = []
+    for activity in backup.activities:
+        for trainable_id in dict.fromkeys(activity.trainable_ids or []):
+            _activities_trainables.append(
+                {"activity_id": activity.id, "trainable_id": trainable_id}
+            )
+    activities_trainables = pd.DataFrame(
+        _activities_trainables, columns=["activity_id", "trainable_id"]
+    )
+
+    completed_activities = pd.DataFrame(backup.completed_activities)
+
+    trainables = pd.DataFrame(backup.trainables)
 
-        pd.DataFrame(backup.completed_activities).to_sql(
-            name="completed_activities",
+    rows = 0
+    for name, df in (
+        ("activities", activities),
+        ("activities_trainables", activities_trainables),
+        ("completed_activities", completed_activities),
+        ("trainables", trainables),
+    ):
+        df.to_sql(
+            name=name,
             con=db,
-            if_exists="replace",
+            if_exists="append",
             index=False,
             chunksize=1_000,
         )
-        pd.DataFrame(backup.trainables).to_sql(
-            name="trainables",
-            con=db,
-            if_exists="replace",
-            index=False,
-            chunksize=1_000,
+        rows += len(df)
+
+    create_indexes(db)
+    refresh_rollups(db)
+
+    return rows
+
+
+def main(
+    backup_path: Path,
+    cache: BackupCache | None = None,
+    sync_path: Path | None = None,
+    loader: Loader = "native",
+    search_index: bool = False,
+) -> None:
+    if sync_path:
+        return _sync(
+            backup_path=backup_path,
+            database_path=sync_path,
+            cache=cache,
+            search_index=search_index,
         )
 
+    backup = read_backup_file(path=backup_path, cache=cache)
+    is_backup_corrupted(backup=backup)
+
+    output_path = Path.cwd() / f"{backup_stem(backup_path)}.sqlite"
+    output_path.unlink(missing_ok=True)
+
+    start = time.perf_counter()
+    with stage("load_sqlite", file=output_path) as current:
+        if loader == "pandas":
+            with sqlite3.connect(output_path) as db:
+                rows = _load_with_pandas(db=db, backup=backup)
+        else:
+            db = sqlite3.connect(output_path, isolation_level=None)
+            try:
+                rows = sum(bulk_load_backup(db=db, backup=backup).values())
+            finally:
+                db.close()
+        current.records = rows
+    elapsed = time.perf_counter() - start
+
+    logger.info(
+        f"{loader} loader wrote {rows} rows in {elapsed:.3f}s"
+        f" ({rows / elapsed:,.0f} rows/s)"
+    )
+
+    if search_index:
+        db = sqlite3.connect(output_path, isolation_level=None)
+        try:
+            _add_search_index(db)
+        finally:
+            db.close()
+
 
 if __name__ == "__main__":
     args = _build_cli_parser()
@@ -124,4 +241,14 @@ if __name__ == "__main__":
 
     logger.debug(f"{sys.argv=}")
 
-    main(backup_path=Path(args.path))
+    with profiling(
+        summary_path=Path(args.profile) if args.profile else None,
+        dump_path=Path(args.profile_dump) if args.profile_dump else None,
+    ):
+        main(
+            backup_path=Path(args.path),
+            cache=_build_cache(args),
+            sync_path=Path(args.sync) if args.sync else None,
+            loader=args.loader,
+            search_index=args.search_index,
+        )
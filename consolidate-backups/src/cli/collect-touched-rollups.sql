@@ -0,0 +1,17 @@
+-- activities and trainables which rollups depend on the changed records. Run
+-- before and after writing the changed records, to collect both the previous
+-- and the new activities of the changed completed activities, and both the
+-- previous and the new trainables of the changed activities
+INSERT OR IGNORE INTO temp.rollup_activities
+SELECT activity_id
+FROM completed_activities
+WHERE id IN (SELECT id FROM temp.changed_completed_activities);
+
+INSERT OR IGNORE INTO temp.rollup_trainables
+SELECT trainable_id
+FROM activities_trainables
+WHERE activity_id IN (
+  SELECT id FROM temp.changed_activities
+  UNION
+  SELECT id FROM temp.rollup_activities
+);
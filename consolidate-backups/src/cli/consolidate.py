@@ -6,59 +6,385 @@ all into a single file.
 from __future__ import annotations
 
 import datetime
+import json
 import sys
 import argparse
 import logging
+import sqlite3
+from contextlib import closing, contextmanager
 from pathlib import Path
-from typing import Iterator
-
-
-from src.io import read_backup_file, write_backup_to_file
+from typing import Callable, Iterable, Iterator, get_args
+
+
+from src import instrumentation
+from src.archive import iter_archive, read_archive_hashes
+from src.cache import BackupCache, hash_file
+from src.instrumentation import (
+    Stage,
+    add_profile_arguments,
+    count_records,
+    profiling,
+    stage,
+)
+from src.io import (
+    Compression,
+    FileIsEmpty,
+    UnsupportedBackupFile,
+    read_backup_file,
+    read_backup_header,
+    write_backup_to_file,
+)
+from src.manifest import (
+    BackupFilename,
+    FileHash,
+    FileStat,
+    Manifest,
+    find_mismatch,
+    read_manifest,
+    stat_file,
+    write_manifest,
+)
 from src.model import Backup
 from src.domain import (
+    BackupMerger,
     CorruptedBackup,
     Decisions,
     Patches,
-    merge_backups,
+    PendingReview,
     is_backup_corrupted,
 )
+from src.review import DEFAULT_REVIEW_PATH, write_review_file
+from src.sqlite import sync_backup
+from src.versions import (
+    VersionRecorder,
+    clear_versions,
+    latest_versioned_date,
+    open_versions,
+)
+from src.watch import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, DirectoryWatcher
 
 logger = logging.getLogger(__name__)
 
 
+def _non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"expected 0 or more, found {number}")
+    return number
+
+
+def _parse_datetime(value: str) -> datetime.datetime:
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        raise argparse.ArgumentTypeError(f"expected a time zone in {value!r}")
+    return moment
+
+
 def _build_cli_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
     parser.add_argument("--verbose", action="store_true", help="show debug logs")
     parser.add_argument(
         "--path", help="directory to search for JSON-like fitness-tracker backups"
     )
+    parser.add_argument(
+        "--archive",
+        help="delta archive to read the backups from, instead of --path, see"
+        " archive_backups",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=_non_negative_int,
+        default=1,
+        help="number of processes used to load backups (0 means one per CPU)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read nor write the cache of already parsed backups",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="ignore the cache of already parsed backups, but refresh it",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="consolidate all backups from scratch, ignoring previous consolidations",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="do not prompt about missing completed activities, list the undecided"
+        f" ones in {DEFAULT_REVIEW_PATH} instead, to be answered with apply_review",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="write the consolidated backup without indentation, which is smaller"
+        " and faster to write, and still restorable by the webapp",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=get_args(Compression),
+        help="compress the consolidated backup, it must be decompressed before"
+        " restoring it in the webapp (zstd needs the zstandard package)",
+    )
+    parser.add_argument(
+        "--versions",
+        metavar="PATH",
+        help="also keep every version of every record in this SQLite database, to"
+        " see the data as of any date with as_of",
+    )
+    parser.add_argument(
+        "--since",
+        type=_parse_datetime,
+        help="only consolidate the backups taken at or after this ISO 8601 date,"
+        " with time zone, e.g.: 2020-06-01T00:00:00+00:00",
+    )
+    parser.add_argument(
+        "--until",
+        type=_parse_datetime,
+        help="only consolidate the backups taken at or before this ISO 8601 date,"
+        " with time zone",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running, and merge new backups into the consolidation as they"
+        " land in --path",
+    )
+    parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        help="while watching, seconds a backup must stay unchanged to be merged",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="while watching, seconds between scans of --path (without inotify)",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help="while watching, seconds between writes of the consolidation",
+    )
+    parser.add_argument(
+        "--sqlite",
+        metavar="PATH",
+        help="while watching, also sync every consolidation into this database",
+    )
+    add_profile_arguments(parser)
 
     return parser
 
 
 def parse_cli_argument() -> argparse.Namespace:
-    args = _build_cli_parser().parse_args()
+    parser = _build_cli_parser()
+    args = parser.parse_args()
+    if args.watch and not args.path:
+        parser.error("--watch needs a directory to watch, with --path")
+    if args.watch and (args.archive or args.versions):
+        parser.error("--watch cannot be combined with --archive nor --versions")
+    if args.sqlite and not args.watch:
+        parser.error(
+            "--sqlite only applies with --watch, use backup_to_sqlite --sync to sync"
+            " a consolidated backup once"
+        )
+    if (args.since or args.until) and (args.archive or args.watch):
+        parser.error(
+            "--since and --until cannot be combined with --archive nor --watch"
+        )
     return args
 
 
-def _load_all_files(files: Iterator[Path], patches: Patches) -> Iterator[Backup]:
-    def _load_file(path: Path) -> Backup:
-        backup = read_backup_file(path=path)
-        logger.info("validating backup")
+def _build_cache(args: argparse.Namespace) -> BackupCache | None:
+    if args.no_cache:
+        return None
+    return BackupCache(rebuild=args.rebuild_cache)
 
-        if backup_patches := patches.get(path.name):
-            for patch in backup_patches:
-                backup = patch.apply_to(backup)
 
-        if is_backup_corrupted(backup=backup):
-            raise CorruptedBackup(
-                f"'{path.resolve()}' backup is corrupted, see logs for details"
-            )
-        logger.info("validating backup completed without errors")
-        return backup
+def _load_file(
+    path: Path, patches: Patches, cache: BackupCache | None = None
+) -> Backup:
+    with stage("load", file=path) as current:
+        backup = _load_and_validate_file(path=path, patches=patches, cache=cache)
+        current.records = count_records(backup)
+    return backup
 
-    backups = map(_load_file, files)
 
+def _load_file_in_worker(
+    path: Path, patches: Patches, cache: BackupCache | None, profile: bool
+) -> tuple[Backup, list[Stage]]:
+    # stages measured in a worker process must be sent back to be recorded
+    if profile:
+        instrumentation.enable()
+    backup = _load_file(path=path, patches=patches, cache=cache)
+    return backup, instrumentation.drain_stages()
+
+
+def _load_and_validate_file(
+    path: Path, patches: Patches, cache: BackupCache | None = None
+) -> Backup:
+    backup = read_backup_file(path=path, cache=cache)
+    return _patch_and_validate(
+        backup=backup, name=path.name, location=path.resolve(), patches=patches
+    )
+
+
+def _patch_and_validate(
+    backup: Backup, name: str, location: Path | str, patches: Patches
+) -> Backup:
+    logger.info("validating backup")
+
+    if backup_patches := patches.get(name):
+        logger.info(f"applying {len(backup_patches)} patches")
+        backup = backup_patches.apply_to(backup)
+
+    if is_backup_corrupted(backup=backup):
+        raise CorruptedBackup(f"'{location}' backup is corrupted, see logs for details")
+    logger.info("validating backup completed without errors")
+    return backup
+
+
+DECISIONS_PATH = Path("decisions__deleted-completed-activities.csv")
+
+PATCHES_PATHS = {
+    "path_for_activities_patches": Path("patches__activities.csv"),
+    "path_for_completed_activities_patches": Path("patches__completed-activities.csv"),
+    "path_for_trainings_patches": Path("patches__trainings.csv"),
+    "path_for_trainables_patches": Path("patches__trainables.csv"),
+}
+
+DEFAULT_FLUSH_INTERVAL = 10.0  # seconds, while watching
+
+
+def _read_decisions() -> Decisions:
+    if DECISIONS_PATH.exists():
+        return Decisions.from_file(path=DECISIONS_PATH)
+    return Decisions(decisions=[], path=DECISIONS_PATH)
+
+
+# errors that make a single backup unusable, but that must not prevent the rest
+# of backups from being loaded so that all failures can be reported together
+LOAD_ERRORS = (
+    CorruptedBackup,
+    FileIsEmpty,
+    UnsupportedBackupFile,
+    json.JSONDecodeError,
+)
+
+
+def _load_all_files(
+    files: Iterable[Path],
+    patches: Patches,
+    jobs: int = 1,
+    cache: BackupCache | None = None,
+) -> Iterator[Backup]:
+    paths = list(files)
+    loaded: dict[Path, Backup] = {}
+    failures: dict[Path, Exception] = {}
+
+    if jobs == 1:
+        for path in paths:
+            try:
+                loaded[path] = _load_file(path=path, patches=patches, cache=cache)
+            except LOAD_ERRORS as error:
+                failures[path] = error
+    else:
+        # imported here because it is slow to import and only needed with jobs
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        logger.info(f"loading {len(paths)} backups using {jobs or 'all'} processes")
+        with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+            futures = {
+                executor.submit(
+                    _load_file_in_worker,
+                    path=path,
+                    patches=patches,
+                    cache=cache,
+                    profile=instrumentation.is_enabled(),
+                ): path
+                for path in paths
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    loaded[path], stages = future.result()
+                    instrumentation.record_stages(stages)
+                except LOAD_ERRORS as error:
+                    failures[path] = error
+
+    _raise_failures(
+        failures={path.name: error for path, error in failures.items()},
+        total=len(paths),
+    )
+
+    # iterate in input order so that, when two backups share the same date, the
+    # one that wins is the same regardless of which process finished first
+    return _sort_by_date(loaded[path] for path in paths)
+
+
+def _read_dates(paths: Iterable[Path]) -> dict[Path, datetime.datetime | None]:
+    """Date of each backup, read from its header, or None if it cannot be read"""
+    dates: dict[Path, datetime.datetime | None] = {}
+    for path in paths:
+        try:
+            dates[path] = read_backup_header(path).date
+        except LOAD_ERRORS as error:
+            logger.debug(f"cannot read the date of {path.name}: {error}")
+            dates[path] = None
+    return dates
+
+
+def _is_in_range(
+    date: datetime.datetime | None,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+) -> bool:
+    # backups which date cannot be read are kept, to report why once loaded
+    if date is None:
+        return True
+    return (since is None or date >= since) and (until is None or date <= until)
+
+
+def _order_by_date(
+    paths: list[Path], dates: dict[Path, datetime.datetime | None]
+) -> list[Path]:
+    """
+    Order the backups by date, keeping only the last one of each date as
+    `_sort_by_date` does, so that the others are never parsed
+    """
+    paths_per_date: dict[datetime.datetime, Path] = {}
+    unreadable: list[Path] = []
+    for path in paths:
+        date = dates[path]
+        if date is None:
+            unreadable.append(path)
+        else:
+            paths_per_date[date] = path
+
+    ordered = [paths_per_date[date] for date in sorted(paths_per_date)]
+    if skipped := len(paths) - len(ordered) - len(unreadable):
+        logger.info(f"skipping {skipped} backups sharing their date with another")
+    return ordered + unreadable
+
+
+def _raise_failures(failures: dict[BackupFilename, Exception], total: int) -> None:
+    if failures:
+        details = "\n".join(
+            f"  {name}: {error}" for name, error in sorted(failures.items())
+        )
+        raise CorruptedBackup(
+            f"failed to load {len(failures)} out of {total} backups:\n{details}"
+        )
+
+
+def _sort_by_date(backups: Iterable[Backup]) -> Iterator[Backup]:
+    """Sort backups by date, the last one wins when two share the same date"""
     backups_per_date = {backup.date: backup for backup in backups}
 
     dates = sorted(backups_per_date.keys())
@@ -66,42 +392,558 @@ def _load_all_files(files: Iterator[Path], patches: Patches) -> Iterator[Backup]
     return (backups_per_date[date] for date in dates)
 
 
-def _consolidate(backups: Iterator[Backup], decisions: Decisions) -> Backup:
+def _load_archive(
+    archive_path: Path, names: Iterable[BackupFilename], patches: Patches
+) -> Iterator[Backup]:
+    """Load the given backups from a delta archive, see `src.archive`"""
+    wanted = set(names)
+    loaded: list[Backup] = []
+    failures: dict[BackupFilename, Exception] = {}
+    for archived_backup in iter_archive(archive_path):
+        if archived_backup.source not in wanted:
+            continue
+        with stage("load", file=archived_backup.source) as current:
+            try:
+                loaded.append(
+                    _patch_and_validate(
+                        backup=archived_backup.backup,
+                        name=archived_backup.source,
+                        location=f"{archive_path}:{archived_backup.source}",
+                        patches=patches,
+                    )
+                )
+                current.records = count_records(loaded[-1])
+            except CorruptedBackup as error:
+                failures[archived_backup.source] = error
+
+    _raise_failures(failures=failures, total=len(wanted))
+    return _sort_by_date(loaded)
+
+
+def _consolidate(
+    backups: Iterable[Backup],
+    decisions: Decisions,
+    initial: Backup | None = None,
+    interactive: bool = True,
+    on_merged: Callable[[Backup], None] | None = None,
+) -> tuple[Backup, list[PendingReview]]:
     logger.info("consolidating backups...")
-    consolidated = Backup(
-        date=datetime.datetime.fromisoformat("1990-01-01 00:00:00+00:00"),
-        activities=[],
-        completed_activities=[],
-        trainings=[],
-        trainables=[],
-        shortcuts=[],
-    )
-    for backup in backups:
-        consolidated = merge_backups(a=consolidated, b=backup, decisions=decisions)
+    if initial is None:
+        initial = Backup(
+            date=datetime.datetime.fromisoformat("1990-01-01 00:00:00+00:00"),
+            activities=[],
+            completed_activities=[],
+            trainings=[],
+            trainables=[],
+            shortcuts=[],
+        )
+    merger = BackupMerger(decisions=decisions, initial=initial, interactive=interactive)
+    with stage("consolidate") as current:
+        for backup in backups:
+            merger.merge(backup)
+            if on_merged:
+                on_merged(merger.result())
+        consolidated = merger.result()
+        current.records = count_records(consolidated)
 
     logger.info("consolidating backups completed")
 
-    return consolidated
+    return consolidated, list(merger.pending_reviews.values())
+
+
+def _hash_patches(paths: Iterable[Path]) -> FileHash | None:
+    hashes = [f"{path.name}:{hash_file(path)}" for path in paths if path.exists()]
+    return "|".join(hashes) if hashes else None
+
+
+def _hash_decisions() -> FileHash | None:
+    return hash_file(DECISIONS_PATH) if DECISIONS_PATH.exists() else None
+
+
+def _hash_sources(
+    paths: list[Path], manifest: Manifest | None
+) -> tuple[dict[BackupFilename, FileHash], dict[BackupFilename, FileStat]]:
+    """Hash the backups, except those untouched since the last consolidation"""
+    sources: dict[BackupFilename, FileHash] = {}
+    stats: dict[BackupFilename, FileStat] = {}
+    for path in paths:
+        stats[path.name] = stat_file(path)
+        if (
+            manifest
+            and path.name in manifest.sources
+            and manifest.source_stats.get(path.name) == stats[path.name]
+        ):
+            sources[path.name] = manifest.sources[path.name]
+        else:
+            sources[path.name] = hash_file(path)
+    return sources, stats
+
+
+def _can_resume_from(
+    manifest: Manifest,
+    output_dir: Path,
+    sources: dict[BackupFilename, FileHash],
+    patches_hash: FileHash | None,
+    decisions_hash: FileHash | None,
+) -> bool:
+    if reason := find_mismatch(
+        manifest=manifest,
+        sources=sources,
+        patches_hash=patches_hash,
+        decisions_hash=decisions_hash,
+    ):
+        logger.info(f"previous consolidation cannot be reused: {reason}")
+        return False
+
+    consolidated_path = output_dir / manifest.consolidated_backup
+    if not consolidated_path.exists():
+        logger.info(f"previous consolidation not found at {consolidated_path}")
+        return False
+
+    return True
+
+
+def _are_versions_up_to_date(versions_path: Path, date: datetime.datetime) -> bool:
+    if not versions_path.exists():
+        return False
+    with closing(open_versions(versions_path)) as db:
+        return latest_versioned_date(db) == date
+
+
+@contextmanager
+def _recording_versions(
+    versions_path: Path | None, rebuild: bool
+) -> Iterator[VersionRecorder | None]:
+    """Record versions in `versions_path`, which are only kept once committed"""
+    if versions_path is None:
+        yield None
+        return
+
+    with closing(open_versions(versions_path)) as db:
+        if rebuild:
+            clear_versions(db)
+        # closing the connection rolls back what was not committed
+        yield VersionRecorder(db)
+
+
+def main(
+    search_dir: Path | None,
+    jobs: int = 1,
+    cache: BackupCache | None = None,
+    full: bool = False,
+    batch: bool = False,
+    review_path: Path = DEFAULT_REVIEW_PATH,
+    compact: bool = False,
+    compression: Compression | None = None,
+    archive_path: Path | None = None,
+    versions_path: Path | None = None,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    backup_names: set[BackupFilename] | None = None,
+) -> None:
+    """
+    Consolidate the backups in `search_dir`, or in the archive at `archive_path`,
+    only those taken between `since` and `until`, and only those named in
+    `backup_names`, when given
+    """
+    output_dir = Path.cwd()
 
+    # Load previously made decisions
+    decisions = _read_decisions()
 
-def main(search_dir: Path) -> None:
-    paths = search_dir.glob("fitness-tracker__*.json")
+    # Load patches you've decided to apply while correcting corrupted backups
+    patches = Patches.from_files(**PATCHES_PATHS)
+
+    manifest = None if full else read_manifest(directory=output_dir)
+    if not full and not manifest:
+        logger.info("no previous consolidation found")
+
+    # dates are only read from the headers of the backups, and only when needed:
+    # without a range, a no-op consolidation does not open any backup
+    dates: dict[Path, datetime.datetime | None] = {}
+    if archive_path:
+        sources = read_archive_hashes(archive_path)
+        source_stats: dict[BackupFilename, FileStat] = {}
+        paths: list[Path] = []
+    elif search_dir:
+        paths = sorted(search_dir.glob("fitness-tracker__*.json"))
+        if backup_names is not None:
+            paths = [path for path in paths if path.name in backup_names]
+        if since or until:
+            dates = _read_dates(paths)
+            paths = [path for path in paths if _is_in_range(dates[path], since, until)]
+            logger.info(f"{len(paths)} out of {len(dates)} backups are in range")
+        sources, source_stats = _hash_sources(paths=paths, manifest=manifest)
+    else:
+        raise ValueError("expected a directory of backups or an archive")
+    patches_hash = _hash_patches(paths=PATCHES_PATHS.values())
 
-    # Load previously made decisions
-    decisions_path = Path("decisions__deleted-completed-activities.csv")
-    if decisions_path.exists():
-        decisions = Decisions.from_file(path=decisions_path)
+    def load(names: list[BackupFilename]) -> list[Backup]:
+        if archive_path:
+            return list(
+                _load_archive(archive_path=archive_path, names=names, patches=patches)
+            )
+        wanted = set(names)
+        files = [path for path in paths if path.name in wanted]
+        dates.update(_read_dates(path for path in files if path not in dates))
+        files = _order_by_date(files, dates=dates)
+        return list(
+            _load_all_files(files=files, patches=patches, jobs=jobs, cache=cache)
+        )
+
+    if manifest and _can_resume_from(
+        manifest=manifest,
+        output_dir=output_dir,
+        sources=sources,
+        patches_hash=patches_hash,
+        decisions_hash=_hash_decisions(),
+    ):
+        pending = [name for name in sources if name not in manifest.sources]
+        if not pending and not versions_path:
+            logger.info("no new backups found since the last consolidation")
+            return
+
+        initial = read_backup_file(
+            path=output_dir / manifest.consolidated_backup, cache=cache
+        )
+        if versions_path and not _are_versions_up_to_date(
+            versions_path=versions_path, date=initial.date
+        ):
+            # versions are drawn from every backup, not from the consolidation
+            logger.info(f"versions in {versions_path} are outdated, rebuilding...")
+            initial = None
+            backups = load(list(sources))
+        elif not pending:
+            logger.info("no new backups found since the last consolidation")
+            return
+        else:
+            logger.info(f"resuming consolidation with {len(pending)} new backups")
+            backups = load(pending)
+
+        if initial and backups[0].date <= initial.date:
+            # merging an older backup on top of a newer consolidation would not
+            # produce the same result as consolidating everything in order
+            logger.info(
+                f"found a backup from {backups[0].date} which is not newer than"
+                f" the previous consolidation ({initial.date}), rebuilding..."
+            )
+            initial = None
+            backups = load(list(sources))
     else:
-        decisions = Decisions(decisions=[], path=decisions_path)
+        initial = None
+        backups = load(list(sources))
+
+    # versions are recorded from the consolidation after each backup, so that
+    # they hold what it keeps from older backups too
+    with _recording_versions(
+        versions_path=versions_path, rebuild=initial is None
+    ) as versions:
+        with decisions:
+            consolidated, pending_reviews = _consolidate(
+                backups=backups,
+                decisions=decisions,
+                initial=initial,
+                interactive=not batch,
+                on_merged=versions.add if versions else None,
+            )
 
-    # Load patches you've decided to apply while correcting corrupted backups
-    patches = Patches.from_files(
-        path_for_activities_patches=Path("patches__activities.csv"),
+        if pending_reviews:
+            # the consolidation is provisional until the reviews are answered, so
+            # it is not written: a rerun after answering them produces the final one
+            count = write_review_file(reviews=pending_reviews, path=review_path)
+            logger.warning(
+                f"{count} completed activities need a review: answer them in"
+                f" {review_path} and run apply_review, then consolidate again"
+            )
+            return
+
+        if batch and review_path.exists():
+            logger.info(f"all reviews are decided, removing {review_path}")
+            review_path.unlink()
+
+        consolidated_path = write_backup_to_file(
+            backup=consolidated,
+            output_dir=output_dir,
+            compact=compact,
+            compression=compression,
+        )
+        if versions:
+            versions.db.commit()
+            logger.info(f"{versions.added} record versions added to {versions_path}")
+
+    write_manifest(
+        manifest=Manifest(
+            consolidated_backup=consolidated_path.name,
+            patches_hash=patches_hash,
+            # hashed once the decisions made while consolidating were written
+            decisions_hash=_hash_decisions(),
+            sources=sources,
+            source_stats=source_stats,
+        ),
+        directory=output_dir,
     )
 
-    backups = _load_all_files(files=sorted(paths), patches=patches)
-    consolidated = _consolidate(backups=backups, decisions=decisions)
-    write_backup_to_file(backup=consolidated, output_dir=Path.cwd())
+
+class _LiveConsolidation:
+    """
+    Consolidation kept in memory while watching: new backups are merged into it
+    as they land, and it is written to disk every now and then.
+
+    Whatever cannot be merged on top of it (a modified or an older backup, new
+    decisions or patches) runs a regular consolidation, which is incremental
+    too, and starts over from its result.
+    """
+
+    def __init__(
+        self,
+        search_dir: Path,
+        cache: BackupCache | None = None,
+        sqlite_path: Path | None = None,
+        compact: bool = False,
+        compression: Compression | None = None,
+        review_path: Path = DEFAULT_REVIEW_PATH,
+    ) -> None:
+        self.search_dir = search_dir
+        self.output_dir = Path.cwd()
+        self.cache = cache
+        self.sqlite_path = sqlite_path
+        self.compact = compact
+        self.compression = compression
+        self.review_path = review_path
+        self.sources: dict[BackupFilename, FileHash] = {}
+        self.source_stats: dict[BackupFilename, FileStat] = {}
+        # backups which were fully written when they were last seen: those which
+        # were there on start, then those reported by the watcher
+        self.settled = {
+            path.name for path in search_dir.glob("fitness-tracker__*.json")
+        }
+        self.patches = Patches.from_files(**PATCHES_PATHS)
+        self.patches_hash = _hash_patches(paths=PATCHES_PATHS.values())
+        self.decisions_hash = _hash_decisions()
+        self.merger = BackupMerger(decisions=_read_decisions(), interactive=False)
+        self.dirty = False
+
+    def resync(self) -> None:
+        """
+        Consolidate the settled backups again, and start over from the result, or
+        from the previous consolidation if it fails
+        """
+        try:
+            main(
+                search_dir=self.search_dir,
+                cache=self.cache,
+                batch=True,
+                review_path=self.review_path,
+                compact=self.compact,
+                compression=self.compression,
+                backup_names=self.settled,
+            )
+        finally:
+            self._start_over()
+
+    def _start_over(self) -> None:
+        self.patches = Patches.from_files(**PATCHES_PATHS)
+        self.patches_hash = _hash_patches(paths=PATCHES_PATHS.values())
+        self.decisions_hash = _hash_decisions()
+        manifest = read_manifest(directory=self.output_dir)
+        initial = None
+        if manifest:
+            initial = read_backup_file(
+                path=self.output_dir / manifest.consolidated_backup, cache=self.cache
+            )
+            self._sync_sqlite(self.output_dir / manifest.consolidated_backup)
+        self.sources = dict(manifest.sources) if manifest else {}
+        self.source_stats = dict(manifest.source_stats) if manifest else {}
+        self.merger = BackupMerger(
+            decisions=_read_decisions(), initial=initial, interactive=False
+        )
+        self.dirty = False
+
+        # backups left out of the consolidation, because they need a review or
+        # because it failed, are merged again: to list them in the review file
+        # as they are answered, or to keep what can be merged
+        unconsolidated = [
+            path
+            for path in sorted(self.search_dir.glob("fitness-tracker__*.json"))
+            if path.name in self.settled and path.name not in self.sources
+        ]
+        if unconsolidated:
+            self._merge(unconsolidated, resync_if_older=False)
+
+    def add(self, paths: list[Path]) -> None:
+        """Merge new backups, or consolidate again if they cannot be merged"""
+        self.settled.update(path.name for path in paths)
+        modified = [
+            path
+            for path in paths
+            if path.name in self.sources
+            and self.source_stats.get(path.name) != stat_file(path)
+        ]
+        if modified:
+            logger.info(f"{modified[0].name} changed, consolidating again...")
+            self.resync()
+            return
+
+        new = [path for path in paths if path.name not in self.sources]
+        if new:
+            self._merge(new, resync_if_older=True)
+
+    def _merge(self, paths: list[Path], resync_if_older: bool) -> None:
+        loaded: list[tuple[Path, Backup]] = []
+        for path in paths:
+            try:
+                loaded.append((path, _load_file(path, self.patches, self.cache)))
+            except LOAD_ERRORS as error:
+                # most likely still being written, it is retried when it changes
+                logger.warning(f"cannot load {path.name} yet: {error}")
+
+        for path, backup in sorted(loaded, key=lambda item: item[1].date):
+            if self.merger.date is not None and backup.date <= self.merger.date:
+                if resync_if_older:
+                    logger.info(f"{path.name} is not newer, consolidating again...")
+                    self.resync()
+                    return
+                logger.warning(f"skipping {path.name}, it is not newer")
+                continue
+
+            self.merger.merge(backup)
+            self.sources[path.name] = hash_file(path)
+            self.source_stats[path.name] = stat_file(path)
+            self.dirty = True
+
+    def flush(self) -> None:
+        """Write the consolidation, unless nothing changed or a review is needed"""
+        if not self.dirty:
+            return
+
+        if self.merger.pending_reviews:
+            count = write_review_file(
+                reviews=self.merger.pending_reviews.values(), path=self.review_path
+            )
+            logger.warning(
+                f"{count} completed activities need a review: answer them in"
+                f" {self.review_path} and run apply_review"
+            )
+            self.dirty = False
+            return
+
+        if self.review_path.exists():
+            self.review_path.unlink()
+
+        consolidated_path = write_backup_to_file(
+            backup=self.merger.result(),
+            output_dir=self.output_dir,
+            compact=self.compact,
+            compression=self.compression,
+        )
+        write_manifest(
+            manifest=Manifest(
+                consolidated_backup=consolidated_path.name,
+                patches_hash=self.patches_hash,
+                decisions_hash=self.decisions_hash,
+                sources=self.sources,
+                source_stats=self.source_stats,
+            ),
+            directory=self.output_dir,
+        )
+        self._sync_sqlite(consolidated_path)
+        self.dirty = False
+
+    def _sync_sqlite(self, consolidated_path: Path) -> None:
+        if not self.sqlite_path:
+            return
+        with closing(sqlite3.connect(self.sqlite_path, isolation_level=None)) as db:
+            result = sync_backup(
+                db=db,
+                backup=read_backup_file(path=consolidated_path, cache=self.cache),
+                file_name=consolidated_path.name,
+                file_hash=hash_file(consolidated_path),
+            )
+        upserted = sum(result.upserted.values())
+        deleted = sum(result.deleted.values())
+        logger.info(
+            f"{upserted} rows inserted or updated and {deleted} rows deleted"
+            f" in {self.sqlite_path}"
+        )
+
+
+async def watch(
+    search_dir: Path,
+    cache: BackupCache | None = None,
+    settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    sqlite_path: Path | None = None,
+    compact: bool = False,
+    compression: Compression | None = None,
+    use_inotify: bool = True,
+) -> None:
+    """
+    Consolidate the backups in `search_dir`, then keep merging new backups as
+    they land until cancelled, writing the consolidation every `flush_interval`
+    """
+    # imported here because it is slow to import, and only needed to watch
+    import asyncio
+
+    live = _LiveConsolidation(
+        search_dir=search_dir,
+        cache=cache,
+        sqlite_path=sqlite_path,
+        compact=compact,
+        compression=compression,
+    )
+    try:
+        live.resync()
+    except LOAD_ERRORS as error:
+        # the backups which failed to load are retried when they change
+        logger.error(f"cannot consolidate {search_dir}: {error}")
+
+    backups = DirectoryWatcher(
+        directory=search_dir,
+        patterns=("fitness-tracker__*.json",),
+        known=live.source_stats,
+        settle_seconds=settle_seconds,
+        poll_interval=poll_interval,
+        use_inotify=use_inotify,
+    )
+    # new decisions (see apply_review) or patches need a regular consolidation
+    inputs = DirectoryWatcher(
+        directory=live.output_dir,
+        patterns=(DECISIONS_PATH.name, *(path.name for path in PATCHES_PATHS.values())),
+        settle_seconds=settle_seconds,
+        poll_interval=poll_interval,
+        use_inotify=use_inotify,
+    )
+    inputs.scan(now=float("inf"))  # only report changes from now on
+
+    # the consolidation is only touched from the event loop thread, and each
+    # step runs to completion without awaiting, so no locking is needed
+    # a backup which fails to load is logged, and retried when it changes
+    async def watch_backups() -> None:
+        async for paths in backups.changes():
+            try:
+                live.add(paths)
+            except LOAD_ERRORS as error:
+                logger.error(f"cannot merge {paths[0].name}: {error}")
+
+    async def watch_inputs() -> None:
+        async for paths in inputs.changes():
+            logger.info(f"{paths[0].name} changed, consolidating again...")
+            try:
+                live.resync()
+            except LOAD_ERRORS as error:
+                logger.error(f"cannot consolidate again: {error}")
+
+    async def flush_periodically() -> None:
+        while True:
+            await asyncio.sleep(flush_interval)
+            live.flush()
+
+    logger.info(f"watching {search_dir} for new backups, press Ctrl+C to stop")
+    try:
+        await asyncio.gather(watch_backups(), watch_inputs(), flush_periodically())
+    finally:
+        live.flush()
 
 
 if __name__ == "__main__":
@@ -118,4 +960,40 @@ if __name__ == "__main__":
 
     logger.debug(f"{sys.argv=}")
 
-    main(search_dir=Path(args.path))
+    with profiling(
+        summary_path=Path(args.profile) if args.profile else None,
+        dump_path=Path(args.profile_dump) if args.profile_dump else None,
+    ):
+        if args.watch:
+            import asyncio
+
+            try:
+                asyncio.run(
+                    watch(
+                        search_dir=Path(args.path),
+                        cache=_build_cache(args),
+                        settle_seconds=args.settle_seconds,
+                        poll_interval=args.poll_interval,
+                        flush_interval=args.flush_interval,
+                        sqlite_path=Path(args.sqlite) if args.sqlite else None,
+                        compact=args.compact,
+                        compression=args.compress,
+                    )
+                )
+            except KeyboardInterrupt:
+                logger.info("stopped watching")
+            sys.exit(0)
+
+        main(
+            search_dir=Path(args.path) if args.path else None,
+            jobs=args.jobs,
+            cache=_build_cache(args),
+            full=args.full,
+            batch=args.batch,
+            compact=args.compact,
+            compression=args.compress,
+            archive_path=Path(args.archive) if args.archive else None,
+            versions_path=Path(args.versions) if args.versions else None,
+            since=args.since,
+            until=args.until,
+        )
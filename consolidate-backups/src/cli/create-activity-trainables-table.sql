@@ -1,4 +1,5 @@
 CREATE TABLE IF NOT EXISTS activities_trainables (
-  activity_id TEXT PRIMARY KEY,
-  trainable_id TEXT
+  activity_id TEXT,
+  trainable_id TEXT,
+  PRIMARY KEY (activity_id, trainable_id)
 )
@@ -0,0 +1,6 @@
+CREATE TABLE IF NOT EXISTS applied_backups (
+  file_hash TEXT PRIMARY KEY,
+  file_name TEXT,
+  backup_date TEXT,
+  applied_at TEXT
+)
@@ -0,0 +1,8 @@
+CREATE INDEX IF NOT EXISTS completed_activities_date
+ON completed_activities (date);
+
+CREATE INDEX IF NOT EXISTS completed_activities_activity_id_date
+ON completed_activities (activity_id, date);
+
+CREATE INDEX IF NOT EXISTS activities_trainables_trainable_id
+ON activities_trainables (trainable_id, activity_id);
@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS activity_rollups (
+  period TEXT,  -- 'day' or 'week'
+  period_start TEXT,  -- YYYY-MM-DD, weeks start on Monday
+  activity_id TEXT,
+  completed_activities INTEGER,
+  PRIMARY KEY (period, activity_id, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS trainable_rollups (
+  period TEXT,  -- 'day' or 'week'
+  period_start TEXT,  -- YYYY-MM-DD, weeks start on Monday
+  trainable_id TEXT,
+  completed_activities INTEGER,
+  PRIMARY KEY (period, trainable_id, period_start)
+);
@@ -0,0 +1,8 @@
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5 (
+  kind UNINDEXED,  -- table the record comes from
+  record_id UNINDEXED,
+  name,
+  other_names,
+  notes,
+  tokenize = 'unicode61 remove_diacritics 2'
+)
@@ -0,0 +1,20 @@
+-- ids of the records touched by a sync, to refresh what derives from them only
+CREATE TEMP TABLE IF NOT EXISTS changed_activities (id TEXT PRIMARY KEY);
+
+CREATE TEMP TABLE IF NOT EXISTS changed_completed_activities (id TEXT PRIMARY KEY);
+
+CREATE TEMP TABLE IF NOT EXISTS changed_trainables (id TEXT PRIMARY KEY);
+
+CREATE TEMP TABLE IF NOT EXISTS rollup_activities (id TEXT PRIMARY KEY);
+
+CREATE TEMP TABLE IF NOT EXISTS rollup_trainables (id TEXT PRIMARY KEY);
+
+DELETE FROM temp.changed_activities;
+
+DELETE FROM temp.changed_completed_activities;
+
+DELETE FROM temp.changed_trainables;
+
+DELETE FROM temp.rollup_activities;
+
+DELETE FROM temp.rollup_trainables;
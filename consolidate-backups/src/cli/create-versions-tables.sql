@@ -0,0 +1,30 @@
+-- every version of every record found in the consolidated backups: a version is
+-- valid from the date of the first backup that holds it, until the date of the
+-- first backup that does not hold it anymore (NULL while it is current)
+CREATE TABLE IF NOT EXISTS record_versions (
+  version_id INTEGER PRIMARY KEY,
+  section TEXT NOT NULL,  -- as named in the backup file, e.g.: completedActivities
+  record_id TEXT NOT NULL,
+  ordinal INTEGER NOT NULL,  -- position of the record among all, when first seen
+  valid_from INTEGER NOT NULL,  -- microseconds since the epoch
+  valid_to INTEGER,
+  data TEXT NOT NULL  -- the record as stored in the backup file, in JSON
+);
+
+CREATE INDEX IF NOT EXISTS record_versions__current
+ON record_versions (section, record_id)
+WHERE valid_to IS NULL;
+
+-- validity interval of every version, to find the versions valid at a given
+-- time without scanning the rest. Coordinates are 32-bit floats rounded outwards,
+-- so matches must be checked again against record_versions
+CREATE VIRTUAL TABLE IF NOT EXISTS record_versions_intervals USING rtree (
+  version_id,
+  valid_from,
+  valid_to
+);
+
+CREATE TABLE IF NOT EXISTS versioned_backups (
+  date_us INTEGER PRIMARY KEY,  -- microseconds since the epoch
+  date TEXT NOT NULL  -- as stored in the backup file
+)
@@ -0,0 +1,19 @@
+-- rows of the search index of the records listed in temp.changed_activities,
+-- temp.changed_completed_activities and temp.changed_trainables, and of the
+-- completed activities of the changed activities. Run before writing the
+-- changed records, as the rows of the deleted ones are found from their rowid
+DELETE FROM search_index
+WHERE rowid IN (
+  SELECT rowid * 4 + 1
+  FROM activities
+  WHERE id IN (SELECT id FROM temp.changed_activities)
+  UNION ALL
+  SELECT rowid * 4 + 2
+  FROM completed_activities
+  WHERE id IN (SELECT id FROM temp.changed_completed_activities)
+  OR activity_id IN (SELECT id FROM temp.changed_activities)
+  UNION ALL
+  SELECT rowid * 4 + 3
+  FROM trainables
+  WHERE id IN (SELECT id FROM temp.changed_trainables)
+);
@@ -0,0 +1,109 @@
+"""
+Show the records added, removed or modified between two backups, or between
+every pair of consecutive backups in a directory, as JSON lines.
+
+Purpose: audit what changed from one backup to the next, e.g.: over a year of
+daily backups, as a batch job which output can be filtered with jq or grep.
+"""
+
+from __future__ import annotations
+
+import sys
+import argparse
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import TextIO
+
+from src.cache import BackupCache
+from src.diff import format_change, iter_changes
+from src.io import read_backup_file
+
+logger = logging.getLogger(__name__)
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--verbose", action="store_true", help="show debug logs")
+    parser.add_argument(
+        "backups", nargs="*", help="two backup files, the older one first"
+    )
+    parser.add_argument(
+        "--path",
+        help="directory with fitness-tracker backups, to compare every backup with"
+        " the previous one",
+    )
+    parser.add_argument(
+        "--output", help="file where the changes are written to (default: stdout)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read nor write the cache of already parsed backups",
+    )
+
+    args = parser.parse_args()
+    if args.path is None and len(args.backups) != 2:
+        parser.error("expected two backup files, or a directory with --path")
+    return args
+
+
+def main(paths: list[Path], output: TextIO, cache: BackupCache | None = None) -> int:
+    """Write the changes between each pair of consecutive backups, return how many"""
+    if len(paths) < 2:
+        logger.warning(f"nothing to compare, found {len(paths)} backups")
+        return 0
+
+    total = 0
+    previous_path = paths[0]
+    previous = read_backup_file(path=previous_path, cache=cache)
+    for path in paths[1:]:
+        backup = read_backup_file(path=path, cache=cache)
+        counts: Counter[str] = Counter()
+        for change in iter_changes(before=previous, after=backup):
+            output.write(
+                format_change(
+                    change, before_file=previous_path.name, after_file=path.name
+                )
+                + "\n"
+            )
+            counts[change.kind] += 1
+
+        logger.info(
+            f"{previous_path.name} -> {path.name}: "
+            + (
+                ", ".join(f"{count} {kind}" for kind, count in counts.items())
+                or "no changes"
+            )
+        )
+        total += sum(counts.values())
+        previous_path, previous = path, backup
+
+    return total
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format=(
+            "%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s"
+            if args.verbose
+            else "%(levelname)s:%(message)s"
+        ),
+    )
+
+    logger.debug(f"{sys.argv=}")
+
+    if args.path:
+        paths = sorted(Path(args.path).glob("fitness-tracker__*.json"))
+    else:
+        paths = [Path(path) for path in args.backups]
+
+    cache = None if args.no_cache else BackupCache()
+    if args.output:
+        with open(args.output, "w") as output:
+            main(paths=paths, output=output, cache=cache)
+    else:
+        main(paths=paths, output=sys.stdout, cache=cache)
@@ -0,0 +1,20 @@
+DELETE FROM activity_rollups;
+
+DELETE FROM trainable_rollups;
+
+INSERT INTO activity_rollups
+SELECT 'day', date(ca.date), ca.activity_id, COUNT(*)
+FROM completed_activities ca
+GROUP BY date(ca.date), ca.activity_id;
+
+INSERT INTO activity_rollups
+SELECT 'week', date(ca.date, 'weekday 0', '-6 days'), ca.activity_id, COUNT(*)
+FROM completed_activities ca
+GROUP BY date(ca.date, 'weekday 0', '-6 days'), ca.activity_id;
+
+INSERT INTO trainable_rollups
+SELECT r.period, r.period_start, at.trainable_id, SUM(r.completed_activities)
+FROM activity_rollups r
+JOIN activities_trainables at
+ON at.activity_id == r.activity_id
+GROUP BY r.period, r.period_start, at.trainable_id;
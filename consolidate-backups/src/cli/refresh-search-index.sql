@@ -0,0 +1,19 @@
+-- the rowid of each row of the index is derived from the rowid of the record
+-- it comes from, so that the rows of some records can be replaced without
+-- scanning the whole index, see refresh-touched-search-index.sql
+DELETE FROM search_index;
+
+INSERT INTO search_index (rowid, kind, record_id, name, other_names, notes)
+SELECT rowid * 4 + 1, 'activity', id, name, other_names, notes
+FROM activities;
+
+INSERT INTO search_index (rowid, kind, record_id, name, other_names, notes)
+SELECT ca.rowid * 4 + 2, 'completed_activity', ca.id, a.name, NULL, ca.notes
+FROM completed_activities ca
+LEFT JOIN activities a
+ON a.id == ca.activity_id
+WHERE ca.notes IS NOT NULL AND ca.notes != '';
+
+INSERT INTO search_index (rowid, kind, record_id, name, other_names, notes)
+SELECT rowid * 4 + 3, 'trainable', id, name, NULL, notes
+FROM trainables;
@@ -0,0 +1,29 @@
+-- same as refresh-rollups.sql, but only for the activities listed in
+-- temp.rollup_activities and the trainables listed in temp.rollup_trainables
+DELETE FROM activity_rollups
+WHERE period IN ('day', 'week')
+AND activity_id IN (SELECT id FROM temp.rollup_activities);
+
+DELETE FROM trainable_rollups
+WHERE period IN ('day', 'week')
+AND trainable_id IN (SELECT id FROM temp.rollup_trainables);
+
+INSERT INTO activity_rollups
+SELECT 'day', date(ca.date), ca.activity_id, COUNT(*)
+FROM completed_activities ca
+WHERE ca.activity_id IN (SELECT id FROM temp.rollup_activities)
+GROUP BY date(ca.date), ca.activity_id;
+
+INSERT INTO activity_rollups
+SELECT 'week', date(ca.date, 'weekday 0', '-6 days'), ca.activity_id, COUNT(*)
+FROM completed_activities ca
+WHERE ca.activity_id IN (SELECT id FROM temp.rollup_activities)
+GROUP BY date(ca.date, 'weekday 0', '-6 days'), ca.activity_id;
+
+INSERT INTO trainable_rollups
+SELECT r.period, r.period_start, at.trainable_id, SUM(r.completed_activities)
+FROM activities_trainables at
+CROSS JOIN activity_rollups r  -- looked up from the links of the trainables
+ON r.period IN ('day', 'week') AND r.activity_id == at.activity_id
+WHERE at.trainable_id IN (SELECT id FROM temp.rollup_trainables)
+GROUP BY r.period, r.period_start, at.trainable_id;
@@ -0,0 +1,26 @@
+-- same as refresh-search-index.sql, but only for the records listed in
+-- temp.changed_activities, temp.changed_completed_activities and
+-- temp.changed_trainables, once their previous rows were deleted with
+-- delete-touched-search-rows.sql. The completed activities of the changed
+-- activities are indexed again too, as they are indexed with the name of their
+-- activity
+INSERT INTO search_index (rowid, kind, record_id, name, other_names, notes)
+SELECT rowid * 4 + 1, 'activity', id, name, other_names, notes
+FROM activities
+WHERE id IN (SELECT id FROM temp.changed_activities);
+
+INSERT INTO search_index (rowid, kind, record_id, name, other_names, notes)
+SELECT ca.rowid * 4 + 2, 'completed_activity', ca.id, a.name, NULL, ca.notes
+FROM completed_activities ca
+LEFT JOIN activities a
+ON a.id == ca.activity_id
+WHERE ca.notes IS NOT NULL AND ca.notes != ''
+AND (
+  ca.id IN (SELECT id FROM temp.changed_completed_activities)
+  OR ca.activity_id IN (SELECT id FROM temp.changed_activities)
+);
+
+INSERT INTO search_index (rowid, kind, record_id, name, other_names, notes)
+SELECT rowid * 4 + 3, 'trainable', id, name, NULL, notes
+FROM trainables
+WHERE id IN (SELECT id FROM temp.changed_trainables);
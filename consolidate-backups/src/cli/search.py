@@ -0,0 +1,80 @@
+"""
+Search activities, trainables and the notes of completed activities in a SQLite
+database created by backup_to_sqlite with --search-index.
+
+Purpose: find records by free text instantly, ranked by relevance, instead of
+scanning every row with `LIKE '%...%'`.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+from src.sqlite import has_search_index, search
+
+logger = logging.getLogger(__name__)
+
+
+class MissingSearchIndex(Exception): ...
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--verbose", action="store_true", help="show debug logs")
+    parser.add_argument("--path", help="SQLite database to search in")
+    parser.add_argument(
+        "--limit", type=int, default=20, help="maximum amount of results to show"
+    )
+    parser.add_argument("query", nargs="+", help="words to search, as prefixes")
+
+    args = parser.parse_args()
+    return args
+
+
+def main(database_path: Path, query: str, limit: int = 20) -> None:
+    if not database_path.exists():
+        raise FileNotFoundError(str(database_path))
+
+    # read only, searching must not touch the database
+    db = sqlite3.connect(f"{database_path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        if not has_search_index(db):
+            raise MissingSearchIndex(
+                f"{database_path} has no search index, rebuild it or sync it with"
+                " backup_to_sqlite --search-index"
+            )
+        results = search(db=db, query=query, limit=limit)
+    finally:
+        db.close()
+
+    if not results:
+        logger.info(f"no matches for {query!r}")
+        return
+
+    for result in results:
+        print(f"{result.kind:<18}  {result.record_id:<16}  {result.snippet}")
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format=(
+            "%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s"
+            if args.verbose
+            else "%(levelname)s:%(message)s"
+        ),
+    )
+
+    logger.debug(f"{sys.argv=}")
+
+    main(
+        database_path=Path(args.path),
+        query=" ".join(args.query),
+        limit=args.limit,
+    )
@@ -0,0 +1,88 @@
+"""
+Check that every reference between the entities of a backup file points to an
+entity which is present in the backup, and export the findings.
+
+Purpose: find out how broken a backup is at once, instead of one log line per
+broken reference.
+"""
+
+from __future__ import annotations
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+from src.cache import BackupCache
+from src.io import read_backup_file
+from src.validation import find_dangling_references
+
+logger = logging.getLogger(__name__)
+
+
+def _build_cli_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=Path(__file__).name, description=__doc__)
+    parser.add_argument("--verbose", action="store_true", help="show debug logs")
+    parser.add_argument("--path", help="JSON backup file to be validated")
+    parser.add_argument(
+        "--output",
+        help="file where the report is written to, as CSV if it ends in .csv or as"
+        " JSON otherwise (default: <backup file name>__report.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read nor write the cache of already parsed backups",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="ignore the cache of already parsed backups, but refresh it",
+    )
+
+    args = parser.parse_args()
+    return args
+
+
+def _build_cache(args: argparse.Namespace) -> BackupCache | None:
+    if args.no_cache:
+        return None
+    return BackupCache(rebuild=args.rebuild_cache)
+
+
+def main(
+    backup_path: Path, output_path: Path | None, cache: BackupCache | None = None
+) -> bool:
+    backup = read_backup_file(path=backup_path, cache=cache)
+    report = find_dangling_references(backup=backup)
+
+    for relation, count in report.counts().items():
+        logger.info(f"{relation}: {count} dangling references")
+
+    output_path = output_path or Path.cwd() / f"{backup_path.name}__report.json"
+    logger.info(f"writing report to {output_path}")
+    report.write(path=output_path)
+
+    return report.is_corrupted
+
+
+if __name__ == "__main__":
+    args = _build_cli_parser()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format=(
+            "%(asctime)s:%(levelname)s:%(filename)s:%(lineno)d:%(message)s"
+            if args.verbose
+            else "%(levelname)s:%(message)s"
+        ),
+    )
+
+    logger.debug(f"{sys.argv=}")
+
+    is_corrupted = main(
+        backup_path=Path(args.path),
+        output_path=Path(args.output) if args.output else None,
+        cache=_build_cache(args),
+    )
+    sys.exit(1 if is_corrupted else 0)
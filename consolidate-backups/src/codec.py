@@ -0,0 +1,401 @@
+"""
+Hand-written conversion between backup JSON data and the model classes.
+
+apischema inspects the type annotations of every field of every record it
+decodes, which dominates the time needed to load large backups. These functions
+do the same conversion for the known models only, using the same camelCase
+aliases and rejecting the same kind of invalid data.
+"""
+
+from __future__ import annotations
+
+import datetime
+import typing
+from typing import Any, Callable, TypeVar
+
+from src.model import (
+    Activity,
+    Backup,
+    CompletedActivity,
+    FieldAlias,
+    JsonDict,
+    Shortcut,
+    Trainable,
+    Training,
+    TrainingActivity,
+)
+
+T = TypeVar("T")
+
+DURATIONS = frozenset(("short", "medium", "long"))
+INTENSITIES = frozenset(("low", "medium", "high"))
+
+
+MODELS = (Activity, CompletedActivity, TrainingActivity, Training, Trainable, Backup)
+
+
+class DecodeError(ValueError): ...
+
+
+def field_aliases(model: type) -> dict[str, str]:
+    """Names of the fields of a model in backup files, by attribute name"""
+    aliases: dict[str, str] = {}
+    for name, hint in typing.get_type_hints(model, include_extras=True).items():
+        for metadata in getattr(hint, "__metadata__", ()):
+            if isinstance(metadata, FieldAlias):
+                aliases[name] = metadata.name
+    return aliases
+
+
+def use_aliases_in_apischema() -> None:
+    """Make apischema use the same field names as this module for the models"""
+    # imported here because importing apischema is slow, and only the tests and
+    # benchmarks comparing it with this module need it
+    from apischema import settings
+
+    aliases: dict[str, str] = {}
+    for model in MODELS:
+        aliases.update(field_aliases(model))
+    settings.aliaser = lambda name: aliases.get(name, name)
+
+
+def _check_keys(data: Any, allowed: frozenset[str], required: frozenset[str]) -> None:
+    if type(data) is not dict:
+        raise DecodeError(f"expected an object, found {type(data).__name__}")
+    keys = data.keys()
+    if not keys <= allowed:
+        unexpected = sorted(keys - allowed)
+        raise DecodeError(f"unexpected properties {unexpected}")
+    if not required <= keys:
+        missing = sorted(required - keys)
+        raise DecodeError(f"missing properties {missing}")
+
+
+def _str(value: Any, name: str) -> str:
+    if type(value) is not str:
+        raise DecodeError(f"{name}: expected type string, found {value!r}")
+    return value
+
+
+def _optional_str(value: Any, name: str) -> str | None:
+    return None if value is None else _str(value, name)
+
+
+def _str_list(value: Any, name: str) -> list[str]:
+    if type(value) is not list:
+        raise DecodeError(f"{name}: expected type array, found {value!r}")
+    for item in value:
+        if type(item) is not str:
+            raise DecodeError(f"{name}: expected type string, found {item!r}")
+    return value
+
+
+_fromisoformat = datetime.datetime.fromisoformat
+
+
+def decode_datetime(value: Any, name: str) -> datetime.datetime:
+    try:
+        return _fromisoformat(value)
+    except (TypeError, ValueError):
+        raise DecodeError(f"{name}: expected a datetime, found {value!r}") from None
+
+
+def _optional_datetime(value: Any, name: str) -> datetime.datetime | None:
+    return None if value is None else decode_datetime(value, name)
+
+
+def _choice(value: Any, choices: frozenset[str], name: str) -> Any:
+    if type(value) is not str or value not in choices:
+        raise DecodeError(f"{name}: expected one of {sorted(choices)}, found {value!r}")
+    return value
+
+
+def _list(
+    value: Any, decode: Callable[[Any], T], name: str, optional: bool = False
+) -> list[T]:
+    if value is None and optional:
+        return None  # type: ignore[return-value]
+    if type(value) is not list:
+        raise DecodeError(f"{name}: expected type array, found {value!r}")
+
+    decoded: list[T] = []
+    for index, item in enumerate(value):
+        try:
+            decoded.append(decode(item))
+        except DecodeError as error:
+            raise DecodeError(f"{name}[{index}]: {error}") from None
+    return decoded
+
+
+_ACTIVITY_KEYS = frozenset(
+    ("id", "name", "otherNames", "lastModified", "trainableIds", "notes")
+)
+_ACTIVITY_REQUIRED = frozenset(("id", "name", "otherNames"))
+
+
+def decode_activity(data: JsonDict) -> Activity:
+    _check_keys(data, _ACTIVITY_KEYS, _ACTIVITY_REQUIRED)
+    trainable_ids = data.get("trainableIds")
+    return Activity(
+        id=_str(data["id"], "id"),
+        name=_str(data["name"], "name"),
+        other_names=_str_list(data["otherNames"], "otherNames"),
+        last_modified=_optional_datetime(data.get("lastModified"), "lastModified"),
+        trainable_ids=(
+            None if trainable_ids is None else _str_list(trainable_ids, "trainableIds")
+        ),
+        notes=_optional_str(data.get("notes"), "notes"),
+    )
+
+
+def encode_activity(activity: Activity) -> JsonDict:
+    last_modified = activity.last_modified
+    return {
+        "id": activity.id,
+        "name": activity.name,
+        "otherNames": activity.other_names,
+        "lastModified": None if last_modified is None else last_modified.isoformat(),
+        "trainableIds": activity.trainable_ids,
+        "notes": activity.notes,
+    }
+
+
+_COMPLETED_ACTIVITY_KEYS = frozenset(
+    ("id", "activityId", "date", "duration", "intensity", "notes", "lastModified")
+)
+_COMPLETED_ACTIVITY_REQUIRED = _COMPLETED_ACTIVITY_KEYS - {"lastModified"}
+
+
+# there are tens of thousands of completed activities per backup, so they are
+# validated with a single expression and built without going through the
+# frozen dataclass __init__, which sets every field via object.__setattr__
+_set_completed_activity_fields = tuple(
+    getattr(CompletedActivity, name).__set__
+    for name in (
+        "id",
+        "activity_id",
+        "date",
+        "duration",
+        "intensity",
+        "notes",
+        "last_modified",
+    )
+)
+
+
+def _validate_completed_activity(data: JsonDict) -> None:
+    _check_keys(data, _COMPLETED_ACTIVITY_KEYS, _COMPLETED_ACTIVITY_REQUIRED)
+    _str(data["id"], "id")
+    _str(data["activityId"], "activityId")
+    decode_datetime(data["date"], "date")
+    _choice(data["duration"], DURATIONS, "duration")
+    _choice(data["intensity"], INTENSITIES, "intensity")
+    _str(data["notes"], "notes")
+    _optional_datetime(data.get("lastModified"), "lastModified")
+
+
+def decode_completed_activity(data: JsonDict) -> CompletedActivity:
+    try:
+        id = data["id"]
+        activity_id = data["activityId"]
+        date = _fromisoformat(data["date"])
+        duration = data["duration"]
+        intensity = data["intensity"]
+        notes = data["notes"]
+        last_modified = data.get("lastModified")
+        if last_modified is not None:
+            last_modified = _fromisoformat(last_modified)
+        is_valid = (
+            type(id) is str
+            and type(activity_id) is str
+            and type(notes) is str
+            and type(duration) is str
+            and duration in DURATIONS
+            and type(intensity) is str
+            and intensity in INTENSITIES
+            and data.keys() <= _COMPLETED_ACTIVITY_KEYS
+        )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        is_valid = False
+
+    if not is_valid:
+        _validate_completed_activity(data)  # raises a detailed error
+        raise DecodeError(f"invalid completed activity: {data!r}")
+
+    (
+        set_id,
+        set_activity_id,
+        set_date,
+        set_duration,
+        set_intensity,
+        set_notes,
+        set_last_modified,
+    ) = _set_completed_activity_fields
+    completed_activity = object.__new__(CompletedActivity)
+    set_id(completed_activity, id)
+    set_activity_id(completed_activity, activity_id)
+    set_date(completed_activity, date)
+    set_duration(completed_activity, duration)
+    set_intensity(completed_activity, intensity)
+    set_notes(completed_activity, notes)
+    set_last_modified(completed_activity, last_modified)
+    return completed_activity
+
+
+def encode_completed_activity(completed_activity: CompletedActivity) -> JsonDict:
+    last_modified = completed_activity.last_modified
+    return {
+        "id": completed_activity.id,
+        "activityId": completed_activity.activity_id,
+        "date": completed_activity.date.isoformat(),
+        "duration": completed_activity.duration,
+        "intensity": completed_activity.intensity,
+        "notes": completed_activity.notes,
+        "lastModified": None if last_modified is None else last_modified.isoformat(),
+    }
+
+
+_TRAINING_ACTIVITY_KEYS = frozenset(("activityId", "duration", "intensity"))
+
+
+def decode_training_activity(data: JsonDict) -> TrainingActivity:
+    _check_keys(data, _TRAINING_ACTIVITY_KEYS, _TRAINING_ACTIVITY_KEYS)
+    return TrainingActivity(
+        activityId=_str(data["activityId"], "activityId"),
+        duration=_choice(data["duration"], DURATIONS, "duration"),
+        intensity=_choice(data["intensity"], INTENSITIES, "intensity"),
+    )
+
+
+def encode_training_activity(training_activity: TrainingActivity) -> JsonDict:
+    return {
+        "activityId": training_activity.activityId,
+        "duration": training_activity.duration,
+        "intensity": training_activity.intensity,
+    }
+
+
+_TRAINING_KEYS = frozenset(("id", "name", "activities", "lastModified", "isOneOff"))
+_TRAINING_REQUIRED = frozenset(("id", "name", "activities"))
+
+
+def decode_training(data: JsonDict) -> Training:
+    _check_keys(data, _TRAINING_KEYS, _TRAINING_REQUIRED)
+    is_oneoff = data.get("isOneOff")
+    if is_oneoff is not None and type(is_oneoff) is not bool:
+        raise DecodeError(f"isOneOff: expected type boolean, found {is_oneoff!r}")
+    return Training(
+        id=_str(data["id"], "id"),
+        name=_str(data["name"], "name"),
+        activities=_list(data["activities"], decode_training_activity, "activities"),
+        last_modified=_optional_datetime(data.get("lastModified"), "lastModified"),
+        is_oneoff=is_oneoff,
+    )
+
+
+def encode_training(training: Training) -> JsonDict:
+    last_modified = training.last_modified
+    return {
+        "id": training.id,
+        "name": training.name,
+        "activities": [
+            encode_training_activity(activity) for activity in training.activities
+        ],
+        "lastModified": None if last_modified is None else last_modified.isoformat(),
+        "isOneOff": training.is_oneoff,
+    }
+
+
+_TRAINABLE_KEYS = frozenset(("id", "name", "notes", "lastModified"))
+_TRAINABLE_REQUIRED = frozenset(("id", "name", "notes"))
+
+
+def decode_trainable(data: JsonDict) -> Trainable:
+    _check_keys(data, _TRAINABLE_KEYS, _TRAINABLE_REQUIRED)
+    return Trainable(
+        id=_str(data["id"], "id"),
+        name=_str(data["name"], "name"),
+        notes=_str(data["notes"], "notes"),
+        last_modified=_optional_datetime(data.get("lastModified"), "lastModified"),
+    )
+
+
+def encode_trainable(trainable: Trainable) -> JsonDict:
+    last_modified = trainable.last_modified
+    return {
+        "id": trainable.id,
+        "name": trainable.name,
+        "notes": trainable.notes,
+        "lastModified": None if last_modified is None else last_modified.isoformat(),
+    }
+
+
+def decode_shortcut(data: Any) -> Shortcut:
+    return _str(data, "shortcut")
+
+
+_BACKUP_KEYS = frozenset(
+    (
+        "date",
+        "activities",
+        "completedActivities",
+        "trainings",
+        "trainables",
+        "shortcuts",
+    )
+)
+_BACKUP_REQUIRED = frozenset(("date", "activities", "completedActivities"))
+
+
+def decode_backup(data: JsonDict) -> Backup:
+    _check_keys(data, _BACKUP_KEYS, _BACKUP_REQUIRED)
+    return Backup(
+        date=decode_datetime(data["date"], "date"),
+        activities=_list(data["activities"], decode_activity, "activities"),
+        completed_activities=_list(
+            data["completedActivities"],
+            decode_completed_activity,
+            "completedActivities",
+        ),
+        trainings=_list(
+            data.get("trainings"), decode_training, "trainings", optional=True
+        ),
+        trainables=_list(
+            data.get("trainables"), decode_trainable, "trainables", optional=True
+        ),
+        shortcuts=_list(
+            data.get("shortcuts"), decode_shortcut, "shortcuts", optional=True
+        ),
+    )
+
+
+def encode_backup(backup: Backup) -> JsonDict:
+    return {
+        "date": backup.date.isoformat(),
+        "activities": [encode_activity(activity) for activity in backup.activities],
+        "completedActivities": [
+            encode_completed_activity(completed_activity)
+            for completed_activity in backup.completed_activities
+        ],
+        "trainings": (
+            None
+            if backup.trainings is None
+            else [encode_training(training) for training in backup.trainings]
+        ),
+        "trainables": (
+            None
+            if backup.trainables is None
+            else [encode_trainable(trainable) for trainable in backup.trainables]
+        ),
+        "shortcuts": backup.shortcuts,
+    }
+
+
+# decoder of the records found in each array of a backup file
+SECTION_DECODERS: dict[str, Callable[[Any], Any]] = {
+    "activities": decode_activity,
+    "completedActivities": decode_completed_activity,
+    "trainings": decode_training,
+    "trainables": decode_trainable,
+    "shortcuts": decode_shortcut,
+}
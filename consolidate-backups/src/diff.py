@@ -0,0 +1,128 @@
+"""
+Structural diff between two backups: which records were added, removed or
+modified, per section of the backup.
+
+Records are matched by id in a single pass over each section. Most records do
+not change from one backup to the next, so a record is only compared field by
+field when it is not the same object and its `last_modified` did not change
+already.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Literal, TypeAlias
+
+from src.codec import (
+    encode_activity,
+    encode_completed_activity,
+    encode_trainable,
+    encode_training,
+)
+from src.model import Backup, JsonDict
+
+ChangeKind: TypeAlias = Literal["added", "removed", "modified"]
+
+# section in the backup file, attribute in `Backup` and encoder of its records
+RECORD_SECTIONS: tuple[tuple[str, str, Callable[[Any], JsonDict]], ...] = (
+    ("activities", "activities", encode_activity),
+    ("completedActivities", "completed_activities", encode_completed_activity),
+    ("trainings", "trainings", encode_training),
+    ("trainables", "trainables", encode_trainable),
+)
+
+
+@dataclass(frozen=True)
+class Change:
+    section: str  # as named in the backup file, e.g.: "completedActivities"
+    id: str
+    kind: ChangeKind
+    fields: tuple[str, ...] = ()  # modified fields, as named in the backup file
+    before: Any = None  # record as stored in the backup file
+    after: Any = None
+
+    def to_json(self) -> JsonDict:
+        return {
+            "section": self.section,
+            "id": self.id,
+            "kind": self.kind,
+            "fields": list(self.fields),
+            "before": self.before,
+            "after": self.after,
+        }
+
+
+def _is_unchanged(before: Any, after: Any) -> bool:
+    if before is after:
+        return True
+    if before.last_modified != after.last_modified:
+        return False
+    return before == after
+
+
+def _diff_records(
+    section: str,
+    before: list[Any] | None,
+    after: list[Any] | None,
+    encode: Callable[[Any], JsonDict],
+) -> Iterator[Change]:
+    # with duplicated ids, the last record with each id is the one compared
+    before_by_id = {record.id: record for record in before or []}
+    after_ids: set[str] = set()
+
+    for record in after or []:
+        after_ids.add(record.id)
+        previous = before_by_id.get(record.id)
+        if previous is None:
+            yield Change(
+                section=section, id=record.id, kind="added", after=encode(record)
+            )
+        elif not _is_unchanged(previous, record):
+            old, new = encode(previous), encode(record)
+            yield Change(
+                section=section,
+                id=record.id,
+                kind="modified",
+                fields=tuple(key for key in new if old.get(key) != new[key]),
+                before=old,
+                after=new,
+            )
+
+    for id, record in before_by_id.items():
+        if id not in after_ids:
+            yield Change(section=section, id=id, kind="removed", before=encode(record))
+
+
+def _diff_shortcuts(
+    before: list[str] | None, after: list[str] | None
+) -> Iterator[Change]:
+    before_set, after_set = set(before or []), set(after or [])
+    for shortcut in after or []:
+        if shortcut not in before_set:
+            yield Change(section="shortcuts", id=shortcut, kind="added", after=shortcut)
+    for shortcut in before or []:
+        if shortcut not in after_set:
+            yield Change(
+                section="shortcuts", id=shortcut, kind="removed", before=shortcut
+            )
+
+
+def iter_changes(before: Backup, after: Backup) -> Iterator[Change]:
+    """
+    Yield the changes from `before` to `after`, section by section: added and
+    modified records in the order of `after`, then removed records
+    """
+    for section, attribute, encode in RECORD_SECTIONS:
+        yield from _diff_records(
+            section=section,
+            before=getattr(before, attribute),
+            after=getattr(after, attribute),
+            encode=encode,
+        )
+    yield from _diff_shortcuts(before=before.shortcuts, after=after.shortcuts)
+
+
+def format_change(change: Change, **context: Any) -> str:
+    """JSON line of the change, with `context` (e.g.: file names) prepended"""
+    return json.dumps({**context, **change.to_json()}, separators=(",", ":"))
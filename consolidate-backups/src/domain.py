@@ -1,24 +1,40 @@
 from __future__ import annotations
+import csv
 import json
+import os
 from pathlib import Path
-from apischema import deserialize
-import pandas as pd
-from dataclasses import dataclass, asdict, replace
+from dataclasses import dataclass, field, replace
 import datetime
+import functools
 import logging
-from typing import Literal, TypeAlias
+from typing import (
+    Any,
+    Callable,
+    Generic,
+    Iterable,
+    Iterator,
+    Literal,
+    TypeAlias,
+    TextIO,
+    TypeVar,
+)
 from src.model import (
     Activity,
     ActivityId,
+    ActivityName,
     Backup,
     CompletedActivity,
     CompletedActivityId,
     JsonDict,
+    Shortcut,
     TrainableId,
     Trainable,
     Training,
 )
+from src.codec import decode_datetime, decode_training_activity
+from src.instrumentation import count_records, stage
 from src.io import read_csv
+from src.validation import find_dangling_references
 
 logger = logging.getLogger(__name__)
 
@@ -26,165 +42,438 @@ logger = logging.getLogger(__name__)
 class CorruptedBackup(Exception): ...
 
 
+# maximum number of broken references logged for each kind of reference
+MAX_LOGGED_REFERENCES = 5
+
+
 def is_backup_corrupted(*, backup: Backup) -> bool:
-    is_corrupted = False
-
-    trainables: set[TrainableId] = {
-        trainable.id for trainable in (backup.trainables or set())
-    }
-
-    # every Activity must point to existing Trainables
-    activities: set[ActivityId] = set()
-    for activity in backup.activities:
-        activities.add(activity.id)
-        for trainable_id in activity.trainable_ids or set[Trainable]():
-            if trainable_id not in trainables:
-                logger.warning(
-                    "corrupted-backup: "
-                    f"Activity {activity.id!r} points to an Trainable"
-                    f" {trainable_id!r} which is not present in the backup"
-                )
-                is_corrupted = True
-
-    # every CompletedActivity must point to an existing Activity
-    for completed_activity in backup.completed_activities:
-        if completed_activity.activity_id not in activities:
-            logger.warning(
-                "corrupted-backup: "
-                f"CompletedActivity {completed_activity.id!r} points to an"
-                f" Activity {completed_activity.activity_id!r} which is not"
-                " present in the backup"
-            )
-            is_corrupted = True
-
-    # every Training must point to existing Activities
-    for training in backup.trainings or set[Training]():
-        for training_activity in training.activities:
-            if training_activity.activityId not in activities:
-                logger.warning(
-                    "corrupted-backup: "
-                    f"Training {training.id!r} points to an Activity"
-                    f" {training_activity.activityId!r} which is not present in"
-                    " the backup"
-                )
-                is_corrupted = True
-
-    # every Shortcut must point to existing Activities
-    for shortcut_activity_id in backup.shortcuts or set():
-        if shortcut_activity_id not in activities:
-            logger.warning(
-                "corrupted-backup: "
-                f"The Activity {shortcut_activity_id!r} is used in the"
-                " shortcuts but this Activity is not present in the backup"
-            )
-            is_corrupted = True
+    with stage("validate") as current:
+        report = find_dangling_references(backup=backup)
+        current.records = count_records(backup)
+
+    for relation, count in report.counts().items():
+        if not count:
+            continue
+        examples = ", ".join(
+            f"{reference.source_id!r}->{reference.target_id!r}"
+            for reference in report.by_relation(relation)[:MAX_LOGGED_REFERENCES]
+        )
+        logger.warning(
+            f"corrupted-backup: found {count} {relation} references pointing to"
+            f" entities which are not present in the backup, e.g.: {examples}"
+        )
+
+    return report.is_corrupted
+
+
+class UnsupportedPatch(Exception): ...
+
+
+PatchedEntity: TypeAlias = Literal[
+    "activities", "completed_activities", "trainings", "trainables"
+]
+PatchedRecord: TypeAlias = Activity | CompletedActivity | Training | Trainable
+# returns the patched record, or None if the record must be deleted
+PatchAction: TypeAlias = Callable[[Any, Any], Any]
+
+
+def _override(field_name: str) -> PatchAction:
+    def apply(record: Any, payload: Any) -> Any:
+        return replace(record, **{field_name: payload})
 
-    return is_corrupted
+    return apply
+
+
+def _override_datetime(field_name: str) -> PatchAction:
+    def apply(record: Any, payload: Any) -> Any:
+        return replace(record, **{field_name: decode_datetime(payload, field_name)})
+
+    return apply
+
+
+def _override_training_activities(training: Training, payload: Any) -> Training:
+    activities = [decode_training_activity(activity) for activity in payload]
+    return replace(training, activities=activities)
+
+
+def _delete(record: Any, payload: Any) -> None:
+    return None
+
+
+PATCH_ACTIONS: dict[PatchedEntity, dict[str, PatchAction]] = {
+    "activities": {
+        "override_trainables": _override("trainable_ids"),
+        "override_name": _override("name"),
+        "override_other_names": _override("other_names"),
+        "override_notes": _override("notes"),
+        "delete": _delete,
+    },
+    "completed_activities": {
+        "override_activity": _override("activity_id"),
+        "override_date": _override_datetime("date"),
+        "override_duration": _override("duration"),
+        "override_intensity": _override("intensity"),
+        "override_notes": _override("notes"),
+        "delete": _delete,
+    },
+    "trainings": {
+        "override_name": _override("name"),
+        "override_activities": _override_training_activities,
+        "delete": _delete,
+    },
+    "trainables": {
+        "override_name": _override("name"),
+        "override_notes": _override("notes"),
+        "delete": _delete,
+    },
+}
+
+# column of the patches CSV file that holds the id of the patched record
+PATCH_ID_COLUMNS: dict[PatchedEntity, str] = {
+    "activities": "activity_id",
+    "completed_activities": "completed_activity_id",
+    "trainings": "training_id",
+    "trainables": "trainable_id",
+}
 
 
 @dataclass(frozen=True)
-class ActivitiesPatch:
+class RecordPatch:
     backup_file: str  # only the file name, not the full path
-    activity_id: ActivityId
-    action: Literal["override_trainables"]
-    payload: JsonDict
+    entity: PatchedEntity
+    record_id: str
+    action: str
+    payload: Any
     rationale: str
 
+    def __post_init__(self) -> None:
+        if self.action not in PATCH_ACTIONS[self.entity]:
+            raise UnsupportedPatch(
+                f"unrecognized action for {self.entity}: {self.action!r}, expected"
+                f" one of: {', '.join(PATCH_ACTIONS[self.entity])}"
+            )
+
     @staticmethod
-    def from_csv(csv: JsonDict) -> ActivitiesPatch:
-        return ActivitiesPatch(
+    def from_csv(csv: JsonDict, entity: PatchedEntity) -> RecordPatch:
+        return RecordPatch(
             backup_file=csv["backup_file"],
-            activity_id=csv["activity_id"],
+            entity=entity,
+            record_id=csv[PATCH_ID_COLUMNS[entity]],
             action=csv["action"],
-            payload=json.loads(csv["payload"]),
+            payload=json.loads(csv["payload"]) if csv["payload"] else None,
             rationale=csv["rationale"],
         )
 
-    def apply_to(self, backup: Backup) -> Backup:
-        updated_activities: list[Activity] = []
-        for activity in backup.activities:
-            if self.activity_id == activity.id:
-                if self.action == "override_trainables":
-                    updated_activity = replace(activity, trainable_ids=self.payload)
-                else:
-                    raise NotImplementedError(f"unrecognized action: {self.action!r}")
-                updated_activities.append(updated_activity)
-                continue
-            updated_activities.append(activity)
-
-        return replace(backup, activities=updated_activities)
+    def apply_to_record(self, record: PatchedRecord) -> PatchedRecord | None:
+        return PATCH_ACTIONS[self.entity][self.action](record, self.payload)
 
 
 BackupFilename: TypeAlias = str
 
 
+@dataclass(frozen=True)
+class BackupPatches:
+    """Patches of a single backup, grouped by entity and by record id"""
+
+    by_entity: dict[PatchedEntity, dict[str, list[RecordPatch]]]
+
+    def __len__(self) -> int:
+        return sum(
+            len(patches)
+            for by_id in self.by_entity.values()
+            for patches in by_id.values()
+        )
+
+    def _apply(
+        self, entity: PatchedEntity, records: list[Any] | None
+    ) -> list[Any] | None:
+        by_id = self.by_entity.get(entity)
+        if not by_id or records is None:
+            return records
+
+        patched: list[Any] = []
+        found: set[str] = set()
+        for record in records:
+            if record.id in by_id:
+                found.add(record.id)
+                for patch in by_id[record.id]:
+                    record = patch.apply_to_record(record)
+                    if record is None:
+                        break
+                if record is None:
+                    continue
+            patched.append(record)
+
+        for record_id in by_id.keys() - found:
+            logger.warning(f"patched {entity} record {record_id!r} not found")
+
+        return patched
+
+    def apply_to(self, backup: Backup) -> Backup:
+        """Apply all patches in a single pass over each list of records"""
+        with stage("patch") as current:
+            current.records = len(self)
+            return replace(
+                backup,
+                activities=self._apply("activities", backup.activities),
+                completed_activities=self._apply(
+                    "completed_activities", backup.completed_activities
+                ),
+                trainings=self._apply("trainings", backup.trainings),
+                trainables=self._apply("trainables", backup.trainables),
+            )
+
+
 @dataclass(frozen=True)
 class Patches:
-    activities: dict[BackupFilename, list[ActivitiesPatch]]
+    by_backup: dict[BackupFilename, BackupPatches] = field(default_factory=dict)
+
+    @staticmethod
+    def from_patches(patches: Iterable[RecordPatch]) -> Patches:
+        """Group patches per backup, entity and record id, keeping their order"""
+        grouped: dict[
+            BackupFilename, dict[PatchedEntity, dict[str, list[RecordPatch]]]
+        ] = {}
+        for patch in patches:
+            by_entity = grouped.setdefault(patch.backup_file, {})
+            by_id = by_entity.setdefault(patch.entity, {})
+            by_id.setdefault(patch.record_id, []).append(patch)
+
+        return Patches(
+            by_backup={
+                backup_file: BackupPatches(by_entity=by_entity)
+                for backup_file, by_entity in grouped.items()
+            }
+        )
 
     @staticmethod
     def from_files(
         path_for_activities_patches: Path | None = None,
-        # path_for_other_patches: Path | None = None,
+        path_for_completed_activities_patches: Path | None = None,
+        path_for_trainings_patches: Path | None = None,
+        path_for_trainables_patches: Path | None = None,
     ) -> Patches:
-        activities_patches: dict[BackupFilename, list[ActivitiesPatch]] = {}
-        for row in read_csv(path_for_activities_patches):
-            patch = ActivitiesPatch.from_csv(csv=row)
-            previous = activities_patches.get(patch.backup_file, [])
-            activities_patches[patch.backup_file] = [*previous, patch]
+        paths: dict[PatchedEntity, Path | None] = {
+            "activities": path_for_activities_patches,
+            "completed_activities": path_for_completed_activities_patches,
+            "trainings": path_for_trainings_patches,
+            "trainables": path_for_trainables_patches,
+        }
+
+        def read_patches() -> Iterator[RecordPatch]:
+            for entity, path in paths.items():
+                if path is None or not path.exists():
+                    continue
+                for row in read_csv(path):
+                    yield RecordPatch.from_csv(csv=row, entity=entity)
 
-        return Patches(activities=activities_patches)
+        return Patches.from_patches(read_patches())
 
-    def get(self, backup_filename: str) -> list[Patcher]:
-        return [
-            *self.activities.get(backup_filename, []),
-            # self.other_stuff.get(backup_filename, []),
-        ]
+    def get(self, backup_filename: str) -> BackupPatches | None:
+        return self.by_backup.get(backup_filename)
 
 
-def merge_activites(earliest: Backup, latest: Backup) -> list[Activity]:
-    merged: dict[ActivityId, Activity] = {
-        activity.id: activity for activity in latest.activities
-    }
+Id = TypeVar("Id", bound=str)
+Record = TypeVar("Record")
 
-    lower_boundary, upper_boundary = latest.time_range
-    for old_activity in earliest.activities:
-        if old_activity.id in merged:
-            continue  # a newer version has already been included in the result
 
-        # :S the old backup has an activity which does not exist in the new
-        # backup, either:
-        #    a) you've found one of the old backups created when the old records
-        #       were removed from the app after backing them up (which is no
-        #       longer the case)
-        #    b) this records has been deleted on purpose
-        #    c) this records has been deleted by mistake
-        # if (b) or (c) are the case, then the user should be prompted
-        if old_activity.last_modified < lower_boundary:
-            # the activity was created
-            ...
-        logger.error(f"found some activities")
-        breakpoint()
+class _RecordIndex(Generic[Id, Record]):
+    """
+    Records of the latest merged backup, followed by the older records that were
+    kept despite being missing from later backups.
 
-    return list(merged.values())
+    Records are listed in the same order as merging backups in pairs would list
+    them: first the records of the latest backup, then the kept records, from
+    the most recently to the least recently seen.
+    """
 
+    def __init__(self) -> None:
+        self.latest: dict[Id, Record] = {}
+        # one block per merged backup, with the records that went missing in it
+        self._kept_blocks: list[dict[Id, Record]] = []
 
-def merge_completed_activities(
-    earliest: Backup, latest: Backup, decisions: Decisions
-) -> list[CompletedActivity]:
-    merged: dict[CompletedActivityId, CompletedActivity] = {
-        completed_activity.id: completed_activity
-        for completed_activity in latest.completed_activities
-    }
+    def __iter__(self) -> Iterator[Record]:
+        yield from self.latest.values()
+        for block in reversed(self._kept_blocks):
+            yield from block.values()
 
-    activities = {act.id: act for act in earliest.activities}
+    def __getitem__(self, id: Id) -> Record:
+        if id in self.latest:
+            return self.latest[id]
+        for block in self._kept_blocks:
+            if id in block:
+                return block[id]
+        raise KeyError(id)
+
+    def update(
+        self, records: dict[Id, Record], must_keep: Callable[[Record], bool]
+    ) -> None:
+        """
+        Replace the latest records, and decide what to do with each record that
+        is missing from them
+        """
+        new_block: dict[Id, Record] = {}
+        for id, record in self.latest.items():
+            if id not in records and must_keep(record):
+                new_block[id] = record
+
+        for block in reversed(self._kept_blocks):
+            for id, record in list(block.items()):
+                if id in records:
+                    pass  # a newer version exists, the kept one is obsolete
+                elif must_keep(record):
+                    continue
+                del block[id]
 
-    lower_boundary, upper_boundary = latest.time_range
+        self._kept_blocks = [block for block in self._kept_blocks if block]
+        if new_block:
+            self._kept_blocks.append(new_block)
 
-    for old_completed_activity in earliest.completed_activities:
+        self.latest = records
+
+
+@dataclass(frozen=True)
+class PendingReview:
+    """A completed activity missing from a backup, which the user must review"""
+
+    id: CompletedActivityId
+    activity_id: ActivityId
+    activity_name: ActivityName
+    date: datetime.datetime
+    lower_boundary: datetime.datetime  # time range of the backup it is missing in
+    upper_boundary: datetime.datetime
+    backup_date: datetime.datetime
+
+
+class BackupMerger:
+    """
+    Merge backups one after another, from the earliest to the latest one.
+
+    Instead of rebuilding a whole `Backup` on every merge, a single index per
+    entity type is kept and only the records missing from each new backup are
+    looked at.
+
+    If `interactive` is False, the user is not prompted about the completed
+    activities missing from a backup that have no previous decision: they are
+    kept and listed in `pending_reviews` instead.
+    """
+
+    def __init__(
+        self,
+        decisions: Decisions,
+        initial: Backup | None = None,
+        interactive: bool = True,
+    ) -> None:
+        self.decisions = decisions
+        self.interactive = interactive
+        self.pending_reviews: dict[CompletedActivityId, PendingReview] = {}
+        self.date: datetime.datetime | None = None
+        self.trainings: list[Training] | None = None
+        self.shortcuts: list[Shortcut] | None = None
+        self.activities = _RecordIndex[ActivityId, Activity]()
+        self.completed_activities = _RecordIndex[
+            CompletedActivityId, CompletedActivity
+        ]()
+        self.trainables = _RecordIndex[TrainableId, Trainable]()
+
+        if initial:
+            self.date = initial.date
+            self.trainings = initial.trainings
+            self.shortcuts = initial.shortcuts
+            self.activities.latest = {act.id: act for act in initial.activities}
+            self.completed_activities.latest = {
+                cpa.id: cpa for cpa in initial.completed_activities
+            }
+            self.trainables.latest = {
+                trainable.id: trainable for trainable in (initial.trainables or [])
+            }
+
+    def merge(self, backup: Backup) -> None:
+        if self.date is not None and backup.date < self.date:
+            raise ValueError(
+                f"backups must be merged in chronological order, but backup"
+                f" {backup.date} was merged after {self.date}"
+            )
+
+        logger.info(f"merging backups: earliest={self.date} latest={backup.date}")
+        with stage("merge") as current:
+            self._merge(backup)
+            current.records = count_records(backup)
+
+    def _merge(self, backup: Backup) -> None:
+        # the completed activities must be merged before the activities are
+        # replaced, because the user is shown the name of the activities which
+        # were in the earliest backup
+        self.completed_activities.update(
+            records={cpa.id: cpa for cpa in backup.completed_activities},
+            must_keep=functools.partial(
+                self._must_keep_completed_activity,
+                latest=backup,
+                activities=self.activities,
+            ),
+        )
+
+        # computed once per merge, and only if an activity went missing
+        @functools.cache
+        def referenced_activity_ids() -> frozenset[ActivityId]:
+            return frozenset(cpa.activity_id for cpa in self.completed_activities)
+
+        self.activities.update(
+            records={activity.id: activity for activity in backup.activities},
+            must_keep=functools.partial(
+                self._must_keep_activity,
+                referenced_activity_ids=referenced_activity_ids,
+            ),
+        )
+        if backup.trainables is not None:
+            self.trainables.update(
+                records={trainable.id: trainable for trainable in backup.trainables},
+                must_keep=lambda _: True,  # we want to keep the latest version
+            )
+
+        self.date = backup.date
+        self.trainings = backup.trainings
+        self.shortcuts = backup.shortcuts
+
+    def result(self) -> Backup:
+        if self.date is None:
+            raise ValueError("expected at least one backup to be merged")
+
+        return Backup(
+            date=self.date,
+            activities=list(self.activities),
+            completed_activities=list(self.completed_activities),
+            trainings=self.trainings,
+            trainables=list(self.trainables),
+            shortcuts=self.shortcuts,
+        )
+
+    def _must_keep_activity(
+        self,
+        old_activity: Activity,
+        referenced_activity_ids: Callable[[], frozenset[ActivityId]],
+    ) -> bool:
+        # the old backup has an activity which does not exist in the new backup,
+        # it was deleted from the app, but the completed activities kept from
+        # older backups (see `_must_keep_completed_activity`) may still refer to
+        # it: it is kept as long as they do, so that the consolidated backup has
+        # no dangling references, and dropped otherwise. Nothing else can refer
+        # to it, trainings and shortcuts come from the latest backup
+        old_id = old_activity.id
+        if old_id in referenced_activity_ids():
+            logger.info(f"keeping {old_id!r}, deleted but still referenced")
+            return True
+
+        logger.info(f"dropping {old_id!r}, deleted and no longer referenced")
+        return False
+
+    def _must_keep_completed_activity(
+        self,
+        old_completed_activity: CompletedActivity,
+        latest: Backup,
+        activities: _RecordIndex[ActivityId, Activity],
+    ) -> bool:
         old_id = old_completed_activity.id
-        if old_id in merged:
-            continue  # a newer version has already been included in the result
 
         # :S the old backup has a completed activity which does not exist in the
         # new backup, either:
@@ -194,68 +483,71 @@ def merge_completed_activities(
         #    b) this records has been deleted on purpose
         #    c) this records has been deleted by mistake
         # if (b) or (c) are the case, then the user should be prompted
+        lower_boundary, upper_boundary = latest.time_range
 
         if old_completed_activity.date < lower_boundary:
             # the CompletedActivity from the old backup happened before the time
             # range of the new backup, this is case (a)
-            merged[old_id] = old_completed_activity
-        else:
-            # the old CompletedActivity in the old backup happened inside the
-            # time range of the new backup, this is case either (b) or (c)
-            logger.info(f"earliest backup contains {old_id!r} but the latest doesn't")
-            logger.info(f"looking for previous decisions regarding {old_id!r}...")
-            if previous_decision := decisions.find(id=old_id):
-                if previous_decision.must_be_deleted:
-                    logger.info(f"found decision: {old_id!r} must be deleted")
-                    continue
-                else:
-                    logger.info(f"found decision: {old_id!r} must be kept")
-                    merged[old_id] = old_completed_activity
+            return True
+
+        # the old CompletedActivity in the old backup happened inside the time
+        # range of the new backup, this is case either (b) or (c)
+        logger.info(f"earliest backup contains {old_id!r} but the latest doesn't")
+        logger.info(f"looking for previous decisions regarding {old_id!r}...")
+        if previous_decision := self.decisions.find(id=old_id):
+            if previous_decision.must_be_deleted:
+                logger.info(f"found decision: {old_id!r} must be deleted")
+                return False
             else:
-                activity = activities[old_completed_activity.activity_id]
-                print()
-                print()
-                print(f"lower_boundary:              {lower_boundary}")
-                print(f"upper_boundary:              {upper_boundary}")
-                print(f"old_completed_activity.date: {old_completed_activity.date}")
-                print(
-                    f"the {CompletedActivity.__name__} {old_id!r} ({activity.name})"
-                    " exists in old backup, but it's not in the new backup"
-                )
-                print()
-                must_delete = ask_user_if_comp_activity_should_be_deleted(id=old_id)
-                decisions.decide(
-                    id=old_id,
-                    reviewed_at=datetime.datetime.now(tz=datetime.timezone.utc),
-                    must_be_deleted=must_delete,
-                )
-                if must_delete:
-                    logger.info(f"decision made: {old_id!r} must be deleted")
-                    continue
-                else:
-                    logger.info(f"decision made: {old_id!r} must be kept")
-                    merged[old_id] = old_completed_activity
-
-    return list(merged.values())
-
-
-def merge_trainables(
-    earliest: list[Trainable], latest: list[Trainable]
-) -> list[Trainable]:
-    if latest is None:
-        return earliest or []
-
-    merged: dict[TrainableId, Trainable] = {
-        trainable.id: trainable for trainable in latest
-    }
-
-    for old_trainable in earliest:
-        if old_trainable.id in merged:
-            continue  # we want to keep the latest version
+                logger.info(f"found decision: {old_id!r} must be kept")
+                return True
+
+        activity = activities[old_completed_activity.activity_id]
+        if not self.interactive:
+            logger.info(f"no decision found for {old_id!r}, keeping it until reviewed")
+            self.pending_reviews[old_id] = PendingReview(
+                id=old_id,
+                activity_id=activity.id,
+                activity_name=activity.name,
+                date=old_completed_activity.date,
+                lower_boundary=lower_boundary,
+                upper_boundary=upper_boundary,
+                backup_date=latest.date,
+            )
+            return True
+
+        print()
+        print()
+        print(f"lower_boundary:              {lower_boundary}")
+        print(f"upper_boundary:              {upper_boundary}")
+        print(f"old_completed_activity.date: {old_completed_activity.date}")
+        print(
+            f"the {CompletedActivity.__name__} {old_id!r} ({activity.name})"
+            " exists in old backup, but it's not in the new backup"
+        )
+        print()
+        must_delete = ask_user_if_comp_activity_should_be_deleted(id=old_id)
+        self.decisions.decide(
+            id=old_id,
+            reviewed_at=datetime.datetime.now(tz=datetime.timezone.utc),
+            must_be_deleted=must_delete,
+        )
+        if must_delete:
+            logger.info(f"decision made: {old_id!r} must be deleted")
+            return False
         else:
-            merged[old_trainable.id] = old_trainable
+            logger.info(f"decision made: {old_id!r} must be kept")
+            return True
+
 
-    return list(merged.values())
+def merge_all_backups(
+    backups: Iterable[Backup], decisions: Decisions, initial: Backup | None = None
+) -> Backup:
+    """Merge chronologically sorted backups, optionally on top of `initial`"""
+    merger = BackupMerger(decisions=decisions, initial=initial)
+    for backup in backups:
+        merger.merge(backup)
+    return merger.result()
 
 
 def merge_backups(a: Backup, b: Backup, decisions: Decisions) -> Backup:
@@ -264,20 +556,7 @@ def merge_backups(a: Backup, b: Backup, decisions: Decisions) -> Backup:
     else:
         earliest, latest = b, a
 
-    logger.info(f"merging backups: earliest={earliest.date} latest={latest.date}")
-
-    return Backup(
-        date=latest.date,
-        activities=merge_activites(earliest=earliest, latest=latest),
-        completed_activities=merge_completed_activities(
-            earliest=earliest, latest=latest, decisions=decisions
-        ),
-        trainings=latest.trainings,
-        trainables=merge_trainables(
-            earliest=earliest.trainables, latest=latest.trainables
-        ),
-        shortcuts=latest.shortcuts,
-    )
+    return merge_all_backups(backups=[latest], decisions=decisions, initial=earliest)
 
 
 @dataclass(frozen=True)
@@ -290,10 +569,81 @@ class Decision:
 MustBeDeleted: TypeAlias = bool
 
 
+DECISIONS_HEADER = ("id", "reviewed_at", "must_be_deleted")
+_BOOLEANS = {"True": True, "False": False}
+
+# decisions are written to the OS as soon as they are made, but only forced to
+# disk every this many decisions, and when the decisions are closed
+DEFAULT_FSYNC_EVERY = 20
+# the log is rewritten without superseded rows once it holds more of them than
+# this, and more than live decisions, so that compaction is amortized O(1)
+MIN_ROWS_TO_COMPACT = 1_000
+
+
+def _decision_to_row(decision: Decision) -> tuple[str, str, str]:
+    # same format pandas used to write, so that old and new rows can be mixed
+    return (decision.id, str(decision.reviewed_at), str(decision.must_be_deleted))
+
+
+def _read_decisions(path: Path) -> Iterator[Decision]:
+    for row in read_csv(path):
+        yield Decision(
+            id=row["id"],
+            reviewed_at=datetime.datetime.fromisoformat(row["reviewed_at"]),
+            must_be_deleted=_BOOLEANS[row["must_be_deleted"]],
+        )
+
+
 class Decisions:
-    def __init__(self, decisions: list[Decision], path: Path) -> None:
+    """
+    Decisions made by the user, indexed by completed activity id.
+
+    The decisions file is an append-only log: each decision is appended as a
+    new row, and a later row for the same id supersedes the earlier ones. The
+    log is periodically compacted, sorted by review date.
+
+    Call `close` (or use as a context manager) to force pending decisions to
+    disk.
+    """
+
+    def __init__(
+        self,
+        decisions: list[Decision] | None,
+        path: Path,
+        fsync_every: int = DEFAULT_FSYNC_EVERY,
+    ) -> None:
+        """Pass `decisions=None` to lazily load them from `path`"""
         self.path = path
-        self._decisions = {decision.id: decision for decision in decisions}
+        self.fsync_every = fsync_every
+        self._index: dict[CompletedActivityId, Decision] | None = None
+        self._log_rows = 0  # rows in the file, including the superseded ones
+        self._log: TextIO | None = None
+        self._unsynced = 0
+        # the file does not match the decisions, it must be rewritten entirely
+        # with the next decision
+        self._must_rewrite = False
+        if decisions is not None:
+            self._index = {decision.id: decision for decision in decisions}
+            self._must_rewrite = True
+
+    @property
+    def _decisions(self) -> dict[CompletedActivityId, Decision]:
+        if self._index is None:
+            self._index = {}
+            if self.path.exists():
+                for decision in _read_decisions(self.path):
+                    self._index[decision.id] = decision
+                    self._log_rows += 1
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._decisions)
+
+    def __enter__(self) -> Decisions:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
 
     def find(self, id: CompletedActivityId) -> Decision | None:
         if previous_decision := self._decisions.get(id):
@@ -306,24 +656,76 @@ class Decisions:
         reviewed_at: datetime.datetime,
         must_be_deleted: MustBeDeleted,
     ) -> None:
-        self._decisions[id] = Decision(
+        decision = Decision(
             id=id,
             reviewed_at=reviewed_at,
             must_be_deleted=must_be_deleted,
         )
-        self._save_to_file()
-
-    def _save_to_file(self) -> None:
-        df = pd.DataFrame(map(asdict, self._decisions.values()))
-        df.sort_values(by="reviewed_at", inplace=True)
-        df.to_csv(self.path, index=False)
+        self._decisions[id] = decision
+
+        if self._must_rewrite or self._must_compact():
+            self.compact()
+            return
+
+        self._append(decision)
+
+    def _must_compact(self) -> bool:
+        superseded = self._log_rows - len(self._decisions)
+        return superseded > MIN_ROWS_TO_COMPACT and superseded > len(self._decisions)
+
+    def _append(self, decision: Decision) -> None:
+        if self._log is None:
+            is_new = not self.path.exists() or self.path.stat().st_size == 0
+            self._log = self.path.open("a", newline="")
+            if is_new:
+                csv.writer(self._log).writerow(DECISIONS_HEADER)
+
+        csv.writer(self._log).writerow(_decision_to_row(decision))
+        self._log.flush()  # hand it to the OS, so that a crash cannot lose it
+        self._log_rows += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._log is not None and self._unsynced:
+            os.fsync(self._log.fileno())
+        self._unsynced = 0
+
+    def compact(self) -> None:
+        """Rewrite the log with only the latest decision per id"""
+        self._close_log()
+        decisions = sorted(
+            self._decisions.values(), key=lambda decision: decision.reviewed_at
+        )
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("w", newline="") as file_handler:
+            writer = csv.writer(file_handler)
+            writer.writerow(DECISIONS_HEADER)
+            writer.writerows(map(_decision_to_row, decisions))
+            file_handler.flush()
+            os.fsync(file_handler.fileno())
+        os.replace(tmp_path, self.path)
+        self._log_rows = len(decisions)
+        self._must_rewrite = False
+
+    def _close_log(self) -> None:
+        self._sync()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def close(self) -> None:
+        has_superseded_rows = self._index is not None and self._log_rows > len(
+            self._index
+        )
+        if has_superseded_rows and not self._must_rewrite:
+            self.compact()
+        self._close_log()
 
     @staticmethod
     def from_file(path: Path) -> Decisions:
-        return Decisions(
-            decisions=deserialize(list[Decision], pd.read_csv(path).to_dict("records")),
-            path=path,
-        )
+        return Decisions(decisions=None, path=path)
 
 
 def ask_user_if_comp_activity_should_be_deleted(id: CompletedActivityId) -> bool:
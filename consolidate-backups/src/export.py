@@ -0,0 +1,322 @@
+"""
+Export the records of a backup as flat tables, streaming them in bounded-size
+chunks.
+
+Nested lists are flattened into through-tables (e.g.: `Activity.trainable_ids`
+becomes `activities_trainables`, `Training.activities` becomes
+`trainings_activities`), so that every cell holds a single value.
+
+Tables can be written as CSV files or, if pyarrow is installed, as Parquet files
+where `duration` and `intensity` are dictionary encoded.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Literal, Protocol, TypeAlias
+
+from src.io import MissingDependency
+from src.model import (
+    Activity,
+    Backup,
+    CompletedActivity,
+    Trainable,
+    Training,
+    stringify_a_list,
+)
+
+logger = logging.getLogger(__name__)
+
+Format: TypeAlias = Literal["csv", "parquet"]
+Row: TypeAlias = tuple[Any, ...]
+ColumnType: TypeAlias = Literal["string", "timestamp", "bool", "int", "category"]
+
+DEFAULT_CHUNK_ROWS = 10_000
+
+# categories of the dictionary encoded columns, in a fixed order so that every
+# export uses the same codes
+CATEGORIES = {
+    "duration": ("short", "medium", "long"),
+    "intensity": ("low", "medium", "high"),
+}
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: ColumnType = "string"
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    name: str
+    section: str  # backup section where the records of the table come from
+    columns: tuple[Column, ...]
+    to_rows: Callable[[Any], Iterable[Row]]  # one record can produce many rows
+
+
+def _activity_rows(activity: Activity) -> Iterable[Row]:
+    yield (
+        activity.id,
+        activity.name,
+        stringify_a_list(activity.other_names),
+        activity.last_modified,
+        activity.notes,
+    )
+
+
+def _activity_trainable_rows(activity: Activity) -> Iterable[Row]:
+    for trainable_id in activity.trainable_ids or []:
+        yield (activity.id, trainable_id)
+
+
+def _completed_activity_rows(completed_activity: CompletedActivity) -> Iterable[Row]:
+    yield (
+        completed_activity.id,
+        completed_activity.activity_id,
+        completed_activity.date,
+        completed_activity.duration,
+        completed_activity.intensity,
+        completed_activity.notes,
+        completed_activity.last_modified,
+    )
+
+
+def _training_rows(training: Training) -> Iterable[Row]:
+    yield (training.id, training.name, training.last_modified, training.is_oneoff)
+
+
+def _training_activity_rows(training: Training) -> Iterable[Row]:
+    for position, activity in enumerate(training.activities):
+        yield (
+            training.id,
+            position,
+            activity.activityId,
+            activity.duration,
+            activity.intensity,
+        )
+
+
+def _trainable_rows(trainable: Trainable) -> Iterable[Row]:
+    yield (trainable.id, trainable.name, trainable.last_modified, trainable.notes)
+
+
+TABLES = (
+    TableSpec(
+        name="activities",
+        section="activities",
+        columns=(
+            Column("id"),
+            Column("name"),
+            Column("other_names"),
+            Column("last_modified", "timestamp"),
+            Column("notes"),
+        ),
+        to_rows=_activity_rows,
+    ),
+    TableSpec(
+        name="activities_trainables",
+        section="activities",
+        columns=(Column("activity_id"), Column("trainable_id")),
+        to_rows=_activity_trainable_rows,
+    ),
+    TableSpec(
+        name="completed_activities",
+        section="completedActivities",
+        columns=(
+            Column("id"),
+            Column("activity_id"),
+            Column("date", "timestamp"),
+            Column("duration", "category"),
+            Column("intensity", "category"),
+            Column("notes"),
+            Column("last_modified", "timestamp"),
+        ),
+        to_rows=_completed_activity_rows,
+    ),
+    TableSpec(
+        name="trainings",
+        section="trainings",
+        columns=(
+            Column("id"),
+            Column("name"),
+            Column("last_modified", "timestamp"),
+            Column("is_oneoff", "bool"),
+        ),
+        to_rows=_training_rows,
+    ),
+    TableSpec(
+        name="trainings_activities",
+        section="trainings",
+        columns=(
+            Column("training_id"),
+            Column("position", "int"),
+            Column("activity_id"),
+            Column("duration", "category"),
+            Column("intensity", "category"),
+        ),
+        to_rows=_training_activity_rows,
+    ),
+    TableSpec(
+        name="trainables",
+        section="trainables",
+        columns=(
+            Column("id"),
+            Column("name"),
+            Column("last_modified", "timestamp"),
+            Column("notes"),
+        ),
+        to_rows=_trainable_rows,
+    ),
+)
+
+
+class TableWriter(Protocol):
+    def write(self, rows: list[Row]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class CsvTableWriter:
+    def __init__(self, path: Path, table: TableSpec) -> None:
+        self._file = path.open("w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(column.name for column in table.columns)
+
+    def write(self, rows: list[Row]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise MissingDependency(
+            "Parquet export needs pyarrow, install it with: pip install pyarrow"
+        ) from None
+    return pyarrow
+
+
+class ParquetTableWriter:
+    def __init__(self, path: Path, table: TableSpec) -> None:
+        pa = self._pa = _import_pyarrow()
+        types = {
+            "string": pa.string(),
+            "timestamp": pa.timestamp("us", tz="UTC"),
+            "bool": pa.bool_(),
+            "int": pa.int32(),
+            "category": pa.dictionary(pa.int8(), pa.string()),
+        }
+        self._columns = table.columns
+        self._schema = pa.schema(
+            [(column.name, types[column.type]) for column in table.columns]
+        )
+        self._writer = pa.parquet.ParquetWriter(path, self._schema)
+
+    def _to_array(self, column: Column, values: tuple) -> Any:
+        pa = self._pa
+        if column.type != "category":
+            return pa.array(values, type=self._schema.field(column.name).type)
+
+        categories = CATEGORIES[column.name]
+        codes = {category: code for code, category in enumerate(categories)}
+        return pa.DictionaryArray.from_arrays(
+            pa.array([codes[value] for value in values], type=pa.int8()),
+            pa.array(categories, type=pa.string()),
+        )
+
+    def write(self, rows: list[Row]) -> None:
+        columns = zip(*rows)
+        arrays = [
+            self._to_array(column, values)
+            for column, values in zip(self._columns, columns)
+        ]
+        self._writer.write_table(
+            self._pa.Table.from_arrays(arrays, schema=self._schema)
+        )
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def _csv_value(value: Any) -> Any:
+    # same format pandas uses when writing datetimes to CSV
+    if isinstance(value, datetime.datetime):
+        return str(value)
+    return value
+
+
+def iter_backup_records(backup: Backup) -> Iterator[tuple[str, Any]]:
+    """Yield (section, record) pairs, like `src.io.iter_backup_file` does"""
+    for section, records in (
+        ("activities", backup.activities),
+        ("completedActivities", backup.completed_activities),
+        ("trainings", backup.trainings),
+        ("trainables", backup.trainables),
+    ):
+        for record in records or []:
+            yield section, record
+
+
+def export_tables(
+    records: Iterable[tuple[str, Any]],
+    output_dir: Path,
+    prefix: str,
+    format: Format = "csv",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> dict[str, Path]:
+    """
+    Write one file per table in `output_dir`, holding at most `chunk_rows` rows
+    per table in memory, and return the path of each table.
+
+    `records` are (section, record) pairs, as yielded by `iter_backup_records` or
+    by `src.io.iter_backup_file`, so that a backup can be exported without
+    loading it in memory.
+    """
+    writer_class = CsvTableWriter if format == "csv" else ParquetTableWriter
+    paths = {
+        table.name: output_dir / f"{prefix}__{table.name.replace('_', '-')}.{format}"
+        for table in TABLES
+    }
+    writers: dict[str, TableWriter] = {}
+    buffers: dict[str, list[Row]] = {table.name: [] for table in TABLES}
+    tables_by_section: dict[str, list[TableSpec]] = {}
+    for table in TABLES:
+        tables_by_section.setdefault(table.section, []).append(table)
+
+    def flush(table: TableSpec) -> None:
+        buffer = buffers[table.name]
+        if not buffer:
+            return
+        if format == "csv":
+            buffer = [tuple(map(_csv_value, row)) for row in buffer]
+        writers[table.name].write(buffer)
+        buffers[table.name] = []
+
+    try:
+        for table in TABLES:
+            writers[table.name] = writer_class(paths[table.name], table)
+
+        for section, record in records:
+            for table in tables_by_section.get(section, ()):
+                buffer = buffers[table.name]
+                buffer.extend(table.to_rows(record))
+                if len(buffer) >= chunk_rows:
+                    flush(table)
+
+        for table in TABLES:
+            flush(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    logger.debug(f"exported {len(TABLES)} tables to {output_dir}")
+    return paths
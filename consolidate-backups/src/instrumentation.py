@@ -0,0 +1,220 @@
+"""
+Lightweight per-stage instrumentation: wall time, records processed and peak
+memory of each stage of the pipeline (e.g.: parsing or validating a file).
+
+Stages are always logged at debug level, and are only kept in memory while
+profiling is enabled, to be written as a JSON summary.
+
+The memory of each stage is measured with tracemalloc, which slows down
+allocations, so it is only measured while profiling too.
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterator
+
+from src.model import Backup, JsonDict
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    file: str | None = None  # only the file name, not the full path
+    records: int | None = None
+    seconds: float = 0.0
+    # Python memory allocated at the peak of the stage, beyond what was already
+    # allocated when it started, only measured while profiling
+    peak_mib: float | None = None
+
+
+@dataclass
+class _OpenStage:
+    stage: Stage
+    start_bytes: int
+    peak_bytes: int
+
+
+MIB = 1024 * 1024
+
+_stages: list[Stage] = []
+# stages being measured, the innermost one last
+_open_stages: list[_OpenStage] = []
+_enabled = False
+_started_tracing = False
+
+
+def enable() -> None:
+    global _enabled, _started_tracing
+    _enabled = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+
+
+def disable() -> None:
+    global _enabled, _started_tracing
+    _enabled = False
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def drain_stages() -> list[Stage]:
+    """Return the recorded stages and forget them"""
+    stages = _stages.copy()
+    _stages.clear()
+    return stages
+
+
+def record_stages(stages: list[Stage]) -> None:
+    """Keep stages recorded elsewhere, e.g.: in a worker process"""
+    if _enabled:
+        _stages.extend(stages)
+
+
+def _record_peak_of_open_stages() -> int:
+    """Fold the peak since the last reset into the open stages, return the current"""
+    current, peak = tracemalloc.get_traced_memory()
+    for open_stage in _open_stages:
+        open_stage.peak_bytes = max(open_stage.peak_bytes, peak)
+    return current
+
+
+def _start_measuring(stage: Stage) -> None:
+    if not tracemalloc.is_tracing():
+        return
+    current = _record_peak_of_open_stages()
+    # the peak is shared by all stages, it was just recorded in the open ones
+    tracemalloc.reset_peak()
+    _open_stages.append(_OpenStage(stage=stage, start_bytes=current, peak_bytes=0))
+
+
+def _stop_measuring(stage: Stage) -> None:
+    if not _open_stages or _open_stages[-1].stage is not stage:
+        return
+    if tracemalloc.is_tracing():
+        _record_peak_of_open_stages()
+    open_stage = _open_stages.pop()
+    peak = max(open_stage.peak_bytes - open_stage.start_bytes, 0)
+    stage.peak_mib = peak / MIB
+
+
+def peak_rss_mib() -> float:
+    """Peak resident memory of the whole process, since it started"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB everywhere else
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def count_records(backup: Backup) -> int:
+    return (
+        len(backup.activities)
+        + len(backup.completed_activities)
+        + len(backup.trainings or [])
+        + len(backup.trainables or [])
+    )
+
+
+@contextmanager
+def stage(name: str, file: Path | str | None = None) -> Iterator[Stage]:
+    """Measure the enclosed block, set `.records` on the yielded stage if known"""
+    current = Stage(name=name, file=file.name if isinstance(file, Path) else file)
+    if _enabled:
+        _start_measuring(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        _stop_measuring(current)
+        logger.debug(
+            f"{name}{f' {current.file}' if current.file else ''} took"
+            f" {current.seconds:.3f}s"
+            + (f" ({current.records} records)" if current.records is not None else "")
+        )
+        if _enabled:
+            _stages.append(current)
+
+
+def summarize(stages: list[Stage], total_seconds: float) -> JsonDict:
+    by_stage: dict[str, JsonDict] = {}
+    for recorded in stages:
+        summary = by_stage.setdefault(
+            recorded.name,
+            {"count": 0, "seconds": 0.0, "records": 0, "max_peak_mib": 0.0},
+        )
+        summary["count"] += 1
+        summary["seconds"] += recorded.seconds
+        summary["records"] += recorded.records or 0
+        summary["max_peak_mib"] = max(summary["max_peak_mib"], recorded.peak_mib or 0.0)
+
+    return {
+        "total_seconds": total_seconds,
+        # of the whole process, not of any stage
+        "process_peak_rss_mib": peak_rss_mib(),
+        "by_stage": by_stage,
+        "stages": [asdict(recorded) for recorded in stages],
+    }
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="write a JSON summary of the time, records and memory of each stage",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="PATH",
+        help="write a cProfile dump, readable with pstats, snakeviz or flameprof",
+    )
+
+
+@contextmanager
+def profiling(
+    summary_path: Path | None = None, dump_path: Path | None = None
+) -> Iterator[None]:
+    """Record the stages run in the enclosed block, and write them at the end"""
+    if summary_path is None and dump_path is None:
+        yield
+        return
+
+    enable()
+    drain_stages()
+    profiler = cProfile.Profile() if dump_path else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        total_seconds = time.perf_counter() - start
+        disable()
+        stages = drain_stages()
+
+        if summary_path:
+            logger.info(f"writing profile summary to {summary_path}")
+            summary = summarize(stages, total_seconds)
+            summary_path.write_text(json.dumps(summary, indent=2) + "\n")
+        if profiler and dump_path:
+            logger.info(f"writing cProfile dump to {dump_path}")
+            profiler.dump_stats(dump_path)
@@ -1,15 +1,78 @@
+import datetime
 import json
 import csv
+import gzip
 import logging
+from dataclasses import dataclass
 from pathlib import Path
+from typing import IO, Any, Callable, Iterator, Literal, TypeAlias
 
-from apischema import ValidationError, deserialize, serialize
-
+from src.cache import BackupCache
+from src.codec import (
+    SECTION_DECODERS,
+    DecodeError,
+    decode_backup,
+    decode_datetime,
+    encode_activity,
+    encode_completed_activity,
+    encode_trainable,
+    encode_training,
+)
+from src.instrumentation import count_records, stage
+from src.json_stream import (
+    ARRAY_END,
+    ARRAY_START,
+    DEFAULT_CHUNK_SIZE,
+    SKIPPED,
+    JsonStreamError,
+    iter_json_object,
+)
 from src.model import Backup, JsonDict
 
-
 logger = logging.getLogger(__name__)
 
+Compression: TypeAlias = Literal["gzip", "zstd"]
+
+COMPRESSION_SUFFIXES: dict[Compression, str] = {"gzip": ".gz", "zstd": ".zst"}
+
+# records encoded before writing them to the file at once
+WRITE_BATCH_SIZE = 1000
+
+# the date comes first in the backups exported by the webapp, so reading the
+# header of a backup usually takes a single small read
+HEADER_CHUNK_SIZE = 4 * 1024  # characters
+
+
+class MissingDependency(Exception): ...
+
+
+def _open_zstd(path: Path, mode: str) -> IO[str]:
+    try:
+        import zstandard
+    except ImportError:
+        raise MissingDependency(
+            "zstd compression needs zstandard, install it with:"
+            " pip install zstandard"
+        ) from None
+    return zstandard.open(path, mode=mode, encoding="utf-8")
+
+
+def backup_stem(path: Path) -> str:
+    """Name of a backup file without its `.json` and compression suffixes"""
+    name = path.name
+    for suffix in (*COMPRESSION_SUFFIXES.values(), ".json"):
+        name = name.removesuffix(suffix)
+    return name
+
+
+def open_text(path: Path, mode: Literal["r", "w"] = "r") -> IO[str]:
+    """Open a text file, decompressing it if its suffix is `.gz` or `.zst`"""
+    if path.suffix == COMPRESSION_SUFFIXES["gzip"]:
+        return gzip.open(path, mode=f"{mode}t", encoding="utf-8")
+    if path.suffix == COMPRESSION_SUFFIXES["zstd"]:
+        return _open_zstd(path, mode=f"{mode}t")
+    return path.open(mode)
+
 
 def read_csv(path: Path) -> list[JsonDict]:
     logger.debug(f"reading CSV file from {path}")
@@ -32,7 +95,8 @@ def read_json(path: Path) -> JsonDict:
     if not resolved_path.exists():
         raise FileNotFoundError(str(resolved_path))
 
-    content = resolved_path.read_text()
+    with open_text(resolved_path) as file_handler:
+        content = file_handler.read()
     if not content:
         raise FileIsEmpty("failed to read JSON file, reason: file is empty")
 
@@ -51,30 +115,280 @@ def write_json(path: Path, data: JsonDict) -> None:
 class UnsupportedBackupFile(Exception): ...
 
 
-def read_backup_file(path: Path) -> Backup:
+def read_backup_file(path: Path, cache: BackupCache | None = None) -> Backup:
+    if cache:
+        with stage("read_cache", file=path) as current:
+            cache_key = cache.key_for(path)
+            cached = cache.get(cache_key)
+            if cached:
+                current.records = count_records(cached)
+        if cached:
+            logger.info(f"reading backup from {path} (cached)")
+            return cached
+
     logger.info(f"reading backup from {path}")
-    data = read_json(path=path)
+    with stage("read_json", file=path):
+        data = read_json(path=path)
     logger.debug(f"reading backup from {path} completed")
     logger.info(f"deserializing backup")
     try:
-        backup = deserialize(Backup, data)
+        with stage("decode", file=path) as current:
+            backup = decode_backup(data)
+            current.records = count_records(backup)
         logger.debug(f"deserializing backup completed")
-    except ValidationError as error:
-        breakpoint()
-        formatted_error = json.dumps(
-            json.loads(str(error)[17:].replace("'", '"')),
-            indent=2,
-        )
+    except DecodeError as error:
         raise UnsupportedBackupFile(
-            f"unsupported backup found at: {path}\n{formatted_error}"
+            f"unsupported backup found at: {path}\n{error}"
         ) from None
 
+    if cache:
+        with stage("write_cache", file=path):
+            cache.put(cache_key, backup)
+
     return backup
 
 
-def write_backup_to_file(backup: Backup, output_dir: Path) -> None:
+def _identity(value: Any) -> Any:
+    return value
+
+
+_encode_str = json.encoder.encode_basestring_ascii  # type: ignore[attr-defined]
+_SCALARS = {None: "null", True: "true", False: "false"}
+
+
+def _build_record_encoder(compact: bool) -> Callable[[Any], str]:
+    """
+    Return a function encoding a record of the backup, nested two levels deep
+    in the document, the same way `json.dumps` would.
+
+    Most records only hold strings and nulls, so they are encoded here by hand:
+    json pays a noticeable overhead for each call, even more with `indent`,
+    which makes it fall back to its pure Python encoder.
+    """
+    if compact:
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        start, separator, colon, end = "{", ",", ":", "}"
+    else:
+        encode_indented = json.JSONEncoder(indent=2).encode
+
+        def encode(value: Any) -> str:
+            return encode_indented(value).replace("\n", "\n    ")
+
+        start, separator, colon, end = "{\n      ", ",\n      ", ": ", "\n    }"
+
+    def encode_record(record: Any) -> str:
+        if type(record) is dict and record:
+            members: list[str] = []
+            for key, value in record.items():
+                if type(value) is str:
+                    members.append(f"{_encode_str(key)}{colon}{_encode_str(value)}")
+                elif value is None or type(value) is bool:
+                    members.append(f"{_encode_str(key)}{colon}{_SCALARS[value]}")
+                else:
+                    break
+            else:
+                return start + separator.join(members) + end
+
+        return encode(record)
+
+    return encode_record
+
+
+def dump_backup(backup: Backup, file_handler: IO[str], compact: bool = False) -> None:
+    """
+    Write the backup as JSON, encoding a batch of records at a time instead of
+    the whole backup at once.
+
+    The output is the same, byte for byte, as `json.dump(encode_backup(backup))`
+    with `indent=2` (what the webapp exports), or without any whitespace if
+    `compact`.
+    """
+    dumps = _build_record_encoder(compact=compact)
+    if compact:
+        key_prefix, item_prefix, colon, array_end, object_end = "", "", ":", "]", "}"
+    else:
+        key_prefix, item_prefix, colon = "\n  ", "\n    ", ": "
+        array_end, object_end = "\n  ]", "\n}"
+
+    write = file_handler.write
+    write(f'{{{key_prefix}"date"{colon}{dumps(backup.date.isoformat())}')
+
+    sections: tuple[tuple[str, list | None, Callable[[Any], Any]], ...] = (
+        ("activities", backup.activities, encode_activity),
+        ("completedActivities", backup.completed_activities, encode_completed_activity),
+        ("trainings", backup.trainings, encode_training),
+        ("trainables", backup.trainables, encode_trainable),
+        ("shortcuts", backup.shortcuts, _identity),
+    )
+    for key, records, encode_record in sections:
+        write(f',{key_prefix}"{key}"{colon}')
+        if records is None:
+            write("null")
+            continue
+        if not records:
+            write("[]")
+            continue
+
+        write("[")
+        for start in range(0, len(records), WRITE_BATCH_SIZE):
+            batch = records[start : start + WRITE_BATCH_SIZE]
+            if start:
+                write(",")
+            write(
+                ",".join(
+                    f"{item_prefix}{dumps(encode_record(record))}" for record in batch
+                )
+            )
+        write(array_end)
+
+    write(object_end)
+
+
+def write_backup_to_file(
+    backup: Backup,
+    output_dir: Path,
+    compact: bool = False,
+    compression: Compression | None = None,
+) -> Path:
     timestamp = backup.date.isoformat().replace(" ", "T")
-    path = output_dir / f"fitness-tracker__consolidated-backup__{timestamp}.json"
+    suffix = ".json" + (COMPRESSION_SUFFIXES[compression] if compression else "")
+    path = output_dir / f"fitness-tracker__consolidated-backup__{timestamp}{suffix}"
     logger.info(f"writing backup to {path}")
-    write_json(data=serialize(Backup, backup), path=path)
+    with stage("write_backup", file=path) as current:
+        with open_text(path, mode="w") as file_handler:
+            dump_backup(backup=backup, file_handler=file_handler, compact=compact)
+        current.records = count_records(backup)
     logger.debug(f"writing backup to {path} completed")
+    return path
+
+
+def _iter_backup_members(
+    path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[tuple[str, Any]]:
+    resolved_path = path.expanduser().resolve()
+    if not resolved_path.exists():
+        raise FileNotFoundError(str(resolved_path))
+    if resolved_path.stat().st_size == 0:
+        raise FileIsEmpty("failed to read JSON file, reason: file is empty")
+
+    with open_text(resolved_path) as file_handler:
+        index = 0
+        for key, value in iter_json_object(file_handler, chunk_size=chunk_size):
+            if key == "date":
+                try:
+                    yield key, decode_datetime(value, "date")
+                except DecodeError as error:
+                    raise UnsupportedBackupFile(
+                        f"unsupported backup found at: {path}\n{error}"
+                    ) from None
+                continue
+
+            if key not in SECTION_DECODERS:
+                raise UnsupportedBackupFile(
+                    f"unsupported backup found at: {path}\nunexpected key {key!r}"
+                )
+
+            if value is ARRAY_START or value is ARRAY_END or value is None:
+                index = 0
+                yield key, value
+                continue
+
+            try:
+                record = SECTION_DECODERS[key](value)
+            except DecodeError as error:
+                raise UnsupportedBackupFile(
+                    f"unsupported backup found at: {path}\n{key}[{index}]: {error}"
+                ) from None
+            index += 1
+            yield key, record
+
+
+def iter_backup_file(
+    path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[tuple[str, Any]]:
+    """
+    Yield ("date", datetime) and (section, record) for each record in the backup,
+    e.g.: ("completedActivities", CompletedActivity(...)), without loading the
+    whole file in memory
+    """
+    for key, value in _iter_backup_members(path=path, chunk_size=chunk_size):
+        if value is ARRAY_START or value is ARRAY_END or value is None:
+            continue
+        yield key, value
+
+
+def read_backup_file_streaming(
+    path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Backup:
+    """Like `read_backup_file`, but without holding the raw JSON in memory"""
+    logger.info(f"streaming backup from {path}")
+    date: datetime.datetime | None = None
+    sections: dict[str, list | None] = {}
+    for key, value in _iter_backup_members(path=path, chunk_size=chunk_size):
+        if key == "date":
+            date = value
+        elif value is ARRAY_START:
+            sections[key] = []
+        elif value is None:
+            sections[key] = None
+        elif value is not ARRAY_END:
+            sections[key].append(value)  # type: ignore[union-attr]
+
+    activities = sections.get("activities")
+    completed_activities = sections.get("completedActivities")
+    if date is None or activities is None or completed_activities is None:
+        raise UnsupportedBackupFile(
+            f"unsupported backup found at: {path}\nmissing required sections"
+        )
+
+    logger.debug(f"streaming backup from {path} completed")
+    return Backup(
+        date=date,
+        activities=activities,
+        completed_activities=completed_activities,
+        trainings=sections.get("trainings"),
+        trainables=sections.get("trainables"),
+        shortcuts=sections.get("shortcuts"),
+    )
+
+
+@dataclass(frozen=True)
+class BackupHeader:
+    date: datetime.datetime
+    # records per section, e.g.: {"activities": 12, ...}, only if counted
+    counts: dict[str, int] | None = None
+
+
+def read_backup_header(path: Path, count_records: bool = False) -> BackupHeader:
+    """
+    Read the date of a backup, and optionally count its records, without
+    turning them into model objects: they are not validated either, so the
+    backup may still turn out to be invalid when read in full
+    """
+    date: datetime.datetime | None = None
+    counts: dict[str, int] = {}
+    chunk_size = DEFAULT_CHUNK_SIZE if count_records else HEADER_CHUNK_SIZE
+    try:
+        with open_text(path) as file_handler:
+            members = iter_json_object(
+                file_handler, chunk_size=chunk_size, skip_items=True
+            )
+            for key, value in members:
+                if key == "date":
+                    date = decode_datetime(value, "date")
+                    if not count_records:
+                        break
+                elif value is SKIPPED:
+                    counts[key] += 1
+                elif value is ARRAY_START:
+                    counts[key] = 0
+    except (JsonStreamError, json.JSONDecodeError, DecodeError) as error:
+        raise UnsupportedBackupFile(
+            f"unsupported backup found at: {path}\n{error}"
+        ) from None
+
+    if date is None:
+        raise UnsupportedBackupFile(
+            f"unsupported backup found at: {path}\nmissing date"
+        )
+    return BackupHeader(date=date, counts=counts if count_records else None)
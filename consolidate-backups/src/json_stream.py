@@ -0,0 +1,137 @@
+"""
+Incremental reader for JSON documents made of a top-level object, such as the
+backups exported by the webapp.
+
+Only a bounded window of the file is kept in memory: the members of the
+top-level object are yielded one by one, and the items of any top-level array
+are yielded one by one too, instead of decoding the whole document at once.
+
+Array items can also be skipped, e.g.: to read the date of a backup, or to
+count its records, without keeping them nor turning them into model objects.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Iterator, TextIO
+
+DEFAULT_CHUNK_SIZE = 64 * 1024  # characters
+
+_WHITESPACE = " \t\n\r"
+
+# marks the start and the end of a top-level array, see `iter_json_object`
+ARRAY_START = object()
+ARRAY_END = object()
+# yielded instead of the items of top-level arrays, when they are skipped
+SKIPPED = object()
+
+
+class JsonStreamError(ValueError): ...
+
+
+class _Buffer:
+    def __init__(self, file_handler: TextIO, chunk_size: int) -> None:
+        self._file_handler = file_handler
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text = ""
+        self._position = 0
+        self._eof = False
+
+    def _read_more(self) -> bool:
+        if self._eof:
+            return False
+
+        chunk = self._file_handler.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+
+        # drop what has already been consumed to keep memory bounded
+        self._text = self._text[self._position :] + chunk
+        self._position = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self._position < len(self._text):
+                if self._text[self._position] not in _WHITESPACE:
+                    return self._text[self._position]
+                self._position += 1
+            if not self._read_more():
+                return ""
+
+    def expect(self, expected: str) -> None:
+        found = self.peek()
+        if found != expected:
+            raise JsonStreamError(f"expected {expected!r} but found {found!r}")
+        self._position += 1
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._text, self._position)
+            except json.JSONDecodeError:
+                if self._read_more():
+                    continue  # the value is split across chunks
+                raise
+
+            # a number or a literal could continue in the next chunk
+            if end == len(self._text) and self._read_more():
+                continue
+
+            self._position = end
+            return value
+
+
+def iter_json_object(
+    file_handler: TextIO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    skip_items: bool = False,
+) -> Iterator[tuple[str, Any]]:
+    """
+    Yield (key, value) for every member of the top-level JSON object.
+
+    Top-level arrays are not decoded at once: (key, ARRAY_START) is yielded
+    first, then (key, item) for every item, and finally (key, ARRAY_END). With
+    `skip_items`, (key, SKIPPED) is yielded instead of each item.
+    """
+    buffer = _Buffer(file_handler=file_handler, chunk_size=chunk_size)
+
+    if buffer.peek() == "":
+        raise JsonStreamError("expected a JSON object but the document is empty")
+
+    buffer.expect("{")
+    if buffer.peek() == "}":
+        return
+
+    while True:
+        key = buffer.decode()
+        if not isinstance(key, str):
+            raise JsonStreamError(f"expected an object key but found {key!r}")
+        buffer.expect(":")
+
+        if buffer.peek() == "[":
+            buffer.expect("[")
+            yield key, ARRAY_START
+            if buffer.peek() == "]":
+                buffer.expect("]")
+            else:
+                while True:
+                    item = buffer.decode()
+                    yield key, SKIPPED if skip_items else item
+                    if buffer.peek() == ",":
+                        buffer.expect(",")
+                        continue
+                    buffer.expect("]")
+                    break
+            yield key, ARRAY_END
+        else:
+            yield key, buffer.decode()
+
+        if buffer.peek() == ",":
+            buffer.expect(",")
+            continue
+        buffer.expect("}")
+        return
@@ -0,0 +1,82 @@
+"""
+Record of which backups a consolidated backup was built from.
+
+It allows `consolidate` to resume from the last consolidated backup and only
+merge the backups that were added since, instead of starting from scratch.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TypeAlias
+
+from src.io import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "consolidation-manifest.json"
+
+BackupFilename: TypeAlias = str
+FileHash: TypeAlias = str
+FileStat: TypeAlias = list[int]  # size in bytes and modification time in ns
+
+
+@dataclass(frozen=True)
+class Manifest:
+    consolidated_backup: BackupFilename  # relative to the manifest directory
+    patches_hash: FileHash | None
+    # decisions change what is kept from the backups, like patches
+    decisions_hash: FileHash | None
+    sources: dict[BackupFilename, FileHash]
+    # to avoid hashing again the sources which have not been touched since
+    source_stats: dict[BackupFilename, FileStat] = field(default_factory=dict)
+
+
+def stat_file(path: Path) -> FileStat:
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_manifest(directory: Path) -> Manifest | None:
+    path = directory / MANIFEST_FILENAME
+    if not path.exists():
+        return None
+
+    data = read_json(path=path)
+    return Manifest(
+        consolidated_backup=data["consolidated_backup"],
+        patches_hash=data["patches_hash"],
+        decisions_hash=data.get("decisions_hash"),
+        sources=data["sources"],
+        source_stats=data.get("source_stats", {}),
+    )
+
+
+def write_manifest(manifest: Manifest, directory: Path) -> None:
+    path = directory / MANIFEST_FILENAME
+    logger.info(f"writing consolidation manifest to {path}")
+    write_json(path=path, data=asdict(manifest))
+
+
+def find_mismatch(
+    manifest: Manifest,
+    sources: dict[BackupFilename, FileHash],
+    patches_hash: FileHash | None,
+    decisions_hash: FileHash | None,
+) -> str | None:
+    """Explain why `manifest` cannot be resumed, or return None if it can"""
+    if manifest.patches_hash != patches_hash:
+        return "patches have changed"
+
+    if manifest.decisions_hash != decisions_hash:
+        return "decisions have changed"
+
+    for filename, expected_hash in manifest.sources.items():
+        if filename not in sources:
+            return f"{filename} was consolidated but it no longer exists"
+        if sources[filename] != expected_hash:
+            return f"{filename} has changed since it was consolidated"
+
+    return None
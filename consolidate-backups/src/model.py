@@ -2,7 +2,22 @@ from dataclasses import dataclass
 import datetime
 import functools
 from typing import Annotated, Any, Literal, TypeAlias
-from apischema import alias
+
+
+@dataclass(frozen=True, slots=True)
+class FieldAlias:
+    """Name of a field in backup files, read by `src.codec`"""
+
+    name: str
+
+
+def alias(name: str) -> FieldAlias:
+    return FieldAlias(name)
+
+
+# Bump this number every time a model changes, so that backups cached with the
+# previous model definitions are no longer used
+SCHEMA_VERSION = 2
 
 JsonDict: TypeAlias = dict[str, Any]
 
@@ -21,7 +36,7 @@ TrainableNotes: TypeAlias = str
 Shortcut = ActivityId
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Activity:
     id: ActivityId
     name: ActivityName
@@ -47,7 +62,7 @@ def stringify_a_list(items: list) -> str:
     return "|".join(items)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class CompletedActivity:
     id: CompletedActivityId
     activity_id: Annotated[ActivityId, alias("activityId")]
@@ -58,14 +73,14 @@ class CompletedActivity:
     last_modified: Annotated[datetime.datetime | None, alias("lastModified")] = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TrainingActivity:
     activityId: ActivityId
     duration: Duration
     intensity: Intensity
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Training:
     id: TrainingId
     name: TrainingName
@@ -74,7 +89,7 @@ class Training:
     is_oneoff: Annotated[bool | None, alias("isOneOff")] = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Trainable:
     id: TrainableId
     name: TrainableName
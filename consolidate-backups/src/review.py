@@ -0,0 +1,104 @@
+"""
+Review file of the completed activities that were missing from a backup and
+that the user has not decided about yet.
+
+The review file is a CSV with one row per completed activity and its context,
+plus an empty `answer` column where the user writes `keep` or `delete` (or just
+`k` or `d`). The answers are then turned into decisions in bulk.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+from src.domain import Decisions, MustBeDeleted, PendingReview
+from src.io import read_csv
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REVIEW_PATH = Path("review__deleted-completed-activities.csv")
+
+REVIEW_HEADER = (
+    "id",
+    "activity_id",
+    "activity_name",
+    "date",
+    "lower_boundary",
+    "upper_boundary",
+    "backup_date",
+    "answer",
+)
+
+ANSWERS: dict[str, MustBeDeleted] = {
+    "k": False,
+    "keep": False,
+    "d": True,
+    "delete": True,
+}
+
+
+class InvalidAnswer(Exception): ...
+
+
+def write_review_file(reviews: Iterable[PendingReview], path: Path) -> int:
+    """Write the pending reviews sorted by date, and return how many there are"""
+    rows = [
+        (
+            review.id,
+            review.activity_id,
+            review.activity_name,
+            str(review.date),
+            str(review.lower_boundary),
+            str(review.upper_boundary),
+            str(review.backup_date),
+            "",
+        )
+        for review in sorted(reviews, key=lambda review: review.date)
+    ]
+    with path.open("w", newline="") as file_handler:
+        writer = csv.writer(file_handler)
+        writer.writerow(REVIEW_HEADER)
+        writer.writerows(rows)
+
+    return len(rows)
+
+
+@dataclass(frozen=True)
+class ReviewResult:
+    decided: int
+    pending: int  # rows still without answer
+
+
+def apply_review_file(path: Path, decisions: Decisions) -> ReviewResult:
+    """
+    Turn every answered row of the review file into a decision. All answers are
+    checked before any decision is made, so a typo does not leave the review
+    half applied.
+    """
+    answers: list[tuple[str, MustBeDeleted]] = []
+    pending = 0
+    for line_number, row in enumerate(read_csv(path), start=2):
+        answer = row["answer"].strip().lower()
+        if not answer:
+            pending += 1
+            continue
+        if answer not in ANSWERS:
+            raise InvalidAnswer(
+                f"{path}:{line_number}: unsupported answer {row['answer']!r} for"
+                f" {row['id']!r}, expected one of: {', '.join(ANSWERS)}"
+            )
+        answers.append((row["id"], ANSWERS[answer]))
+
+    reviewed_at = datetime.datetime.now(tz=datetime.timezone.utc)
+    for id, must_be_deleted in answers:
+        decisions.decide(
+            id=id, reviewed_at=reviewed_at, must_be_deleted=must_be_deleted
+        )
+
+    logger.debug(f"{len(answers)} decisions made from {path}, {pending} pending")
+    return ReviewResult(decided=len(answers), pending=pending)
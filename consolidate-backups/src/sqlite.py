@@ -0,0 +1,468 @@
+"""
+Load backups into a long-lived SQLite database.
+"""
+
+from __future__ import annotations
+
+import datetime
+import logging
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from src.model import (
+    Activity,
+    Backup,
+    CompletedActivity,
+    Trainable,
+    stringify_a_list,
+)
+
+logger = logging.getLogger(__name__)
+
+queries_dir = Path(__file__).parent / "cli"
+CREATE_ACTIVITIES_TABLE_QUERY_PATH = queries_dir / "create-activities-table.sql"
+CREATE_COMPLETED_ACTIVITIES_TABLE_QUERY_PATH = (
+    queries_dir / "create-completed-activities-table.sql"
+)
+CREATE_TRAINABLES_TABLE_QUERY_PATH = queries_dir / "create-trainables-table.sql"
+CREATE_ACTIVITIES_TRAINABLES_TABLE_QUERY_PATH = (
+    queries_dir / "create-activity-trainables-table.sql"
+)
+CREATE_APPLIED_BACKUPS_TABLE_QUERY_PATH = (
+    queries_dir / "create-applied-backups-table.sql"
+)
+CREATE_HISTORY_VIEW_PATH = queries_dir / "create-history-view.sql"
+CREATE_INDEXES_QUERY_PATH = queries_dir / "create-indexes.sql"
+CREATE_ROLLUPS_TABLES_QUERY_PATH = queries_dir / "create-rollups-tables.sql"
+REFRESH_ROLLUPS_QUERY_PATH = queries_dir / "refresh-rollups.sql"
+CREATE_TOUCHED_TABLES_QUERY_PATH = queries_dir / "create-touched-tables.sql"
+COLLECT_TOUCHED_ROLLUPS_QUERY_PATH = queries_dir / "collect-touched-rollups.sql"
+REFRESH_TOUCHED_ROLLUPS_QUERY_PATH = queries_dir / "refresh-touched-rollups.sql"
+CREATE_SEARCH_INDEX_QUERY_PATH = queries_dir / "create-search-index.sql"
+REFRESH_SEARCH_INDEX_QUERY_PATH = queries_dir / "refresh-search-index.sql"
+DELETE_TOUCHED_SEARCH_ROWS_QUERY_PATH = queries_dir / "delete-touched-search-rows.sql"
+REFRESH_TOUCHED_SEARCH_INDEX_QUERY_PATH = (
+    queries_dir / "refresh-touched-search-index.sql"
+)
+
+# matches in names weigh more than matches in other names, and these more than
+# matches in notes
+SEARCH_WEIGHTS = {"name": 10.0, "other_names": 5.0, "notes": 1.0}
+
+SCHEMA_QUERY_PATHS = (
+    #
+    # tables
+    CREATE_ACTIVITIES_TABLE_QUERY_PATH,
+    CREATE_COMPLETED_ACTIVITIES_TABLE_QUERY_PATH,
+    CREATE_TRAINABLES_TABLE_QUERY_PATH,
+    CREATE_APPLIED_BACKUPS_TABLE_QUERY_PATH,
+    CREATE_ROLLUPS_TABLES_QUERY_PATH,
+    #
+    # through-models
+    CREATE_ACTIVITIES_TRAINABLES_TABLE_QUERY_PATH,
+    #
+    # views
+    CREATE_HISTORY_VIEW_PATH,
+)
+
+# indexes are kept apart from the tables, so that they can be built once after
+# bulk loading all rows instead of being updated on every insert
+INDEX_QUERY_PATHS = (CREATE_INDEXES_QUERY_PATH,)
+
+# trade durability for speed while loading a database from scratch: if anything
+# goes wrong, the database can be rebuilt from the backup again
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",  # KiB
+)
+
+
+def execute_file(db: sqlite3.Connection, path: Path) -> None:
+    # unlike `executescript`, this does not commit the ongoing transaction
+    for query in path.read_text().split(";"):
+        if query := query.strip():
+            db.execute(query)
+
+
+def create_schema(db: sqlite3.Connection, indexes: bool = True) -> None:
+    for path in SCHEMA_QUERY_PATHS:
+        execute_file(db, path)
+
+    if indexes:
+        create_indexes(db)
+
+
+def create_indexes(db: sqlite3.Connection) -> None:
+    for path in INDEX_QUERY_PATHS:
+        execute_file(db, path)
+
+
+def refresh_rollups(db: sqlite3.Connection) -> None:
+    """Recompute the per day and per week counts, from the stored rows"""
+    execute_file(db, REFRESH_ROLLUPS_QUERY_PATH)
+
+
+def has_search_index(db: sqlite3.Connection) -> bool:
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+    return db.execute(query).fetchone() is not None
+
+
+def create_search_index(db: sqlite3.Connection) -> None:
+    """Create (if needed) and fill the full-text search index from the tables"""
+    execute_file(db, CREATE_SEARCH_INDEX_QUERY_PATH)
+    execute_file(db, REFRESH_SEARCH_INDEX_QUERY_PATH)
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    kind: str  # activity, completed_activity or trainable
+    record_id: str
+    name: str | None
+    snippet: str
+    score: float  # the lower, the better
+
+
+def _build_match_expression(query: str) -> str:
+    # quote each term so that FTS5 syntax in the user input is taken literally,
+    # and match them as prefixes so that partially typed words still match
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def search(db: sqlite3.Connection, query: str, limit: int = 20) -> list[SearchResult]:
+    """Rank the records matching all the terms in `query`, best first"""
+    expression = _build_match_expression(query)
+    if not expression:
+        return []
+
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS.values())
+    rows = db.execute(
+        "SELECT kind, record_id, name,"
+        " snippet(search_index, -1, '[', ']', '...', 8),"
+        f" bm25(search_index, 0, 0, {weights}) AS score"
+        " FROM search_index"
+        " WHERE search_index MATCH ?"
+        " ORDER BY score"
+        " LIMIT ?",
+        (expression, limit),
+    )
+    return [SearchResult(*row) for row in rows]
+
+
+def _timestamp(value: datetime.datetime | None) -> str | None:
+    # same format pandas uses when writing datetimes to SQLite
+    return None if value is None else str(value)
+
+
+Row = tuple
+
+
+def activity_row(activity: Activity) -> Row:
+    return (
+        activity.id,
+        activity.name,
+        stringify_a_list(activity.other_names),
+        _timestamp(activity.last_modified),
+        activity.notes,
+    )
+
+
+def completed_activity_row(completed_activity: CompletedActivity) -> Row:
+    return (
+        completed_activity.id,
+        completed_activity.activity_id,
+        _timestamp(completed_activity.date),
+        _timestamp(completed_activity.last_modified),
+        completed_activity.duration,
+        completed_activity.intensity,
+        completed_activity.notes,
+    )
+
+
+def trainable_row(trainable: Trainable) -> Row:
+    return (
+        trainable.id,
+        trainable.name,
+        _timestamp(trainable.last_modified),
+        trainable.notes,
+    )
+
+
+@dataclass(frozen=True)
+class Table:
+    name: str
+    columns: tuple[str, ...]  # the first one is the primary key
+
+    def insert_query(self) -> str:
+        columns = ", ".join(self.columns)
+        placeholders = ", ".join("?" for _ in self.columns)
+        return f"INSERT INTO {self.name} ({columns}) VALUES ({placeholders})"
+
+    def upsert_query(self) -> str:
+        columns = ", ".join(self.columns)
+        placeholders = ", ".join("?" for _ in self.columns)
+        updates = ", ".join(
+            f"{column} = excluded.{column}" for column in self.columns[1:]
+        )
+        return (
+            f"INSERT INTO {self.name} ({columns}) VALUES ({placeholders})"
+            f" ON CONFLICT ({self.columns[0]}) DO UPDATE SET {updates}"
+        )
+
+
+ACTIVITIES = Table(
+    name="activities",
+    columns=("id", "name", "other_names", "last_modified", "notes"),
+)
+COMPLETED_ACTIVITIES = Table(
+    name="completed_activities",
+    columns=(
+        "id",
+        "activity_id",
+        "date",
+        "last_modified",
+        "duration",
+        "intensity",
+        "notes",
+    ),
+)
+TRAINABLES = Table(
+    name="trainables",
+    columns=("id", "name", "last_modified", "notes"),
+)
+
+
+def _activities_trainables_rows(activities: Iterable[Activity]) -> Iterator[Row]:
+    for activity in activities:
+        for trainable_id in dict.fromkeys(activity.trainable_ids or []):
+            yield (activity.id, trainable_id)
+
+
+INSERT_ACTIVITIES_TRAINABLES_QUERY = (
+    "INSERT INTO activities_trainables (activity_id, trainable_id) VALUES (?, ?)"
+)
+
+
+def bulk_load_backup(db: sqlite3.Connection, backup: Backup) -> dict[str, int]:
+    """
+    Load `backup` into an empty database within a single transaction, streaming
+    rows straight from the model objects, and return the rows inserted per
+    table. The database connection must be in autocommit mode
+    (isolation_level=None) so that the transaction can be controlled explicitly.
+    """
+    for pragma in BULK_LOAD_PRAGMAS:
+        db.execute(pragma)
+
+    create_schema(db, indexes=False)
+
+    inserted: dict[str, int] = {}
+    db.execute("BEGIN")
+    try:
+        for table, rows in (
+            (ACTIVITIES, map(activity_row, backup.activities)),
+            (
+                COMPLETED_ACTIVITIES,
+                map(completed_activity_row, backup.completed_activities),
+            ),
+            (TRAINABLES, map(trainable_row, backup.trainables or [])),
+        ):
+            inserted[table.name] = db.executemany(table.insert_query(), rows).rowcount
+
+        inserted["activities_trainables"] = db.executemany(
+            INSERT_ACTIVITIES_TRAINABLES_QUERY,
+            _activities_trainables_rows(backup.activities),
+        ).rowcount
+
+        create_indexes(db)
+        refresh_rollups(db)
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+    db.execute("PRAGMA synchronous = NORMAL")
+    return inserted
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    already_applied: bool
+    upserted: dict[str, int]  # rows inserted or updated, per table
+    deleted: dict[str, int] = field(default_factory=dict)  # rows deleted, per table
+
+
+def _read_rows(db: sqlite3.Connection, table: Table) -> dict[str, Row]:
+    columns = ", ".join(table.columns)
+    return {row[0]: row for row in db.execute(f"SELECT {columns} FROM {table.name}")}
+
+
+def _read_trainable_ids(db: sqlite3.Connection) -> dict[str, frozenset[str]]:
+    trainable_ids: dict[str, set[str]] = {}
+    query = "SELECT activity_id, trainable_id FROM activities_trainables"
+    for activity_id, trainable_id in db.execute(query):
+        trainable_ids.setdefault(activity_id, set()).add(trainable_id)
+    return {activity_id: frozenset(ids) for activity_id, ids in trainable_ids.items()}
+
+
+def _find_changes(
+    stored: dict[str, object], incoming: dict[str, object]
+) -> tuple[list[str], list[str]]:
+    """
+    Ids of the records which are new or differ from the stored ones, and ids of
+    the stored records which are not incoming anymore. Whole records are
+    compared, as patches change records without changing their last_modified
+    """
+    changed = [id for id, record in incoming.items() if stored.get(id) != record]
+    deleted = [id for id in stored if id not in incoming]
+    return changed, deleted
+
+
+def sync_backup(
+    db: sqlite3.Connection, backup: Backup, file_name: str, file_hash: str
+) -> SyncResult:
+    """
+    Make the database hold the records of `backup`: insert or update the records
+    that changed since they were last stored, and delete those that are not in
+    `backup` anymore, all within one transaction. The database connection must
+    be in autocommit mode (isolation_level=None) so that the transaction can be
+    controlled explicitly.
+    """
+    create_schema(db)
+
+    already_applied = db.execute(
+        "SELECT 1 FROM applied_backups WHERE file_hash = ?", (file_hash,)
+    ).fetchone()
+    if already_applied:
+        logger.info(f"{file_name} was already applied, skipping")
+        return SyncResult(already_applied=True, upserted={})
+
+    db.execute("BEGIN")
+    try:
+        # the trainables of an activity are part of it
+        stored_trainable_ids = _read_trainable_ids(db)
+        activity_rows = {
+            activity.id: (
+                activity_row(activity),
+                frozenset(activity.trainable_ids or []),
+            )
+            for activity in backup.activities
+        }
+        activity_ids, deleted_activity_ids = _find_changes(
+            stored={
+                id: (row, stored_trainable_ids.get(id, frozenset()))
+                for id, row in _read_rows(db, ACTIVITIES).items()
+            },
+            incoming=activity_rows,  # type: ignore[arg-type]
+        )
+        activities = [activity_rows[id][0] for id in activity_ids]
+
+        completed_activity_rows = {
+            completed_activity.id: completed_activity_row(completed_activity)
+            for completed_activity in backup.completed_activities
+        }
+        completed_activity_ids, deleted_completed_activity_ids = _find_changes(
+            stored=_read_rows(db, COMPLETED_ACTIVITIES),  # type: ignore[arg-type]
+            incoming=completed_activity_rows,  # type: ignore[arg-type]
+        )
+        completed_activities = [
+            completed_activity_rows[id] for id in completed_activity_ids
+        ]
+
+        trainable_rows = {
+            trainable.id: trainable_row(trainable)
+            for trainable in backup.trainables or []
+        }
+        trainable_ids, deleted_trainable_ids = _find_changes(
+            stored=_read_rows(db, TRAINABLES),  # type: ignore[arg-type]
+            incoming=trainable_rows,  # type: ignore[arg-type]
+        )
+        trainables = [trainable_rows[id] for id in trainable_ids]
+
+        # only the rollups and the search index rows derived from the changed
+        # and deleted records are refreshed, so that a sync stays proportional
+        # to them
+        execute_file(db, CREATE_TOUCHED_TABLES_QUERY_PATH)
+        for table, ids in (
+            ("changed_activities", [*activity_ids, *deleted_activity_ids]),
+            (
+                "changed_completed_activities",
+                [*completed_activity_ids, *deleted_completed_activity_ids],
+            ),
+            ("changed_trainables", [*trainable_ids, *deleted_trainable_ids]),
+        ):
+            db.executemany(
+                f"INSERT OR IGNORE INTO temp.{table} (id) VALUES (?)",
+                ((id,) for id in ids),
+            )
+        execute_file(db, COLLECT_TOUCHED_ROLLUPS_QUERY_PATH)
+        search_index = has_search_index(db)
+        if search_index:
+            # before the deleted records are gone, to find their rows
+            execute_file(db, DELETE_TOUCHED_SEARCH_ROWS_QUERY_PATH)
+
+        db.executemany(ACTIVITIES.upsert_query(), activities)
+
+        # the trainables of the changed activities are replaced altogether
+        db.executemany(
+            "DELETE FROM activities_trainables WHERE activity_id = ?",
+            ((id,) for id in [*activity_ids, *deleted_activity_ids]),
+        )
+        changed_activity_ids = set(activity_ids)
+        db.executemany(
+            INSERT_ACTIVITIES_TRAINABLES_QUERY,
+            _activities_trainables_rows(
+                activity
+                for activity in backup.activities
+                if activity.id in changed_activity_ids
+            ),
+        )
+
+        db.executemany(COMPLETED_ACTIVITIES.upsert_query(), completed_activities)
+        db.executemany(TRAINABLES.upsert_query(), trainables)
+
+        for table, ids in (
+            (ACTIVITIES, deleted_activity_ids),
+            (COMPLETED_ACTIVITIES, deleted_completed_activity_ids),
+            (TRAINABLES, deleted_trainable_ids),
+        ):
+            db.executemany(
+                f"DELETE FROM {table.name} WHERE id = ?", ((id,) for id in ids)
+            )
+
+        execute_file(db, COLLECT_TOUCHED_ROLLUPS_QUERY_PATH)
+        execute_file(db, REFRESH_TOUCHED_ROLLUPS_QUERY_PATH)
+        if search_index:
+            execute_file(db, REFRESH_TOUCHED_SEARCH_INDEX_QUERY_PATH)
+
+        db.execute(
+            "INSERT INTO applied_backups (file_hash, file_name, backup_date, applied_at)"
+            " VALUES (?, ?, ?, ?)",
+            (
+                file_hash,
+                file_name,
+                _timestamp(backup.date),
+                _timestamp(datetime.datetime.now(tz=datetime.timezone.utc)),
+            ),
+        )
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+    return SyncResult(
+        already_applied=False,
+        upserted={
+            ACTIVITIES.name: len(activities),
+            COMPLETED_ACTIVITIES.name: len(completed_activities),
+            TRAINABLES.name: len(trainables),
+        },
+        deleted={
+            ACTIVITIES.name: len(deleted_activity_ids),
+            COMPLETED_ACTIVITIES.name: len(deleted_completed_activity_ids),
+            TRAINABLES.name: len(deleted_trainable_ids),
+        },
+    )
@@ -0,0 +1,111 @@
+"""
+Referential integrity checks for backups.
+
+All the references between entities are checked in a single set-based pass and
+collected into a report, instead of logging every broken reference as it is
+found.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Literal, TypeAlias
+
+from src.model import Backup
+
+Relation: TypeAlias = Literal[
+    "Activity->Trainable",
+    "CompletedActivity->Activity",
+    "Training->Activity",
+    "Shortcut->Activity",
+]
+RELATIONS: tuple[Relation, ...] = (
+    "Activity->Trainable",
+    "CompletedActivity->Activity",
+    "Training->Activity",
+    "Shortcut->Activity",
+)
+
+
+@dataclass(frozen=True)
+class DanglingReference:
+    relation: Relation
+    source_id: str  # entity holding the reference, the Activity id for shortcuts
+    target_id: str  # referenced entity, which is missing from the backup
+
+
+@dataclass(frozen=True)
+class CorruptionReport:
+    dangling_references: list[DanglingReference]
+
+    @property
+    def is_corrupted(self) -> bool:
+        return bool(self.dangling_references)
+
+    def counts(self) -> dict[Relation, int]:
+        counts: dict[Relation, int] = {relation: 0 for relation in RELATIONS}
+        for reference in self.dangling_references:
+            counts[reference.relation] += 1
+        return counts
+
+    def by_relation(self, relation: Relation) -> list[DanglingReference]:
+        return [ref for ref in self.dangling_references if ref.relation == relation]
+
+    def to_json(self) -> dict:
+        return {
+            "is_corrupted": self.is_corrupted,
+            "counts": self.counts(),
+            "dangling_references": [
+                asdict(reference) for reference in self.dangling_references
+            ],
+        }
+
+    def write(self, path: Path) -> None:
+        """Export the report as CSV or JSON, depending on the file extension"""
+        if path.suffix == ".csv":
+            with path.open("w", newline="") as file_handler:
+                writer = csv.DictWriter(
+                    file_handler, fieldnames=["relation", "source_id", "target_id"]
+                )
+                writer.writeheader()
+                writer.writerows(map(asdict, self.dangling_references))
+        else:
+            with path.open("w") as file_handler:
+                json.dump(self.to_json(), file_handler, indent=2)
+
+
+def find_dangling_references(backup: Backup) -> CorruptionReport:
+    trainable_ids = {trainable.id for trainable in backup.trainables or []}
+    activity_ids = {activity.id for activity in backup.activities}
+
+    dangling: list[DanglingReference] = [
+        DanglingReference("Activity->Trainable", activity.id, trainable_id)
+        for activity in backup.activities
+        for trainable_id in activity.trainable_ids or []
+        if trainable_id not in trainable_ids
+    ]
+    dangling.extend(
+        DanglingReference(
+            "CompletedActivity->Activity",
+            completed_activity.id,
+            completed_activity.activity_id,
+        )
+        for completed_activity in backup.completed_activities
+        if completed_activity.activity_id not in activity_ids
+    )
+    dangling.extend(
+        DanglingReference("Training->Activity", training.id, activity.activityId)
+        for training in backup.trainings or []
+        for activity in training.activities
+        if activity.activityId not in activity_ids
+    )
+    dangling.extend(
+        DanglingReference("Shortcut->Activity", shortcut, shortcut)
+        for shortcut in backup.shortcuts or []
+        if shortcut not in activity_ids
+    )
+
+    return CorruptionReport(dangling_references=dangling)
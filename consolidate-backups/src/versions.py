@@ -0,0 +1,215 @@
+"""
+Versions of every record found in a series of backups, stored in SQLite, to
+rebuild the data as it was at any point in time without reading any backup.
+The consolidation records the consolidated data after merging each backup, so
+that the versions hold the records only found in older backups too.
+
+Each version is valid from the date of the first backup holding it, until the
+date of the first backup that does not hold it anymore. The validity intervals
+are indexed with an R*Tree, so rebuilding the data at a given time only visits
+the versions valid then.
+"""
+
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable
+
+from src.archive import SECTIONS
+from src.codec import SECTION_DECODERS, decode_datetime
+from src.model import Backup
+from src.sqlite import execute_file
+
+logger = logging.getLogger(__name__)
+
+CREATE_VERSIONS_TABLES_QUERY_PATH = (
+    Path(__file__).parent / "cli" / "create-versions-tables.sql"
+)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# end of the interval of the versions that are still current, in the R*Tree
+OPEN_END = float(2**62)
+
+# section and id of a record, e.g.: ("activities", "act_0000000001")
+RecordKey = tuple[str, str]
+
+
+class OutOfOrderBackup(Exception): ...
+
+
+def _to_microseconds(value: datetime.datetime) -> int:
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _record_id(section: str, record: Any) -> str:
+    # shortcuts are activity ids themselves
+    return record if section == "shortcuts" else record.id
+
+
+def open_versions(path: Path) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    execute_file(db, CREATE_VERSIONS_TABLES_QUERY_PATH)
+    return db
+
+
+def clear_versions(db: sqlite3.Connection) -> None:
+    for table in ("record_versions", "record_versions_intervals", "versioned_backups"):
+        db.execute(f"DELETE FROM {table}")
+
+
+def latest_versioned_date(db: sqlite3.Connection) -> datetime.datetime | None:
+    row = db.execute(
+        "SELECT date FROM versioned_backups ORDER BY date_us DESC LIMIT 1"
+    ).fetchone()
+    return None if row is None else decode_datetime(row[0], "date")
+
+
+def _read_current_versions(
+    db: sqlite3.Connection,
+) -> dict[RecordKey, tuple[int, int, Any]]:
+    current: dict[RecordKey, tuple[int, int, Any]] = {}
+    rows = db.execute(
+        "SELECT section, record_id, version_id, ordinal, data FROM record_versions"
+        " WHERE valid_to IS NULL"
+    )
+    for section, record_id, version_id, ordinal, data in rows:
+        record = SECTION_DECODERS[section](json.loads(data))
+        current[(section, record_id)] = (version_id, ordinal, record)
+    return current
+
+
+class VersionRecorder:
+    """
+    Add the versions found in backups, one backup at a time: they must be added
+    sorted by date, and be newer than the versioned ones
+    """
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self.db = db
+        self.latest = latest_versioned_date(db)
+        # version id, ordinal and record of the current version of each record
+        self.current = _read_current_versions(db)
+        (self.next_ordinal,) = db.execute(
+            "SELECT coalesce(max(ordinal) + 1, 0) FROM record_versions"
+        ).fetchone()
+        self.added = 0
+
+    def add(self, backup: Backup) -> None:
+        if self.latest is not None and backup.date <= self.latest:
+            raise OutOfOrderBackup(
+                f"backup from {backup.date} is not newer than the latest versioned"
+                f" backup, from {self.latest}"
+            )
+        self.latest = backup.date
+        valid_from = _to_microseconds(backup.date)
+        self.db.execute(
+            "INSERT INTO versioned_backups (date_us, date) VALUES (?, ?)",
+            (valid_from, backup.date.isoformat()),
+        )
+
+        current = self.current
+        seen: set[RecordKey] = set()
+        for section, attribute, encode, _ in SECTIONS:
+            for record in getattr(backup, attribute) or []:
+                key = (section, _record_id(section, record))
+                seen.add(key)
+                known = current.get(key)
+                if known is not None and known[2] == record:
+                    continue
+
+                if known is None:
+                    ordinal = self.next_ordinal
+                    self.next_ordinal += 1
+                else:
+                    self._close(version_id=known[0], valid_to=valid_from)
+                    ordinal = known[1]
+
+                cursor = self.db.execute(
+                    "INSERT INTO record_versions"
+                    " (section, record_id, ordinal, valid_from, data)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        section,
+                        key[1],
+                        ordinal,
+                        valid_from,
+                        json.dumps(encode(record), separators=(",", ":")),
+                    ),
+                )
+                version_id = cursor.lastrowid
+                self.db.execute(
+                    "INSERT INTO record_versions_intervals VALUES (?, ?, ?)",
+                    (version_id, valid_from, OPEN_END),
+                )
+                current[key] = (version_id, ordinal, record)  # type: ignore[assignment]
+                self.added += 1
+
+        for key in [key for key in current if key not in seen]:
+            self._close(version_id=current.pop(key)[0], valid_to=valid_from)
+
+    def _close(self, version_id: int, valid_to: int) -> None:
+        self.db.execute(
+            "UPDATE record_versions SET valid_to = ? WHERE version_id = ?",
+            (valid_to, version_id),
+        )
+        self.db.execute(
+            "UPDATE record_versions_intervals SET valid_to = ? WHERE version_id = ?",
+            (valid_to, version_id),
+        )
+
+
+def record_versions(db: sqlite3.Connection, backups: Iterable[Backup]) -> int:
+    """
+    Add the versions found in `backups`, which must be sorted by date and newer
+    than the versioned ones, and return how many versions were added
+    """
+    recorder = VersionRecorder(db)
+    for backup in backups:
+        recorder.add(backup)
+
+    logger.debug(f"{recorder.added} record versions added")
+    return recorder.added
+
+
+def as_of(db: sqlite3.Connection, moment: datetime.datetime) -> Backup | None:
+    """
+    Rebuild the data as it was at `moment`, i.e.: as in the latest backup recorded
+    until then, or None if there was none yet.
+
+    Records are listed in the order they first appeared, and missing sections
+    are rebuilt as empty ones.
+    """
+    if moment.tzinfo is None:
+        raise ValueError(f"expected a time zone in {moment.isoformat()}")
+
+    at = _to_microseconds(moment)
+    row = db.execute(
+        "SELECT date FROM versioned_backups WHERE date_us <= ?"
+        " ORDER BY date_us DESC LIMIT 1",
+        (at,),
+    ).fetchone()
+    if row is None:
+        return None
+
+    rows = db.execute(
+        "SELECT version.section, version.data"
+        " FROM record_versions_intervals AS interval"
+        " JOIN record_versions AS version USING (version_id)"
+        " WHERE interval.valid_from <= :at AND interval.valid_to >= :at"
+        "   AND version.valid_from <= :at"
+        "   AND (version.valid_to IS NULL OR version.valid_to > :at)"
+        " ORDER BY version.ordinal",
+        {"at": at},
+    )
+    sections: dict[str, list[Any]] = {section: [] for section, *_ in SECTIONS}
+    for section, data in rows:
+        sections[section].append(SECTION_DECODERS[section](json.loads(data)))
+
+    return Backup(
+        date=decode_datetime(row[0], "date"),
+        **{attribute: sections[section] for section, attribute, *_ in SECTIONS},
+    )
@@ -0,0 +1,194 @@
+"""
+Watch a directory for new or modified files, and report each of them once it
+stopped changing for a while, so that files still being written are not read.
+
+The directory is scanned periodically, and also as soon as inotify reports any
+change in it when inotify is available (i.e.: on Linux).
+
+asyncio and ctypes are imported when needed, so that the CLIs importing the
+defaults from here still start fast.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator
+
+from src.manifest import FileStat
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0  # seconds
+DEFAULT_SETTLE_SECONDS = 2.0  # without changes, before a file is reported
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+
+class Inotify:
+    """
+    Minimal inotify binding: only tells that something changed in a directory,
+    the directory has to be scanned to know what
+    """
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+
+    @classmethod
+    def open(cls, directory: Path) -> Inotify | None:
+        """Watch `directory`, or return None if inotify is not available"""
+        if not sys.platform.startswith("linux"):
+            return None
+
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        except (OSError, AttributeError) as error:
+            logger.debug(f"inotify is not available, polling instead: {error}")
+            return None
+        return cls(fd=fd)
+
+    def drain(self) -> None:
+        """Discard the pending events"""
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+@dataclass
+class _Pending:
+    stat: FileStat
+    changed_at: float  # time.monotonic()
+
+
+def _stat(path: Path) -> FileStat | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class DirectoryWatcher:
+    """
+    Report the files of `directory` matching any of `patterns` that are new or
+    were modified, once they have not changed for `settle_seconds`.
+
+    Files in `known` are only reported if they change.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        patterns: tuple[str, ...],
+        known: dict[str, FileStat] | None = None,
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        use_inotify: bool = True,
+    ) -> None:
+        self.directory = directory
+        self.patterns = patterns
+        self.known: dict[str, FileStat] = dict(known or {})
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self._pending: dict[str, _Pending] = {}
+
+    def _matches(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.patterns)
+
+    def scan(self, now: float) -> list[Path]:
+        """Look for changes, and return the files that settled"""
+        names = [
+            entry.name
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and self._matches(entry.name)
+        ]
+        for name in names:
+            stat = _stat(self.directory / name)
+            if stat is None or stat == self.known.get(name):
+                self._pending.pop(name, None)
+                continue
+
+            pending = self._pending.get(name)
+            if pending is None or pending.stat != stat:
+                self._pending[name] = _Pending(stat=stat, changed_at=now)
+
+        settled: list[Path] = []
+        for name, pending in list(self._pending.items()):
+            if name not in names:
+                del self._pending[name]  # deleted while being written
+            elif now - pending.changed_at >= self.settle_seconds:
+                del self._pending[name]
+                self.known[name] = pending.stat
+                settled.append(self.directory / name)
+        return sorted(settled)
+
+    def _next_timeout(self, now: float) -> float:
+        timeouts = [self.poll_interval]
+        timeouts.extend(
+            pending.changed_at + self.settle_seconds - now
+            for pending in self._pending.values()
+        )
+        return max(0.0, min(timeouts))
+
+    async def changes(self) -> AsyncIterator[list[Path]]:
+        """Yield the files that settled, in batches, forever"""
+        # imported here because it is slow to import, and only needed to watch
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        inotify = Inotify.open(self.directory) if self.use_inotify else None
+        if inotify:
+
+            def on_event() -> None:
+                inotify.drain()
+                wake.set()
+
+            loop.add_reader(inotify.fd, on_event)
+            logger.debug(f"watching {self.directory} with inotify")
+        else:
+            logger.debug(f"watching {self.directory} every {self.poll_interval}s")
+
+        try:
+            while True:
+                if settled := self.scan(now=time.monotonic()):
+                    yield settled
+                wake.clear()
+                try:
+                    await asyncio.wait_for(
+                        wake.wait(), timeout=self._next_timeout(now=time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if inotify:
+                loop.remove_reader(inotify.fd)
+                inotify.close()
@@ -0,0 +1,4 @@
+from src.codec import use_aliases_in_apischema
+
+# the tests compare the codec with apischema, and use it to write backup files
+use_aliases_in_apischema()
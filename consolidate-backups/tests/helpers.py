@@ -1,4 +1,10 @@
 import datetime
+from pathlib import Path
+
+from apischema import serialize
+
+from src.domain import Decision, Decisions
+from src.io import write_json
 from src.model import (
     ActivityName,
     ActivityNotes,
@@ -29,8 +35,8 @@ def build_completed_activity(
     notes: CompletedActivityNotes | None = None,
 ) -> CompletedActivity:
     return CompletedActivity(
-        id="test_completed_activity_id" if id is None else id,
-        activity_id="test_activity_id" if activity_id is None else activity_id,
+        id="cpa_000001" if id is None else id,
+        activity_id="act_000001" if activity_id is None else activity_id,
         date=(
             datetime.datetime.fromisoformat("2020-01-02 00:00:00+00:00")
             if date is None
@@ -43,7 +49,7 @@ def build_completed_activity(
             if last_modified is None
             else last_modified
         ),
-        notes=None if notes is None else notes,
+        notes="" if notes is None else notes,
     )
 
 
@@ -56,9 +62,9 @@ def build_activity(
     notes: ActivityNotes | None = None,
 ) -> Activity:
     return Activity(
-        id="test_activity_id" if id is None else id,
+        id="act_000001" if id is None else id,
         name="test_name" if name is None else name,
-        other_names="test_other_names" if other_names is None else other_names,
+        other_names=[] if other_names is None else other_names,
         last_modified=(
             datetime.datetime.fromisoformat("2020-01-02 00:00:00+00:00")
             if last_modified is None
@@ -76,14 +82,14 @@ def build_trainable(
     notes: TrainableNotes | None = None,
 ) -> Trainable:
     return Trainable(
-        id="test_trainable_id" if id is None else id,
+        id="tra_000001" if id is None else id,
         name="test_name" if name is None else name,
         last_modified=(
             datetime.datetime.fromisoformat("2020-01-02 00:00:00+00:00")
             if last_modified is None
             else last_modified
         ),
-        notes=None if notes is None else notes,
+        notes="" if notes is None else notes,
     )
 
 
@@ -97,7 +103,7 @@ def build_backup(
 ) -> Backup:
     return Backup(
         date=(
-            datetime.datetime.fromisoformat("2020-01-00 00:00:00+00:00")
+            datetime.datetime.fromisoformat("2020-01-01 00:00:00+00:00")
             if date is None
             else date
         ),
@@ -109,3 +115,25 @@ def build_backup(
         trainables=[] if trainables is None else trainables,
         shortcuts=[] if shortcuts is None else shortcuts,
     )
+
+
+def build_valid_backup(date: str = "2020-01-01 00:00:00+00:00") -> Backup:
+    return build_backup(
+        date=datetime.datetime.fromisoformat(date),
+        activities=[build_activity()],
+        completed_activities=[build_completed_activity()],
+    )
+
+
+def write_backup(path: Path, backup: Backup) -> Path:
+    write_json(path=path, data=serialize(Backup, backup))
+    return path
+
+
+def build_decisions(
+    tmp_path: Path, decisions: list[Decision] | None = None
+) -> Decisions:
+    return Decisions(
+        decisions=[] if decisions is None else decisions,
+        path=tmp_path / "decisions__deleted-completed-activities.csv",
+    )
@@ -0,0 +1,120 @@
+import datetime
+from dataclasses import replace
+from pathlib import Path
+
+from src.archive import (
+    ArchivedBackup,
+    append_to_archive,
+    iter_archive,
+    read_archive_hashes,
+)
+from src.model import Backup
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_trainable,
+)
+
+
+def _build_backup(day: int, completed_activity_ids: list[str]) -> Backup:
+    return build_backup(
+        date=datetime.datetime(2020, 1, day, tzinfo=datetime.timezone.utc),
+        activities=[build_activity()],
+        completed_activities=[
+            build_completed_activity(id=id) for id in completed_activity_ids
+        ],
+        trainables=[build_trainable()],
+        shortcuts=["act_000001"],
+    )
+
+
+def _archive(path: Path, backups: list[Backup]) -> int:
+    return append_to_archive(
+        path=path,
+        backups=[
+            ArchivedBackup(source=f"backup_{index}.json", backup=backup)
+            for index, backup in enumerate(backups)
+        ],
+    )
+
+
+def test_archive_reconstructs_every_backup_exactly(tmp_path: Path) -> None:
+    first = _build_backup(day=1, completed_activity_ids=["cpa_1", "cpa_2", "cpa_3"])
+    backups = [
+        first,
+        # added, changed and removed records
+        replace(
+            _build_backup(day=2, completed_activity_ids=["cpa_1", "cpa_3", "cpa_4"]),
+            completed_activities=[
+                build_completed_activity(id="cpa_1", notes="edited"),
+                build_completed_activity(id="cpa_3"),
+                build_completed_activity(id="cpa_4"),
+            ],
+        ),
+        # reordered records
+        _build_backup(day=3, completed_activity_ids=["cpa_4", "cpa_1", "cpa_3"]),
+        # duplicated ids and missing sections
+        replace(
+            _build_backup(day=4, completed_activity_ids=["cpa_4", "cpa_4"]),
+            trainables=None,
+            shortcuts=[],
+        ),
+        _build_backup(day=5, completed_activity_ids=[]),
+    ]
+    path = tmp_path / "archive.jsonl"
+
+    assert _archive(path, backups) == len(backups)
+
+    assert [archived.backup for archived in iter_archive(path)] == backups
+
+
+def test_archive_only_stores_what_changed(tmp_path: Path) -> None:
+    ids = [f"cpa_{i:06d}" for i in range(1000)]
+    backups = [
+        _build_backup(day=day, completed_activity_ids=ids[: 900 + day])
+        for day in range(1, 11)
+    ]
+    path = tmp_path / "archive.jsonl"
+
+    _archive(path, backups)
+
+    lines = path.read_bytes().splitlines()
+    assert len(lines) == len(backups)
+    # one added completed activity per backup, after the base
+    assert all(len(line) < len(lines[0]) / 100 for line in lines[1:])
+
+
+def test_append_to_archive_skips_archived_backups(tmp_path: Path) -> None:
+    backups = [
+        _build_backup(day=1, completed_activity_ids=["cpa_1"]),
+        _build_backup(day=2, completed_activity_ids=["cpa_1", "cpa_2"]),
+    ]
+    path = tmp_path / "archive.jsonl"
+    _archive(path, backups[:1])
+    hashes = read_archive_hashes(path)
+
+    assert _archive(path, backups) == 1
+
+    assert [archived.source for archived in iter_archive(path)] == [
+        "backup_0.json",
+        "backup_1.json",
+    ]
+    # the hash of an entry only changes if it or a previous entry changes
+    assert read_archive_hashes(path)["backup_0.json"] == hashes["backup_0.json"]
+
+
+def test_archive_hashes_change_with_previous_entries(tmp_path: Path) -> None:
+    backups = [
+        _build_backup(day=1, completed_activity_ids=["cpa_1"]),
+        _build_backup(day=2, completed_activity_ids=["cpa_1", "cpa_2"]),
+    ]
+    path = tmp_path / "archive.jsonl"
+    _archive(path, backups)
+    hashes = read_archive_hashes(path)
+
+    edited = _build_backup(day=1, completed_activity_ids=["cpa_1", "cpa_0"])
+    path.unlink()
+    _archive(path, [edited, backups[1]])
+
+    assert read_archive_hashes(path)["backup_1.json"] != hashes["backup_1.json"]
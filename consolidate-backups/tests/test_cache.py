@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from src.cache import BackupCache
+from src.io import read_backup_file
+from tests.helpers import build_valid_backup, write_backup
+
+
+def test_read_backup_file_reuses_cached_backup(tmp_path: Path) -> None:
+    cache = BackupCache(path=tmp_path / "cache")
+    path = write_backup(
+        tmp_path / "backup.json", build_valid_backup(date="2020-01-01 00:00:00+00:00")
+    )
+
+    original = read_backup_file(path=path, cache=cache)
+    assert cache.get(cache.key_for(path)) == original
+
+    # same content under another name must hit the cache too
+    renamed = path.rename(tmp_path / "renamed.json")
+    assert read_backup_file(path=renamed, cache=cache) == original
+
+
+def test_cache_key_changes_with_file_content(tmp_path: Path) -> None:
+    cache = BackupCache(path=tmp_path / "cache")
+    path = write_backup(
+        tmp_path / "backup.json", build_valid_backup(date="2020-01-01 00:00:00+00:00")
+    )
+    before = cache.key_for(path)
+
+    write_backup(path, build_valid_backup(date="2020-02-01 00:00:00+00:00"))
+
+    assert cache.key_for(path) != before
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = BackupCache(path=tmp_path / "cache")
+    backup = build_valid_backup()
+    cache.put("a", backup)
+    entry_size = (tmp_path / "cache" / "a.pickle").stat().st_size
+    os.utime(tmp_path / "cache" / "a.pickle", (0, 0))
+
+    small_cache = BackupCache(path=tmp_path / "cache", max_size=entry_size)
+    small_cache.put("b", backup)
+
+    assert small_cache.get("a") is None
+    assert small_cache.get("b") == backup
+
+
+def test_cache_only_scans_its_directory_to_evict(tmp_path: Path) -> None:
+    backup = build_valid_backup()
+    BackupCache(path=tmp_path / "cache").put("a", backup)
+    entry_size = (tmp_path / "cache" / "a.pickle").stat().st_size
+    cache = BackupCache(path=tmp_path / "cache", max_size=3 * entry_size)
+
+    with patch.object(BackupCache, "_scan", wraps=cache._scan) as scan:
+        cache.put("b", backup)  # the directory is scanned once
+        cache.put("c", backup)
+        cache.put("c", backup)  # replaces an entry
+        assert scan.call_count == 1
+
+        cache.put("d", backup)  # evicts
+
+    assert scan.call_count == 2
+    assert sorted(path.name for path in (tmp_path / "cache").glob("*.pickle")) == [
+        "b.pickle",
+        "c.pickle",
+        "d.pickle",
+    ]
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+from apischema import ValidationError, deserialize, serialize
+
+from src.codec import DecodeError, decode_backup, encode_backup
+from src.model import Backup, Training, TrainingActivity
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_trainable,
+)
+
+
+def _build_full_backup() -> Backup:
+    return build_backup(
+        date=datetime.datetime.fromisoformat("2020-01-01 00:00:00.123+00:00"),
+        activities=[
+            build_activity(id="act_000001", other_names=["a", "b"]),
+            build_activity(
+                id="act_000002",
+                other_names=[],
+                trainableIds=["tra_000001"],
+                notes="notes",
+            ),
+        ],
+        completed_activities=[
+            build_completed_activity(
+                id="cpa_000001", activity_id="act_000001", notes=""
+            ),
+        ],
+        trainings=[
+            Training(
+                id="trn_000001",
+                name="training",
+                activities=[
+                    TrainingActivity(
+                        activityId="act_000001", duration="long", intensity="low"
+                    )
+                ],
+                is_oneoff=True,
+            )
+        ],
+        trainables=[build_trainable()],
+        shortcuts=["act_000002"],
+    )
+
+
+def test_encode_backup_matches_apischema() -> None:
+    backup = _build_full_backup()
+
+    assert encode_backup(backup) == serialize(Backup, backup)
+
+
+def test_decode_backup_matches_apischema() -> None:
+    data = serialize(Backup, _build_full_backup())
+
+    assert decode_backup(data) == deserialize(Backup, data)
+
+
+@pytest.mark.parametrize(
+    "section, field, value",
+    (
+        ("completedActivities", "duration", "very long"),
+        ("completedActivities", "notes", None),
+        ("activities", "otherNames", "not a list"),
+        ("activities", "unexpected", 1),
+    ),
+)
+def test_decode_backup_rejects_what_apischema_rejects(
+    section: str, field: str, value: object
+) -> None:
+    data = serialize(Backup, _build_full_backup())
+    data[section][0][field] = value
+
+    with pytest.raises(ValidationError):
+        deserialize(Backup, data)
+    with pytest.raises(DecodeError, match=rf"{section}\[0\]"):
+        decode_backup(data)
@@ -0,0 +1,418 @@
+import datetime
+from dataclasses import replace
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.archive import ArchivedBackup, append_to_archive
+from src.cli.apply_review import main as apply_review
+from src.cli.consolidate import (
+    DECISIONS_PATH,
+    _load_all_files,
+    main,
+    parse_cli_argument,
+)
+from src.domain import CorruptedBackup, Decisions, Patches
+from src.cache import hash_file
+from src.io import read_backup_file
+from src.manifest import read_manifest
+from src.model import CompletedActivity
+from src.review import DEFAULT_REVIEW_PATH
+from src.versions import as_of, open_versions
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_valid_backup,
+    write_backup,
+)
+
+PATCHES_HEADER = "backup_file,activity_id,action,payload,rationale\n"
+
+
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_load_all_files_sorts_backups_by_date(tmp_path: Path, jobs: int) -> None:
+    newer = build_valid_backup(date="2020-02-01 00:00:00+00:00")
+    older = build_valid_backup(date="2020-01-01 00:00:00+00:00")
+    paths = [
+        write_backup(tmp_path / "fitness-tracker__a.json", newer),
+        write_backup(tmp_path / "fitness-tracker__b.json", older),
+    ]
+
+    backups = list(_load_all_files(files=paths, patches=Patches(), jobs=jobs))
+
+    assert [backup.date for backup in backups] == [older.date, newer.date]
+
+
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_load_all_files_reports_all_failures(tmp_path: Path, jobs: int) -> None:
+    corrupted = build_backup(
+        date=datetime.datetime.fromisoformat("2020-01-01 00:00:00+00:00"),
+        completed_activities=[build_completed_activity(activity_id="act_missing")],
+    )
+    paths = [
+        write_backup(tmp_path / "fitness-tracker__corrupted.json", corrupted),
+        tmp_path / "fitness-tracker__empty.json",
+    ]
+    paths[1].touch()
+
+    with pytest.raises(CorruptedBackup) as error:
+        list(_load_all_files(files=paths, patches=Patches(), jobs=jobs))
+
+    assert "failed to load 2 out of 2 backups" in str(error.value)
+    assert "fitness-tracker__corrupted.json" in str(error.value)
+    assert "fitness-tracker__empty.json" in str(error.value)
+
+
+def test_main_resumes_from_previous_consolidation(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "patches__activities.csv").write_text(PATCHES_HEADER)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_valid_backup(date="2020-01-01 00:00:00+00:00"),
+    )
+    main(search_dir=backups_dir)
+    first_manifest = read_manifest(directory=tmp_path)
+    assert first_manifest
+    assert list(first_manifest.sources) == ["fitness-tracker__backup_1.json"]
+
+    write_backup(
+        backups_dir / "fitness-tracker__backup_2.json",
+        build_valid_backup(date="2020-02-01 00:00:00+00:00"),
+    )
+    with patch("src.cli.consolidate._load_all_files", wraps=_load_all_files) as load:
+        main(search_dir=backups_dir)
+
+    assert [path.name for path in load.call_args.kwargs["files"]] == [
+        "fitness-tracker__backup_2.json"
+    ]
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    assert list(manifest.sources) == [
+        "fitness-tracker__backup_1.json",
+        "fitness-tracker__backup_2.json",
+    ]
+    resumed = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    assert resumed.date == datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00")
+
+
+def test_main_does_not_hash_untouched_backups_again(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "patches__activities.csv").write_text(PATCHES_HEADER)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_valid_backup(date="2020-01-01 00:00:00+00:00"),
+    )
+    main(search_dir=backups_dir)
+
+    with (
+        patch("src.cli.consolidate.hash_file", wraps=hash_file) as hash,
+        patch("src.cli.consolidate.read_backup_file") as read,
+    ):
+        main(search_dir=backups_dir)
+
+    hashed = [call.args[0].name for call in hash.call_args_list]
+    assert "fitness-tracker__backup_1.json" not in hashed
+    read.assert_not_called()
+
+
+def test_main_rebuilds_when_a_consolidated_backup_changes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "patches__activities.csv").write_text(PATCHES_HEADER)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    path = write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_valid_backup(date="2020-01-01 00:00:00+00:00"),
+    )
+    main(search_dir=backups_dir)
+
+    write_backup(path, build_valid_backup(date="2020-01-02 00:00:00+00:00"))
+    with patch("src.cli.consolidate._load_all_files", wraps=_load_all_files) as load:
+        main(search_dir=backups_dir)
+
+    assert [path.name for path in load.call_args.kwargs["files"]] == [
+        "fitness-tracker__backup_1.json"
+    ]
+
+
+def test_main_in_batch_mode_defers_decisions_to_a_review_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+
+    def _completed_activity(id: str, date: str) -> CompletedActivity:
+        return build_completed_activity(
+            id=id, date=datetime.datetime.fromisoformat(f"{date} 10:00:00+00:00")
+        )
+
+    for name, date, completed_activities in (
+        (
+            "fitness-tracker__backup_1.json",
+            "2020-01-10",
+            [
+                _completed_activity("cpa_000001", "2020-01-02"),
+                _completed_activity("cpa_000002", "2020-01-03"),
+            ],
+        ),
+        (
+            "fitness-tracker__backup_2.json",
+            "2020-01-20",
+            [
+                _completed_activity("cpa_000001", "2020-01-02"),
+                _completed_activity("cpa_000003", "2020-01-05"),
+            ],
+        ),
+    ):
+        backup = build_backup(
+            date=datetime.datetime.fromisoformat(f"{date} 00:00:00+00:00"),
+            activities=[build_activity()],
+            completed_activities=completed_activities,
+        )
+        write_backup(backups_dir / name, backup)
+
+    main(search_dir=backups_dir, batch=True)
+
+    review_path = tmp_path / DEFAULT_REVIEW_PATH
+    rows = review_path.read_text().splitlines()
+    assert [row.split(",")[0] for row in rows[1:]] == ["cpa_000002"]
+    assert read_manifest(directory=tmp_path) is None
+
+    review_path.write_text("\n".join([rows[0], rows[1] + "delete"]) + "\n")
+    apply_review(review_path=review_path)
+    main(search_dir=backups_dir, batch=True)
+
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest is not None
+    consolidated = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    assert [cpa.id for cpa in consolidated.completed_activities] == [
+        "cpa_000001",
+        "cpa_000003",
+    ]
+    assert not review_path.exists()
+
+
+def test_main_rebuilds_when_decisions_change(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    deleted = build_completed_activity(
+        id="cpa_000002",
+        date=datetime.datetime.fromisoformat("2020-01-03 00:00:00+00:00"),
+    )
+    write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_backup(
+            date=datetime.datetime.fromisoformat("2020-01-10 00:00:00+00:00"),
+            activities=[build_activity()],
+            completed_activities=[build_completed_activity(), deleted],
+        ),
+    )
+    write_backup(
+        backups_dir / "fitness-tracker__backup_2.json",
+        build_backup(
+            date=datetime.datetime.fromisoformat("2020-01-20 00:00:00+00:00"),
+            activities=[build_activity()],
+            completed_activities=[build_completed_activity()],
+        ),
+    )
+
+    def consolidate(must_be_deleted: bool) -> list[str]:
+        with Decisions(decisions=None, path=DECISIONS_PATH) as decisions:
+            decisions.decide(
+                id=deleted.id,
+                reviewed_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                must_be_deleted=must_be_deleted,
+            )
+        main(search_dir=backups_dir, batch=True)
+        manifest = read_manifest(directory=tmp_path)
+        assert manifest
+        consolidated = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+        return [cpa.id for cpa in consolidated.completed_activities]
+
+    assert consolidate(must_be_deleted=True) == ["cpa_000001"]
+    assert consolidate(must_be_deleted=False) == ["cpa_000001", "cpa_000002"]
+
+
+def test_main_consolidates_from_an_archive_as_from_files(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    backups = {
+        "fitness-tracker__backup_1.json": build_valid_backup(
+            date="2020-01-01 00:00:00+00:00"
+        ),
+        "fitness-tracker__backup_2.json": build_valid_backup(
+            date="2020-02-01 00:00:00+00:00"
+        ),
+    }
+    for name, backup in backups.items():
+        write_backup(backups_dir / name, backup)
+    archive_path = tmp_path / "archive.jsonl"
+    append_to_archive(
+        path=archive_path,
+        backups=[
+            ArchivedBackup(source=name, backup=backup)
+            for name, backup in backups.items()
+        ],
+    )
+
+    main(search_dir=backups_dir, full=True)
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    from_files = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    main(search_dir=None, archive_path=archive_path, full=True)
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    from_archive = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+
+    assert from_archive == from_files
+    assert list(manifest.sources) == list(backups)
+
+
+def test_main_keeps_versions_up_to_date_when_resuming(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    first = build_valid_backup(date="2020-01-01 00:00:00+00:00")
+    write_backup(backups_dir / "fitness-tracker__backup_1.json", first)
+    versions_path = tmp_path / "versions.sqlite"
+    main(search_dir=backups_dir, versions_path=versions_path)
+
+    second = build_valid_backup(date="2020-02-01 00:00:00+00:00")
+    write_backup(backups_dir / "fitness-tracker__backup_2.json", second)
+    with patch("src.cli.consolidate._load_all_files", wraps=_load_all_files) as load:
+        main(search_dir=backups_dir, versions_path=versions_path)
+
+    assert [path.name for path in load.call_args.kwargs["files"]] == [
+        "fitness-tracker__backup_2.json"
+    ]
+    db = open_versions(versions_path)
+    assert as_of(db=db, moment=first.date) == first
+    assert as_of(db=db, moment=second.date) == second
+
+
+def test_main_records_versions_of_the_consolidation(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    activity = build_activity()
+    removed = build_completed_activity(id="cpa_000001")
+    kept = build_completed_activity(id="cpa_000002")
+    first = build_backup(
+        date=datetime.datetime.fromisoformat("2020-01-01 00:00:00+00:00"),
+        activities=[activity],
+        completed_activities=[removed, kept],
+    )
+    # the first completed activity only exists in the older backup
+    second = replace(
+        first,
+        date=datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00"),
+        completed_activities=[kept],
+    )
+    write_backup(backups_dir / "fitness-tracker__backup_1.json", first)
+    write_backup(backups_dir / "fitness-tracker__backup_2.json", second)
+    versions_path = tmp_path / "versions.sqlite"
+
+    main(search_dir=backups_dir, versions_path=versions_path, batch=True)
+    # nothing is recorded until the deletion is reviewed
+    assert as_of(db=open_versions(versions_path), moment=second.date) is None
+
+    review_path = tmp_path / DEFAULT_REVIEW_PATH
+    rows = review_path.read_text().splitlines()
+    review_path.write_text("\n".join([rows[0], rows[1] + "keep"]) + "\n")
+    apply_review(review_path=review_path)
+    main(search_dir=backups_dir, versions_path=versions_path, batch=True)
+
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    consolidated = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    db = open_versions(versions_path)
+    assert as_of(db=db, moment=first.date) == first
+    latest = as_of(db=db, moment=second.date)
+    assert latest
+    # records are listed in the order they first appeared
+    assert latest.completed_activities == [removed, kept]
+    assert latest == replace(
+        consolidated,
+        completed_activities=sorted(
+            consolidated.completed_activities, key=lambda cpa: cpa.id
+        ),
+    )
+
+
+def test_main_parses_only_the_last_backup_of_each_date_in_range(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    for name, date in (
+        ("fitness-tracker__a.json", "2020-03-01 00:00:00+00:00"),
+        ("fitness-tracker__b.json", "2020-01-01 00:00:00+00:00"),
+        ("fitness-tracker__c.json", "2020-02-01 00:00:00+00:00"),
+        ("fitness-tracker__d.json", "2020-02-01 00:00:00+00:00"),
+        ("fitness-tracker__e.json", "2020-04-01 00:00:00+00:00"),
+    ):
+        write_backup(backups_dir / name, build_valid_backup(date=date))
+
+    with patch("src.cli.consolidate._load_all_files", wraps=_load_all_files) as load:
+        main(
+            search_dir=backups_dir,
+            since=datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00"),
+            until=datetime.datetime.fromisoformat("2020-03-01 00:00:00+00:00"),
+        )
+
+    assert [path.name for path in load.call_args.kwargs["files"]] == [
+        "fitness-tracker__d.json",
+        "fitness-tracker__a.json",
+    ]
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    assert list(manifest.sources) == [
+        "fitness-tracker__a.json",
+        "fitness-tracker__c.json",
+        "fitness-tracker__d.json",
+    ]
+    consolidated = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    assert consolidated.date == datetime.datetime.fromisoformat(
+        "2020-03-01 00:00:00+00:00"
+    )
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    (
+        ["--path", "backups", "--jobs", "-1"],
+        ["--path", "backups", "--sqlite", "db.sqlite"],
+        ["--path", "backups", "--since", "2020-01-01"],  # without time zone
+    ),
+)
+def test_parse_cli_argument_rejects_invalid_arguments(
+    arguments: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("sys.argv", ["consolidate.py", *arguments])
+
+    with pytest.raises(SystemExit):
+        parse_cli_argument()
@@ -0,0 +1,92 @@
+import datetime
+import io
+import json
+from dataclasses import replace
+from pathlib import Path
+
+from apischema import serialize
+
+from src.cli.diff_backups import main
+from src.diff import Change, iter_changes
+from src.model import Backup
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    write_backup,
+)
+
+
+def _build_backup() -> Backup:
+    return build_backup(
+        activities=[build_activity(id="act_1")],
+        completed_activities=[
+            build_completed_activity(id=f"cpa_{i}", activity_id="act_1")
+            for i in range(3)
+        ],
+        shortcuts=["act_1"],
+    )
+
+
+def test_iter_changes_finds_added_removed_and_modified_records() -> None:
+    before = _build_backup()
+    later = datetime.datetime.fromisoformat("2020-01-03 00:00:00+00:00")
+    after = replace(
+        before,
+        completed_activities=[
+            replace(
+                before.completed_activities[0], notes="edited", last_modified=later
+            ),
+            # modified without updating last_modified
+            replace(before.completed_activities[1], duration="long"),
+            build_completed_activity(id="cpa_3", activity_id="act_1"),
+        ],
+        shortcuts=[],
+    )
+
+    changes = list(iter_changes(before=before, after=after))
+
+    assert [(c.section, c.id, c.kind, c.fields) for c in changes] == [
+        ("completedActivities", "cpa_0", "modified", ("notes", "lastModified")),
+        ("completedActivities", "cpa_1", "modified", ("duration",)),
+        ("completedActivities", "cpa_3", "added", ()),
+        ("completedActivities", "cpa_2", "removed", ()),
+        ("shortcuts", "act_1", "removed", ()),
+    ]
+
+
+def test_iter_changes_finds_nothing_between_equal_backups() -> None:
+    assert list(iter_changes(before=_build_backup(), after=_build_backup())) == []
+
+
+def test_main_writes_changes_of_consecutive_backups_as_json_lines(
+    tmp_path: Path,
+) -> None:
+    first = _build_backup()
+    second = replace(first, completed_activities=first.completed_activities[:2])
+    third = replace(second, shortcuts=[])
+    paths = []
+    for index, backup in enumerate((first, second, third)):
+        paths.append(
+            write_backup(tmp_path / f"fitness-tracker__backup_{index}.json", backup)
+        )
+    output = io.StringIO()
+
+    total = main(paths=paths, output=output)
+
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert total == len(lines) == 2
+    assert lines[0] == {
+        "before_file": "fitness-tracker__backup_0.json",
+        "after_file": "fitness-tracker__backup_1.json",
+        **Change(
+            section="completedActivities",
+            id="cpa_2",
+            kind="removed",
+            before=serialize(first.completed_activities[2]),
+        ).to_json(),
+    }
+    assert (lines[1]["after_file"], lines[1]["section"]) == (
+        "fitness-tracker__backup_2.json",
+        "shortcuts",
+    )
@@ -1,17 +1,29 @@
 from dataclasses import replace
 import datetime
 from datetime import timedelta
-from src.model import Backup
-from src.domain import merge_backups
+from pathlib import Path
+from src.model import Backup, CompletedActivity
+import pytest
+
+from src.domain import (
+    Decision,
+    Decisions,
+    Patches,
+    UnsupportedPatch,
+    merge_all_backups,
+    merge_backups,
+)
+from src.validation import find_dangling_references
 from tests.helpers import (
     build_activity,
     build_backup,
     build_completed_activity,
+    build_decisions,
     build_trainable,
 )
 
 
-def test_merge_backups_when_an_activity_is_updated() -> None:
+def test_merge_backups_when_an_activity_is_updated(tmp_path: Path) -> None:
     original = build_activity(id="act_000001", name="name")
     updated = build_activity(
         id=original.id,
@@ -29,12 +41,12 @@ def test_merge_backups_when_an_activity_is_updated() -> None:
         activities=[updated],
     )
 
-    consolidated = merge_backups(a=a, b=b)
+    consolidated = merge_backups(a=a, b=b, decisions=build_decisions(tmp_path))
 
     assert consolidated == b
 
 
-def test_merge_backups_when_a_completed_activity_is_updated() -> None:
+def test_merge_backups_when_a_completed_activity_is_updated(tmp_path: Path) -> None:
     original = build_completed_activity(id="cpa_000001", duration="short")
     updated = build_completed_activity(
         id=original.id,
@@ -52,12 +64,12 @@ def test_merge_backups_when_a_completed_activity_is_updated() -> None:
         activities=[updated],
     )
 
-    consolidated = merge_backups(a=a, b=b)
+    consolidated = merge_backups(a=a, b=b, decisions=build_decisions(tmp_path))
 
     assert consolidated == b
 
 
-def test_merge_backups_when_a_trainable_is_updated() -> None:
+def test_merge_backups_when_a_trainable_is_updated(tmp_path: Path) -> None:
     original = build_trainable(id="imp_000001", name="name")
     updated = build_trainable(
         id=original.id,
@@ -75,6 +87,226 @@ def test_merge_backups_when_a_trainable_is_updated() -> None:
         activities=[updated],
     )
 
-    consolidated = merge_backups(a=a, b=b)
+    consolidated = merge_backups(a=a, b=b, decisions=build_decisions(tmp_path))
 
     assert consolidated == b
+
+
+def _build_daily_backup(
+    day: int, completed_activities: list[CompletedActivity]
+) -> Backup:
+    return build_backup(
+        date=datetime.datetime.fromisoformat(f"2020-01-{day:02d} 23:00:00+00:00"),
+        activities=[build_activity(id="act_000001")],
+        completed_activities=completed_activities,
+    )
+
+
+def _build_completed_activity_on(id: str, day: int) -> CompletedActivity:
+    return build_completed_activity(
+        id=id,
+        activity_id="act_000001",
+        date=datetime.datetime.fromisoformat(f"2020-01-{day:02d} 12:00:00+00:00"),
+    )
+
+
+def test_merge_all_backups_keeps_records_removed_after_being_backed_up(
+    tmp_path: Path,
+) -> None:
+    first = _build_completed_activity_on(id="cpa_000001", day=1)
+    second = _build_completed_activity_on(id="cpa_000002", day=2)
+    third = _build_completed_activity_on(id="cpa_000003", day=3)
+    backups = [
+        _build_daily_backup(day=1, completed_activities=[first]),
+        _build_daily_backup(day=2, completed_activities=[first, second]),
+        # old records removed from the app after backing them up, case (a)
+        _build_daily_backup(day=3, completed_activities=[second, third]),
+    ]
+
+    consolidated = merge_all_backups(
+        backups=backups[1:], decisions=build_decisions(tmp_path), initial=backups[0]
+    )
+
+    # expected output of merging the backups in pairs, as it was done before
+    # merge_all_backups existed: latest records first, then the kept ones
+    assert consolidated == build_backup(
+        date=datetime.datetime.fromisoformat("2020-01-03 23:00:00+00:00"),
+        activities=[build_activity(id="act_000001")],
+        completed_activities=[second, third, first],
+    )
+
+
+def test_merge_all_backups_drops_records_decided_to_be_deleted(tmp_path: Path) -> None:
+    first = _build_completed_activity_on(id="cpa_000001", day=1)
+    second = _build_completed_activity_on(id="cpa_000002", day=2)
+    decisions = build_decisions(
+        tmp_path,
+        decisions=[
+            Decision(
+                id=second.id,
+                reviewed_at=datetime.datetime.fromisoformat(
+                    "2020-01-04 00:00:00+00:00"
+                ),
+                must_be_deleted=True,
+            )
+        ],
+    )
+
+    consolidated = merge_all_backups(
+        backups=[
+            _build_daily_backup(day=1, completed_activities=[first, second]),
+            _build_daily_backup(day=3, completed_activities=[first]),
+        ],
+        decisions=decisions,
+    )
+
+    assert consolidated.completed_activities == [first]
+
+
+def test_merge_all_backups_keeps_deleted_activities_still_referenced(
+    tmp_path: Path,
+) -> None:
+    running, swimming, cycling = (
+        build_activity(id=f"act_00000{i}", name=name)
+        for i, name in enumerate(("running", "swimming", "cycling"), start=1)
+    )
+    # pruned from the app after backing it up, but it is kept, case (a)
+    old_run = build_completed_activity(
+        id="cpa_000001",
+        activity_id=running.id,
+        date=datetime.datetime.fromisoformat("2020-01-01 12:00:00+00:00"),
+    )
+    swim = build_completed_activity(
+        id="cpa_000002",
+        activity_id=swimming.id,
+        date=datetime.datetime.fromisoformat("2020-01-03 12:00:00+00:00"),
+    )
+    backups = [
+        build_backup(
+            date=datetime.datetime.fromisoformat("2020-01-01 23:00:00+00:00"),
+            activities=[running, swimming, cycling],
+            completed_activities=[old_run],
+        ),
+        # running and cycling were deleted from the app
+        build_backup(
+            date=datetime.datetime.fromisoformat("2020-01-03 23:00:00+00:00"),
+            activities=[swimming],
+            completed_activities=[swim],
+        ),
+    ]
+
+    consolidated = merge_all_backups(
+        backups=backups, decisions=build_decisions(tmp_path)
+    )
+
+    assert consolidated.completed_activities == [swim, old_run]
+    assert consolidated.activities == [swimming, running]
+    assert not find_dangling_references(backup=consolidated).is_corrupted
+
+
+PATCHES_HEADER = "backup_file,{id_column},action,payload,rationale\n"
+
+
+def test_patches_are_applied_per_backup_and_record(tmp_path: Path) -> None:
+    activities_path = tmp_path / "patches__activities.csv"
+    activities_path.write_text(
+        PATCHES_HEADER.format(id_column="activity_id")
+        + 'a.json,act_000001,override_trainables,[],""\n'
+        + 'a.json,act_000001,override_name,"""renamed""",""\n'
+        + 'b.json,act_000001,delete,,""\n'
+    )
+    completed_activities_path = tmp_path / "patches__completed-activities.csv"
+    completed_activities_path.write_text(
+        PATCHES_HEADER.format(id_column="completed_activity_id")
+        + 'a.json,cpa_000002,delete,,""\n'
+        + 'a.json,cpa_000003,override_intensity,"""high""",""\n'
+    )
+    patches = Patches.from_files(
+        path_for_activities_patches=activities_path,
+        path_for_completed_activities_patches=completed_activities_path,
+        path_for_trainables_patches=tmp_path / "does-not-exist.csv",
+    )
+    backup = build_backup(
+        activities=[
+            build_activity(id="act_000001", trainableIds=["tra_000001"]),
+            build_activity(id="act_000002", trainableIds=["tra_000001"]),
+        ],
+        completed_activities=[
+            build_completed_activity(id=f"cpa_{i:06d}", intensity="low")
+            for i in range(1, 4)
+        ],
+        trainables=[build_trainable(id="tra_000001")],
+    )
+
+    a_patches = patches.get("a.json")
+    assert a_patches is not None and len(a_patches) == 4
+    patched = a_patches.apply_to(backup)
+
+    assert [(a.id, a.name, a.trainable_ids) for a in patched.activities] == [
+        ("act_000001", "renamed", []),
+        ("act_000002", "test_name", ["tra_000001"]),
+    ]
+    assert [(c.id, c.intensity) for c in patched.completed_activities] == [
+        ("cpa_000001", "low"),
+        ("cpa_000003", "high"),
+    ]
+    assert patched.trainables == backup.trainables
+    assert [a.id for a in patches.get("b.json").apply_to(backup).activities] == [
+        "act_000002"
+    ]
+    assert patches.get("c.json") is None
+
+
+def test_patches_with_unknown_actions_are_rejected(tmp_path: Path) -> None:
+    path = tmp_path / "patches__trainables.csv"
+    path.write_text(
+        PATCHES_HEADER.format(id_column="trainable_id")
+        + 'a.json,tra_000001,override_trainables,[],""\n'
+    )
+
+    with pytest.raises(UnsupportedPatch):
+        Patches.from_files(path_for_trainables_patches=path)
+
+
+def test_decisions_are_appended_and_reloaded_lazily(tmp_path: Path) -> None:
+    path = tmp_path / "decisions.csv"
+    reviewed_at = datetime.datetime.fromisoformat("2024-02-18 23:23:48.018697+00:00")
+
+    with Decisions.from_file(path=path) as decisions:
+        decisions.decide("cpa_000001", reviewed_at, must_be_deleted=True)
+        decisions.decide("cpa_000002", reviewed_at, must_be_deleted=False)
+        # an append-only log supersedes, rather than rewrites, previous rows
+        later = reviewed_at + timedelta(minutes=1)
+        decisions.decide("cpa_000001", later, must_be_deleted=False)
+        assert len(path.read_text().splitlines()) == 4
+
+    # superseded rows are compacted away when closing
+    assert path.read_text().splitlines() == [
+        "id,reviewed_at,must_be_deleted",
+        "cpa_000002,2024-02-18 23:23:48.018697+00:00,False",
+        "cpa_000001,2024-02-18 23:24:48.018697+00:00,False",
+    ]
+
+    reloaded = Decisions.from_file(path=path)
+    assert reloaded.find("cpa_000001") == Decision(
+        id="cpa_000001",
+        reviewed_at=reviewed_at + timedelta(minutes=1),
+        must_be_deleted=False,
+    )
+    assert reloaded.find("cpa_000003") is None
+
+
+def test_decisions_compact_the_log_periodically(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("src.domain.MIN_ROWS_TO_COMPACT", 3)
+    path = tmp_path / "decisions.csv"
+    reviewed_at = datetime.datetime.fromisoformat("2024-02-18 23:23:48+00:00")
+
+    decisions = Decisions.from_file(path=path)
+    for i in range(10):
+        decisions.decide("cpa_000001", reviewed_at, must_be_deleted=bool(i % 2))
+
+    assert len(path.read_text().splitlines()) < 10
+    assert Decisions.from_file(path=path).find("cpa_000001").must_be_deleted
+    decisions.close()
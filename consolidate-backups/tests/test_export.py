@@ -0,0 +1,118 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from src.export import export_tables, iter_backup_records
+from src.io import iter_backup_file, write_backup_to_file
+from src.model import Backup, Training, TrainingActivity
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_trainable,
+)
+
+
+def _build_backup() -> Backup:
+    return build_backup(
+        activities=[
+            build_activity(
+                id="act_000001",
+                other_names=["a", "b"],
+                trainableIds=["tra_000001", "tra_000002"],
+            ),
+        ],
+        completed_activities=[
+            build_completed_activity(
+                id=f"cpa_{i:06d}", activity_id="act_000001", notes=f"note {i}"
+            )
+            for i in range(5)
+        ],
+        trainings=[
+            Training(
+                id="trn_000001",
+                name="training",
+                activities=[
+                    TrainingActivity("act_000001", "short", "low"),
+                    TrainingActivity("act_000001", "long", "high"),
+                ],
+            )
+        ],
+        trainables=[
+            build_trainable(),
+            build_trainable(id="tra_000002"),
+        ],
+    )
+
+
+def _read_csv(path: Path) -> list[list[str]]:
+    with path.open() as file:
+        return list(csv.reader(file))
+
+
+def test_export_flattens_nested_lists_into_through_tables(tmp_path: Path) -> None:
+    paths = export_tables(
+        records=iter_backup_records(_build_backup()),
+        output_dir=tmp_path,
+        prefix="backup",
+        chunk_rows=2,
+    )
+
+    assert _read_csv(paths["activities_trainables"]) == [
+        ["activity_id", "trainable_id"],
+        ["act_000001", "tra_000001"],
+        ["act_000001", "tra_000002"],
+    ]
+    assert _read_csv(paths["trainings_activities"]) == [
+        ["training_id", "position", "activity_id", "duration", "intensity"],
+        ["trn_000001", "0", "act_000001", "short", "low"],
+        ["trn_000001", "1", "act_000001", "long", "high"],
+    ]
+    assert _read_csv(paths["activities"])[1][2] == "a|b"
+    completed_activities = _read_csv(paths["completed_activities"])
+    assert [row[0] for row in completed_activities[1:]] == [
+        f"cpa_{i:06d}" for i in range(5)
+    ]
+    assert completed_activities[1][2] == "2020-01-02 00:00:00+00:00"
+
+
+def test_export_streamed_from_file_matches_export_from_memory(tmp_path: Path) -> None:
+    backup = _build_backup()
+    backup_path = write_backup_to_file(backup=backup, output_dir=tmp_path)
+    (tmp_path / "memory").mkdir()
+    (tmp_path / "stream").mkdir()
+
+    from_memory = export_tables(
+        records=iter_backup_records(backup),
+        output_dir=tmp_path / "memory",
+        prefix="backup",
+    )
+    streamed = export_tables(
+        records=iter_backup_file(backup_path),
+        output_dir=tmp_path / "stream",
+        prefix="backup",
+        chunk_rows=1,
+    )
+
+    for table, path in from_memory.items():
+        assert _read_csv(path) == _read_csv(streamed[table])
+
+
+def test_export_parquet_encodes_durations_and_intensities(tmp_path: Path) -> None:
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+
+    paths = export_tables(
+        records=iter_backup_records(_build_backup()),
+        output_dir=tmp_path,
+        prefix="backup",
+        format="parquet",
+        chunk_rows=2,
+    )
+
+    df = pd.read_parquet(paths["completed_activities"])
+    assert len(df) == 5
+    assert isinstance(df["duration"].dtype, pd.CategoricalDtype)
+    assert list(df["duration"].cat.categories) == ["short", "medium", "long"]
+    assert str(df["date"].dtype) == "datetime64[us, UTC]"
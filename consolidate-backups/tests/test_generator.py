@@ -0,0 +1,19 @@
+from benchmarks.generator import GeneratorConfig, generate_backup_series
+from src.domain import is_backup_corrupted
+
+
+def test_generated_backup_series_is_deterministic_and_valid() -> None:
+    config = GeneratorConfig(days=20, deletions_per_day=1, retention_days=10)
+
+    series = generate_backup_series(config)
+
+    assert series == generate_backup_series(config)
+    assert series != generate_backup_series(GeneratorConfig(days=20, seed=1))
+    assert len(series.backups) == 20
+    assert len(series.deleted_ids) == 20
+    assert not any(is_backup_corrupted(backup=backup) for backup in series.backups)
+    latest_ids = {cpa.id for cpa in series.backups[-1].completed_activities}
+    assert latest_ids.isdisjoint(series.deleted_ids)
+    assert min(cpa.date for cpa in series.backups[-1].completed_activities) >= (
+        config.start.replace(day=10)
+    )
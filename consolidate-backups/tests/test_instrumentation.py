@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+from src import instrumentation
+from src.domain import is_backup_corrupted
+from src.instrumentation import profiling, stage
+from src.io import read_backup_file, write_backup_to_file
+from tests.helpers import build_activity, build_backup, build_completed_activity
+
+
+def test_profiling_writes_a_summary_of_the_stages(tmp_path: Path) -> None:
+    backup = build_backup(
+        activities=[build_activity()],
+        completed_activities=[build_completed_activity()],
+    )
+    path = write_backup_to_file(backup=backup, output_dir=tmp_path)
+    summary_path = tmp_path / "profile.json"
+    dump_path = tmp_path / "profile.pstats"
+
+    with profiling(summary_path=summary_path, dump_path=dump_path):
+        is_backup_corrupted(backup=read_backup_file(path=path))
+
+    summary = json.loads(summary_path.read_text())
+    assert [(s["name"], s["file"], s["records"]) for s in summary["stages"]] == [
+        ("read_json", path.name, None),
+        ("decode", path.name, 2),
+        ("validate", None, 2),
+    ]
+    assert summary["by_stage"]["decode"]["count"] == 1
+    assert summary["process_peak_rss_mib"] > 0
+    assert dump_path.stat().st_size > 0
+
+
+def test_stages_measure_their_own_peak_memory(tmp_path: Path) -> None:
+    with profiling(summary_path=tmp_path / "profile.json"):
+        with stage("large") as large:
+            data = bytearray(50 * 1024 * 1024)
+            del data
+        with stage("outer") as outer:
+            with stage("small") as small:
+                data = bytearray(10 * 1024 * 1024)
+                del data
+
+    assert large.peak_mib is not None and 49 < large.peak_mib < 52
+    # not the peak of the process, nor of the previous stage
+    assert small.peak_mib is not None and 9 < small.peak_mib < 12
+    assert outer.peak_mib is not None and 9 < outer.peak_mib < 12
+
+
+def test_stages_are_not_kept_unless_profiling() -> None:
+    with stage("something") as current:
+        current.records = 1
+
+    assert not instrumentation.is_enabled()
+    assert instrumentation.drain_stages() == []
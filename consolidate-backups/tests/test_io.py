@@ -0,0 +1,201 @@
+import io
+import json
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from src.codec import encode_backup
+from src.io import (
+    Compression,
+    UnsupportedBackupFile,
+    backup_stem,
+    dump_backup,
+    iter_backup_file,
+    read_backup_file,
+    read_backup_file_streaming,
+    read_backup_header,
+    write_backup_to_file,
+)
+from src.json_stream import ARRAY_END, ARRAY_START, SKIPPED, iter_json_object
+from src.model import Backup, CompletedActivity, Training, TrainingActivity
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_trainable,
+    write_backup,
+)
+
+
+def _build_backup_to_read() -> Backup:
+    return build_backup(
+        activities=[build_activity(other_names=["other name"])],
+        completed_activities=[
+            build_completed_activity(id=f"cpa_{i:06d}", notes=f"note {i}")
+            for i in range(50)
+        ],
+        trainables=[build_trainable()],
+        shortcuts=["act_000001"],
+    )
+
+
+def test_iter_json_object_yields_array_items_one_by_one() -> None:
+    document = io.StringIO('{"date": 1.5, "items": [{"a": [1, 2]}, "b"], "e": []}')
+
+    members = list(iter_json_object(document, chunk_size=3))
+
+    assert members == [
+        ("date", 1.5),
+        ("items", ARRAY_START),
+        ("items", {"a": [1, 2]}),
+        ("items", "b"),
+        ("items", ARRAY_END),
+        ("e", ARRAY_START),
+        ("e", ARRAY_END),
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", (1, 3, 64 * 1024))
+def test_iter_json_object_can_skip_array_items(
+    chunk_size: int,
+) -> None:
+    document = io.StringIO(
+        '{"items": [{"a": "]}\\\\", "b": ["\\"[{"]}, [], "c", 2], "date": "d"}'
+    )
+
+    members = list(iter_json_object(document, chunk_size=chunk_size, skip_items=True))
+
+    assert members == [
+        ("items", ARRAY_START),
+        ("items", SKIPPED),
+        ("items", SKIPPED),
+        ("items", SKIPPED),
+        ("items", SKIPPED),
+        ("items", ARRAY_END),
+        ("date", "d"),
+    ]
+
+
+def test_read_backup_header_counts_records(
+    tmp_path: Path,
+) -> None:
+    path = write_backup(tmp_path / "backup.json", _build_backup_to_read())
+
+    header = read_backup_header(path, count_records=True)
+
+    assert header.date == read_backup_file(path).date
+    assert header.counts == {
+        "activities": 1,
+        "completedActivities": 50,
+        "trainings": 0,
+        "trainables": 1,
+        "shortcuts": 1,
+    }
+    assert read_backup_header(path).counts is None
+
+
+def test_read_backup_header_reports_missing_date(tmp_path: Path) -> None:
+    path = tmp_path / "backup.json"
+    path.write_text('{"activities": [], "completedActivities": []}')
+
+    with pytest.raises(UnsupportedBackupFile, match="missing date"):
+        read_backup_header(path)
+
+
+@pytest.mark.parametrize("chunk_size", (7, 64 * 1024))
+def test_read_backup_file_streaming_matches_read_backup_file(
+    tmp_path: Path, chunk_size: int
+) -> None:
+    path = write_backup(tmp_path / "backup.json", _build_backup_to_read())
+
+    streamed = read_backup_file_streaming(path=path, chunk_size=chunk_size)
+
+    assert streamed == read_backup_file(path=path)
+
+
+def test_iter_backup_file_yields_model_objects(tmp_path: Path) -> None:
+    path = write_backup(tmp_path / "backup.json", _build_backup_to_read())
+
+    completed_activities = [
+        record
+        for section, record in iter_backup_file(path=path, chunk_size=7)
+        if section == "completedActivities"
+    ]
+
+    assert len(completed_activities) == 50
+    assert all(isinstance(cpa, CompletedActivity) for cpa in completed_activities)
+
+
+def test_iter_backup_file_reports_invalid_record(tmp_path: Path) -> None:
+    path = tmp_path / "backup.json"
+    path.write_text('{"date": "2020-01-01T00:00:00Z", "activities": [{"id": 1}]}')
+
+    with pytest.raises(UnsupportedBackupFile, match=r"activities\[0\]"):
+        list(iter_backup_file(path=path))
+
+
+def _build_backup_to_dump() -> Backup:
+    return build_backup(
+        activities=[
+            build_activity(
+                id="act_000001", other_names=["ötra", 'with "quotes"'], notes=None
+            ),
+            build_activity(id="act_000002", trainableIds=["tra_1"]),
+        ],
+        completed_activities=[
+            build_completed_activity(id="cpa_000001", notes="line\nbreak ✓"),
+            build_completed_activity(id="cpa_000002", last_modified=None),
+        ],
+        trainings=[
+            Training(
+                id="trn_000001",
+                name="training",
+                activities=[
+                    TrainingActivity(
+                        activityId="act_000001", duration="short", intensity="low"
+                    )
+                ],
+                is_oneoff=True,
+            )
+        ],
+        trainables=[],
+        shortcuts=["act_000001"],
+    )
+
+
+@pytest.mark.parametrize(
+    "compact, json_options",
+    ((False, {"indent": 2}), (True, {"separators": (",", ":")})),
+)
+def test_dump_backup_matches_json_dump(compact: bool, json_options: dict) -> None:
+    backup = _build_backup_to_dump()
+    for other in (backup, replace(backup, trainables=None)):
+        output = io.StringIO()
+
+        dump_backup(backup=other, file_handler=output, compact=compact)
+
+        assert output.getvalue() == json.dumps(encode_backup(other), **json_options)
+
+
+@pytest.mark.parametrize("compression", (None, "gzip", "zstd"))
+def test_write_backup_to_file_can_be_read_back(
+    tmp_path: Path, compression: Compression | None
+) -> None:
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    backup = _build_backup_to_dump()
+
+    path = write_backup_to_file(
+        backup=backup, output_dir=tmp_path, compact=True, compression=compression
+    )
+
+    assert read_backup_file(path=path) == backup
+    assert read_backup_file_streaming(path=path) == backup
+
+
+@pytest.mark.parametrize(
+    "name", ("backup.json", "backup.json.gz", "backup.json.zst", "backup")
+)
+def test_backup_stem_drops_json_and_compression_suffixes(name: str) -> None:
+    assert backup_stem(Path(name)) == "backup"
@@ -0,0 +1,57 @@
+import datetime
+from pathlib import Path
+
+import pytest
+
+from src.domain import PendingReview
+from src.review import InvalidAnswer, apply_review_file, write_review_file
+from tests.helpers import build_decisions
+
+
+def _build_review(id: str) -> PendingReview:
+    date = datetime.datetime.fromisoformat("2020-01-02 00:00:00+00:00")
+    return PendingReview(
+        id=id,
+        activity_id="act_000001",
+        activity_name="running",
+        date=date,
+        lower_boundary=date,
+        upper_boundary=date,
+        backup_date=date,
+    )
+
+
+def _answer(path: Path, answers: list[str]) -> None:
+    header, *rows = path.read_text().splitlines()
+    path.write_text(
+        "\n".join([header, *(row + answer for row, answer in zip(rows, answers))])
+    )
+
+
+def test_apply_review_file_decides_the_answered_rows(tmp_path: Path) -> None:
+    path = tmp_path / "review.csv"
+    reviews = [_build_review(f"cpa_00000{i}") for i in range(3)]
+    assert write_review_file(reviews=reviews, path=path) == 3
+    _answer(path, ["Delete", "k", ""])
+    decisions = build_decisions(tmp_path)
+
+    result = apply_review_file(path=path, decisions=decisions)
+
+    assert (result.decided, result.pending) == (2, 1)
+    assert decisions.find("cpa_000000").must_be_deleted
+    assert not decisions.find("cpa_000001").must_be_deleted
+    assert decisions.find("cpa_000002") is None
+
+
+def test_apply_review_file_rejects_unknown_answers(tmp_path: Path) -> None:
+    path = tmp_path / "review.csv"
+    write_review_file(
+        reviews=[_build_review(f"cpa_00000{i}") for i in range(2)], path=path
+    )
+    _answer(path, ["d", "maybe"])
+    decisions = build_decisions(tmp_path)
+
+    with pytest.raises(InvalidAnswer):
+        apply_review_file(path=path, decisions=decisions)
+
+    assert decisions.find("cpa_000000") is None
@@ -0,0 +1,414 @@
+import dataclasses
+import datetime
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.cli.backup_to_sqlite import _load_with_pandas
+from src.cli.search import main as search_main
+from src.model import Backup
+from src.sqlite import (
+    bulk_load_backup,
+    create_search_index,
+    refresh_rollups,
+    search,
+    sync_backup,
+)
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_trainable,
+)
+
+
+def _build_backup() -> Backup:
+    return build_backup(
+        activities=[
+            build_activity(
+                id="act_000001", other_names=["a", "b"], trainableIds=["tra_000001"]
+            )
+        ],
+        completed_activities=[
+            build_completed_activity(id=f"cpa_{i:06d}", activity_id="act_000001")
+            for i in range(3)
+        ],
+        trainables=[build_trainable(id="tra_000001")],
+    )
+
+
+def _connect(tmp_path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(tmp_path / "db.sqlite", isolation_level=None)
+
+
+def test_sync_backup_only_upserts_changed_rows(tmp_path: Path) -> None:
+    db = _connect(tmp_path)
+    backup = _build_backup()
+
+    first = sync_backup(db=db, backup=backup, file_name="1.json", file_hash="1")
+    assert first.upserted == {
+        "activities": 1,
+        "completed_activities": 3,
+        "trainables": 1,
+    }
+
+    edited = dataclasses.replace(
+        backup.completed_activities[0],
+        notes="edited",
+        last_modified=datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00"),
+    )
+    second = sync_backup(
+        db=db,
+        backup=dataclasses.replace(
+            backup, completed_activities=[edited, *backup.completed_activities[1:]]
+        ),
+        file_name="2.json",
+        file_hash="2",
+    )
+
+    assert second.upserted == {
+        "activities": 0,
+        "completed_activities": 1,
+        "trainables": 0,
+    }
+    assert db.execute(
+        "SELECT notes FROM completed_activities WHERE id = ?", (edited.id,)
+    ).fetchone() == ("edited",)
+    assert db.execute("SELECT COUNT(*) FROM completed_activities").fetchone() == (3,)
+    assert db.execute("SELECT * FROM activities_trainables").fetchall() == [
+        ("act_000001", "tra_000001")
+    ]
+
+
+def test_sync_backup_skips_already_applied_backups(tmp_path: Path) -> None:
+    db = _connect(tmp_path)
+    sync_backup(db=db, backup=_build_backup(), file_name="1.json", file_hash="1")
+
+    result = sync_backup(
+        db=db, backup=_build_backup(), file_name="1.json", file_hash="1"
+    )
+
+    assert result.already_applied
+    assert db.execute("SELECT file_name FROM applied_backups").fetchall() == [
+        ("1.json",)
+    ]
+
+
+def test_bulk_load_backup_keeps_the_schema_and_creates_indexes(
+    tmp_path: Path,
+) -> None:
+    db = _connect(tmp_path)
+
+    inserted = bulk_load_backup(db=db, backup=_build_backup())
+
+    assert inserted == {
+        "activities": 1,
+        "completed_activities": 3,
+        "trainables": 1,
+        "activities_trainables": 1,
+    }
+    assert db.execute("SELECT COUNT(*) FROM history").fetchone() == (3,)
+    primary_keys = [
+        row[1]
+        for row in db.execute("PRAGMA table_info(completed_activities)")
+        if row[5]
+    ]
+    assert primary_keys == ["id"]
+    assert db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+        ("completed_activities",),
+    ).fetchall()
+
+
+def test_pandas_loader_keeps_the_schema_so_that_it_can_be_synced(
+    tmp_path: Path,
+) -> None:
+    db = _connect(tmp_path)
+    backup = _build_backup()
+    _load_with_pandas(db=db, backup=backup)
+
+    primary_keys = [
+        row[1]
+        for row in db.execute("PRAGMA table_info(completed_activities)")
+        if row[5]
+    ]
+    assert primary_keys == ["id"]
+    updated = dataclasses.replace(
+        backup.completed_activities[0],
+        notes="updated",
+        last_modified=datetime.datetime.fromisoformat("2020-01-03 00:00:00+00:00"),
+    )
+    result = sync_backup(
+        db=db,
+        backup=dataclasses.replace(
+            backup, completed_activities=[updated, *backup.completed_activities[1:]]
+        ),
+        file_name="backup.json",
+        file_hash="hash",
+    )
+
+    assert result.upserted["completed_activities"] == 1
+    assert db.execute("SELECT COUNT(*) FROM completed_activities").fetchone() == (3,)
+
+
+def test_bulk_load_backup_builds_daily_and_weekly_rollups(tmp_path: Path) -> None:
+    db = _connect(tmp_path)
+    backup = _build_backup()
+    sunday = datetime.datetime.fromisoformat("2020-01-05 10:00:00+00:00")
+    backup = dataclasses.replace(
+        backup,
+        completed_activities=[
+            *backup.completed_activities,
+            build_completed_activity(
+                id="cpa_999999", activity_id="act_000001", date=sunday
+            ),
+        ],
+    )
+
+    bulk_load_backup(db=db, backup=backup)
+
+    assert db.execute(
+        "SELECT period, period_start, completed_activities FROM activity_rollups"
+        " WHERE activity_id = 'act_000001' ORDER BY period, period_start"
+    ).fetchall() == [
+        ("day", "2020-01-02", 3),
+        ("day", "2020-01-05", 1),
+        ("week", "2019-12-30", 4),
+    ]
+    assert db.execute(
+        "SELECT period, period_start, completed_activities FROM trainable_rollups"
+        " WHERE trainable_id = 'tra_000001' AND period = 'week'"
+    ).fetchall() == [("week", "2019-12-30", 4)]
+
+
+def test_sync_backup_refreshes_rollups(tmp_path: Path) -> None:
+    db = _connect(tmp_path)
+    backup = _build_backup()
+    sync_backup(db=db, backup=backup, file_name="1.json", file_hash="1")
+
+    moved = dataclasses.replace(
+        backup.completed_activities[0],
+        date=datetime.datetime.fromisoformat("2020-01-03 00:00:00+00:00"),
+        last_modified=datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00"),
+    )
+    sync_backup(
+        db=db,
+        backup=dataclasses.replace(
+            backup, completed_activities=[moved, *backup.completed_activities[1:]]
+        ),
+        file_name="2.json",
+        file_hash="2",
+    )
+
+    assert db.execute(
+        "SELECT period_start, completed_activities FROM activity_rollups"
+        " WHERE period = 'day' ORDER BY period_start"
+    ).fetchall() == [("2020-01-02", 2), ("2020-01-03", 1)]
+
+
+def _dump_derived_tables(db: sqlite3.Connection) -> dict[str, list[tuple]]:
+    return {
+        table: sorted(db.execute(f"SELECT * FROM {table}"))
+        for table in ("activity_rollups", "trainable_rollups", "search_index")
+    }
+
+
+def test_sync_backup_refreshes_what_derives_from_changed_records_only(
+    tmp_path: Path,
+) -> None:
+    db = _connect(tmp_path)
+    backup = build_backup(
+        activities=[
+            build_activity(id="act_000001", name="run", trainableIds=["tra_000001"]),
+            build_activity(id="act_000002", name="swim", trainableIds=["tra_000002"]),
+        ],
+        completed_activities=[
+            build_completed_activity(
+                id=f"cpa_{i:06d}", activity_id=f"act_00000{i % 2 + 1}", notes="fun"
+            )
+            for i in range(4)
+        ],
+        trainables=[build_trainable(id="tra_000001"), build_trainable(id="tra_000002")],
+    )
+    sync_backup(db=db, backup=backup, file_name="1.json", file_hash="1")
+    create_search_index(db)
+
+    later = datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00")
+    renamed = dataclasses.replace(
+        backup.activities[0],
+        name="jog",
+        trainable_ids=["tra_000002"],
+        last_modified=later,
+    )
+    moved = dataclasses.replace(
+        backup.completed_activities[0],
+        activity_id="act_000002",
+        date=datetime.datetime.fromisoformat("2020-01-05 00:00:00+00:00"),
+        notes="boring",
+        last_modified=later,
+    )
+    sync_backup(
+        db=db,
+        backup=dataclasses.replace(
+            backup,
+            activities=[renamed, backup.activities[1]],
+            completed_activities=[moved, *backup.completed_activities[1:]],
+        ),
+        file_name="2.json",
+        file_hash="2",
+    )
+    synced = _dump_derived_tables(db)
+
+    db.execute("BEGIN")
+    refresh_rollups(db)
+    create_search_index(db)
+    db.execute("COMMIT")
+    assert synced == _dump_derived_tables(db)
+    assert [result.record_id for result in search(db=db, query="boring")] == [
+        "cpa_000000"
+    ]
+
+
+def test_sync_backup_deletes_records_missing_from_the_backup(
+    tmp_path: Path,
+) -> None:
+    db = _connect(tmp_path)
+    backup = build_backup(
+        activities=[
+            build_activity(id="act_000001", name="run", trainableIds=["tra_000001"]),
+            build_activity(id="act_000002", name="swim", trainableIds=["tra_000002"]),
+        ],
+        completed_activities=[
+            build_completed_activity(
+                id=f"cpa_{i:06d}", activity_id=f"act_00000{i % 2 + 1}", notes="fun"
+            )
+            for i in range(4)
+        ],
+        trainables=[build_trainable(id="tra_000001"), build_trainable(id="tra_000002")],
+    )
+    sync_backup(db=db, backup=backup, file_name="1.json", file_hash="1")
+    create_search_index(db)
+
+    result = sync_backup(
+        db=db,
+        backup=dataclasses.replace(
+            backup,
+            activities=[backup.activities[0]],
+            completed_activities=[backup.completed_activities[0]],
+            trainables=[backup.trainables[0]],
+        ),
+        file_name="2.json",
+        file_hash="2",
+    )
+
+    assert result.upserted == {
+        "activities": 0,
+        "completed_activities": 0,
+        "trainables": 0,
+    }
+    assert result.deleted == {
+        "activities": 1,
+        "completed_activities": 3,
+        "trainables": 1,
+    }
+    assert db.execute("SELECT id FROM completed_activities").fetchall() == [
+        ("cpa_000000",)
+    ]
+    assert db.execute("SELECT * FROM activities_trainables").fetchall() == [
+        ("act_000001", "tra_000001")
+    ]
+    assert search(db=db, query="swim") == []
+    synced = _dump_derived_tables(db)
+
+    db.execute("BEGIN")
+    refresh_rollups(db)
+    create_search_index(db)
+    db.execute("COMMIT")
+    assert synced == _dump_derived_tables(db)
+
+
+def test_sync_backup_upserts_records_changed_without_last_modified(
+    tmp_path: Path,
+) -> None:
+    db = _connect(tmp_path)
+    backup = build_backup(
+        activities=[
+            dataclasses.replace(
+                build_activity(trainableIds=["tra_000001"]), last_modified=None
+            )
+        ],
+        completed_activities=[build_completed_activity(id="cpa_000001")],
+        trainables=[
+            build_trainable(id="tra_000001"),
+            build_trainable(id="tra_000002"),
+        ],
+    )
+    sync_backup(db=db, backup=backup, file_name="1.json", file_hash="1")
+
+    # what patches do: the records change but their last_modified does not
+    patched = dataclasses.replace(
+        backup.activities[0], trainable_ids=["tra_000001", "tra_000002"]
+    )
+    annotated = dataclasses.replace(backup.completed_activities[0], notes="patched")
+    result = sync_backup(
+        db=db,
+        backup=dataclasses.replace(
+            backup, activities=[patched], completed_activities=[annotated]
+        ),
+        file_name="2.json",
+        file_hash="2",
+    )
+
+    assert result.upserted == {
+        "activities": 1,
+        "completed_activities": 1,
+        "trainables": 0,
+    }
+    assert sorted(db.execute("SELECT * FROM activities_trainables")) == [
+        ("act_000001", "tra_000001"),
+        ("act_000001", "tra_000002"),
+    ]
+    assert db.execute("SELECT notes FROM completed_activities").fetchall() == [
+        ("patched",)
+    ]
+
+
+def test_search_ranks_name_matches_above_notes_matches(tmp_path: Path) -> None:
+    db = _connect(tmp_path)
+    backup = build_backup(
+        activities=[
+            build_activity(id="act_000001", name="Running", other_names=["jog"]),
+            build_activity(id="act_000002", name="Swimming", notes="after running"),
+        ],
+        completed_activities=[
+            build_completed_activity(
+                id="cpa_000001", activity_id="act_000002", notes="ran to the pool"
+            )
+        ],
+        trainables=[build_trainable(id="tra_000001", notes="Jogging helps")],
+    )
+    bulk_load_backup(db=db, backup=backup)
+    create_search_index(db)
+
+    assert [result.record_id for result in search(db=db, query="run")] == [
+        "act_000001",
+        "act_000002",
+    ]
+    assert {result.record_id for result in search(db=db, query="jog")} == {
+        "act_000001",
+        "tra_000001",
+    }
+    assert [result.record_id for result in search(db=db, query="pool")] == [
+        "cpa_000001"
+    ]
+    assert search(db=db, query='"unbalanced') == []
+
+
+def test_search_does_not_create_missing_databases(tmp_path: Path) -> None:
+    path = tmp_path / "missing.sqlite"
+
+    with pytest.raises(FileNotFoundError):
+        search_main(database_path=path, query="run")
+
+    assert not path.exists()
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+CLI_MODULES = (
+    "src.cli.apply_review",
+    "src.cli.archive_backups",
+    "src.cli.as_of",
+    "src.cli.backup_to_csv",
+    "src.cli.backup_to_sqlite",
+    "src.cli.consolidate",
+    "src.cli.diff_backups",
+    "src.cli.search",
+    "src.cli.validate_backup",
+)
+
+# only some commands need them, so they must be imported when needed
+HEAVY_MODULES = ("apischema", "numpy", "pandas", "pyarrow")
+
+# wall-clock timings depend on the machine and its load, so the startup budget
+# is only checked when given, e.g. STARTUP_BUDGET_SECONDS=0.5 python -m pytest.
+# The heavy imports, which make startup slow, are always checked
+STARTUP_BUDGET_VARIABLE = "STARTUP_BUDGET_SECONDS"
+
+
+@pytest.mark.parametrize("module", CLI_MODULES)
+def test_cli_does_not_import_heavy_modules(module: str) -> None:
+    script = (
+        f"import sys, {module}\n"
+        f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == ""
+
+
+@pytest.mark.skipif(
+    STARTUP_BUDGET_VARIABLE not in os.environ,
+    reason=f"{STARTUP_BUDGET_VARIABLE} is not set",
+)
+def test_consolidate_help_is_within_startup_budget() -> None:
+    elapsed: list[float] = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "src.cli.consolidate", "--help"],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            check=True,
+        )
+        elapsed.append(time.perf_counter() - start)
+
+    assert min(elapsed) < float(os.environ[STARTUP_BUDGET_VARIABLE])
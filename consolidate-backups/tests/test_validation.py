@@ -0,0 +1,78 @@
+import csv
+import json
+from pathlib import Path
+
+from src.domain import is_backup_corrupted
+from src.model import Backup, Training, TrainingActivity
+from src.validation import DanglingReference, find_dangling_references
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_trainable,
+)
+
+
+def _build_corrupted_backup() -> Backup:
+    return build_backup(
+        activities=[
+            build_activity(id="act_000001", trainableIds=["tra_000001", "tra_lost"])
+        ],
+        completed_activities=[
+            build_completed_activity(id="cpa_000001", activity_id="act_000001"),
+            build_completed_activity(id="cpa_000002", activity_id="act_lost"),
+        ],
+        trainings=[
+            Training(
+                id="trn_000001",
+                name="training",
+                activities=[
+                    TrainingActivity(
+                        activityId="act_lost", duration="long", intensity="low"
+                    )
+                ],
+            )
+        ],
+        trainables=[build_trainable(id="tra_000001")],
+        shortcuts=["act_000001", "act_lost"],
+    )
+
+
+def test_find_dangling_references() -> None:
+    report = find_dangling_references(backup=_build_corrupted_backup())
+
+    assert report.dangling_references == [
+        DanglingReference("Activity->Trainable", "act_000001", "tra_lost"),
+        DanglingReference("CompletedActivity->Activity", "cpa_000002", "act_lost"),
+        DanglingReference("Training->Activity", "trn_000001", "act_lost"),
+        DanglingReference("Shortcut->Activity", "act_lost", "act_lost"),
+    ]
+    assert report.counts() == {
+        "Activity->Trainable": 1,
+        "CompletedActivity->Activity": 1,
+        "Training->Activity": 1,
+        "Shortcut->Activity": 1,
+    }
+    assert is_backup_corrupted(backup=_build_corrupted_backup())
+
+
+def test_valid_backup_is_not_corrupted() -> None:
+    backup = build_backup(
+        activities=[build_activity(id="act_000001")],
+        completed_activities=[build_completed_activity(activity_id="act_000001")],
+    )
+
+    assert not find_dangling_references(backup=backup).is_corrupted
+    assert not is_backup_corrupted(backup=backup)
+
+
+def test_report_can_be_exported(tmp_path: Path) -> None:
+    report = find_dangling_references(backup=_build_corrupted_backup())
+
+    report.write(path=tmp_path / "report.json")
+    report.write(path=tmp_path / "report.csv")
+
+    exported = json.loads((tmp_path / "report.json").read_text())
+    assert exported["counts"] == report.counts()
+    with (tmp_path / "report.csv").open() as file_handler:
+        assert len(list(csv.DictReader(file_handler))) == 4
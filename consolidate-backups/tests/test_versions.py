@@ -0,0 +1,104 @@
+import datetime
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from src.cli.as_of import parse_cli_argument
+from src.model import Backup
+from src.versions import (
+    OutOfOrderBackup,
+    as_of,
+    latest_versioned_date,
+    open_versions,
+    record_versions,
+)
+from tests.helpers import build_activity, build_backup, build_completed_activity
+
+
+def _date(day: int) -> datetime.datetime:
+    return datetime.datetime(2020, 1, day, tzinfo=datetime.timezone.utc)
+
+
+def _build_backups() -> list[Backup]:
+    activity = build_activity(id="act_1", notes="")
+    first = build_backup(
+        date=_date(1),
+        activities=[activity],
+        completed_activities=[
+            build_completed_activity(id=f"cpa_{i}", activity_id="act_1")
+            for i in range(3)
+        ],
+        shortcuts=["act_1"],
+    )
+    second = replace(
+        first,
+        date=_date(2),
+        activities=[replace(activity, notes="edited", last_modified=_date(2))],
+        completed_activities=first.completed_activities[1:],
+    )
+    third = replace(
+        second,
+        date=_date(3),
+        completed_activities=[
+            *second.completed_activities,
+            build_completed_activity(id="cpa_3", activity_id="act_1"),
+        ],
+        shortcuts=[],
+    )
+    return [first, second, third]
+
+
+def test_as_of_rebuilds_the_latest_backup_until_then(tmp_path: Path) -> None:
+    backups = _build_backups()
+    db = open_versions(tmp_path / "versions.sqlite")
+
+    record_versions(db=db, backups=backups)
+
+    assert as_of(db=db, moment=_date(1) - datetime.timedelta(seconds=1)) is None
+    assert as_of(db=db, moment=_date(1)) == backups[0]
+    assert as_of(db=db, moment=_date(2) + datetime.timedelta(hours=12)) == backups[1]
+    assert as_of(db=db, moment=_date(30)) == backups[2]
+
+
+def test_record_versions_resumes_from_the_stored_versions(tmp_path: Path) -> None:
+    backups = _build_backups()
+    path = tmp_path / "versions.sqlite"
+    db = open_versions(path)
+    record_versions(db=db, backups=backups[:2])
+    db.commit()
+    db.close()
+
+    db = open_versions(path)
+    added = record_versions(db=db, backups=backups[2:])
+
+    # the new completed activity and the shortcut removal do not add an
+    # activity version, as the activity did not change
+    assert added == 1
+    assert latest_versioned_date(db) == _date(3)
+    assert [as_of(db=db, moment=backup.date) for backup in backups] == backups
+
+
+def test_record_versions_rejects_older_backups(tmp_path: Path) -> None:
+    backups = _build_backups()
+    db = open_versions(tmp_path / "versions.sqlite")
+    record_versions(db=db, backups=backups[1:])
+
+    with pytest.raises(OutOfOrderBackup):
+        record_versions(db=db, backups=backups[:1])
+
+
+def test_as_of_rejects_dates_without_time_zone(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db = open_versions(tmp_path / "versions.sqlite")
+    record_versions(db=db, backups=_build_backups())
+    monkeypatch.setattr(
+        "sys.argv",
+        ["as_of.py", "--path", "versions.sqlite", "--date", "2020-01-05T00:00:00"],
+    )
+
+    with pytest.raises(SystemExit):
+        parse_cli_argument()
+    with pytest.raises(ValueError, match="time zone"):
+        as_of(db=db, moment=datetime.datetime(2020, 1, 5))
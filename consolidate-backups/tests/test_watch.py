@@ -0,0 +1,290 @@
+import asyncio
+import datetime
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from src.cli.consolidate import DECISIONS_PATH, _LiveConsolidation, watch
+from src.domain import Decisions
+from src.io import read_backup_file
+from src.manifest import read_manifest, stat_file
+from src.watch import DirectoryWatcher
+from tests.helpers import (
+    build_activity,
+    build_backup,
+    build_completed_activity,
+    build_valid_backup,
+    write_backup,
+)
+
+PATTERNS = ("fitness-tracker__*.json",)
+
+
+def test_directory_watcher_waits_for_files_to_settle(tmp_path: Path) -> None:
+    watcher = DirectoryWatcher(directory=tmp_path, patterns=PATTERNS, settle_seconds=2)
+    path = tmp_path / "fitness-tracker__a.json"
+    path.write_text("{")
+    (tmp_path / "unrelated.json").write_text("{}")
+
+    assert watcher.scan(now=0) == []
+    path.write_text("{}")  # still being written
+    assert watcher.scan(now=1) == []
+    assert watcher.scan(now=2) == []
+    assert watcher.scan(now=3) == [path]
+    assert watcher.scan(now=10) == []  # reported once
+
+
+def test_directory_watcher_ignores_known_files(tmp_path: Path) -> None:
+    path = tmp_path / "fitness-tracker__a.json"
+    path.write_text("{}")
+    watcher = DirectoryWatcher(
+        directory=tmp_path,
+        patterns=PATTERNS,
+        known={path.name: stat_file(path)},
+        settle_seconds=0,
+    )
+
+    assert watcher.scan(now=0) == []
+    path.write_text('{"modified": true}')
+    assert watcher.scan(now=1) == [path]
+
+
+@pytest.mark.parametrize("use_inotify", (True, False))
+def test_directory_watcher_reports_new_files(tmp_path: Path, use_inotify: bool) -> None:
+    watcher = DirectoryWatcher(
+        directory=tmp_path,
+        patterns=PATTERNS,
+        settle_seconds=0.05,
+        poll_interval=0.05,
+        use_inotify=use_inotify,
+    )
+
+    async def first_change() -> list[Path]:
+        changes = watcher.changes()
+        pending = asyncio.ensure_future(anext(changes))
+        await asyncio.sleep(0.05)
+        (tmp_path / "fitness-tracker__a.json").write_text("{}")
+        try:
+            return await asyncio.wait_for(pending, timeout=5)
+        finally:
+            await changes.aclose()
+
+    assert asyncio.run(first_change()) == [tmp_path / "fitness-tracker__a.json"]
+
+
+def _consolidated_sources(directory: Path) -> list[str]:
+    manifest = read_manifest(directory=directory)
+    return list(manifest.sources) if manifest else []
+
+
+def test_live_consolidation_resyncs_from_settled_backups_only(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_valid_backup(date="2020-01-01 00:00:00+00:00"),
+    )
+    live = _LiveConsolidation(search_dir=backups_dir)
+    live.resync()
+
+    # lands while the decisions change, before the watcher saw it settle
+    partial = backups_dir / "fitness-tracker__backup_2.json"
+    partial.write_text('{"date": "2020-02-01')
+    live.resync()
+
+    assert _consolidated_sources(tmp_path) == ["fitness-tracker__backup_1.json"]
+
+    write_backup(partial, build_valid_backup(date="2020-02-01 00:00:00+00:00"))
+    live.add([partial])
+    live.flush()
+
+    assert _consolidated_sources(tmp_path) == [
+        "fitness-tracker__backup_1.json",
+        "fitness-tracker__backup_2.json",
+    ]
+
+
+def test_watch_keeps_watching_after_a_backup_fails_to_load(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    first = write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_valid_backup(date="2020-01-01 00:00:00+00:00"),
+    )
+
+    async def run() -> None:
+        task = asyncio.create_task(
+            watch(
+                search_dir=backups_dir,
+                settle_seconds=0.05,
+                poll_interval=0.05,
+                flush_interval=0.05,
+            )
+        )
+        while not _consolidated_sources(tmp_path):
+            await asyncio.sleep(0.05)
+
+        # consolidating again with it fails
+        first.write_text("{}")
+        await asyncio.sleep(0.5)
+        assert not task.done()
+
+        write_backup(
+            backups_dir / "fitness-tracker__backup_2.json",
+            build_valid_backup(date="2020-02-01 00:00:00+00:00"),
+        )
+        try:
+            while len(_consolidated_sources(tmp_path)) < 2:
+                await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    assert _consolidated_sources(tmp_path) == [
+        "fitness-tracker__backup_1.json",
+        "fitness-tracker__backup_2.json",
+    ]
+
+
+def test_watch_merges_new_backups_as_they_land(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_valid_backup(date="2020-01-01 00:00:00+00:00"),
+    )
+
+    async def run() -> None:
+        task = asyncio.create_task(
+            watch(
+                search_dir=backups_dir,
+                settle_seconds=0.05,
+                poll_interval=0.05,
+                flush_interval=0.05,
+            )
+        )
+        while _consolidated_sources(tmp_path) != ["fitness-tracker__backup_1.json"]:
+            await asyncio.sleep(0.05)
+
+        write_backup(
+            backups_dir / "fitness-tracker__backup_2.json",
+            build_valid_backup(date="2020-02-01 00:00:00+00:00"),
+        )
+        try:
+            while len(_consolidated_sources(tmp_path)) < 2:
+                await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    assert _consolidated_sources(tmp_path) == [
+        "fitness-tracker__backup_1.json",
+        "fitness-tracker__backup_2.json",
+    ]
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    consolidated = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    assert consolidated.date == datetime.datetime.fromisoformat(
+        "2020-02-01 00:00:00+00:00"
+    )
+
+
+def test_watch_keeps_the_database_in_sync_with_deletions(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    backups_dir = tmp_path / "backups"
+    backups_dir.mkdir()
+    sqlite_path = tmp_path / "db.sqlite"
+    kept = build_completed_activity(id="cpa_000001", activity_id="act_000001")
+    deleted = build_completed_activity(
+        id="cpa_000002",
+        activity_id="act_000002",
+        date=datetime.datetime.fromisoformat("2020-01-03 00:00:00+00:00"),
+    )
+    write_backup(
+        backups_dir / "fitness-tracker__backup_1.json",
+        build_backup(
+            date=datetime.datetime.fromisoformat("2020-01-04 00:00:00+00:00"),
+            activities=[
+                build_activity(id="act_000001"),
+                build_activity(id="act_000002"),
+            ],
+            completed_activities=[kept, deleted],
+        ),
+    )
+    with Decisions(decisions=[], path=DECISIONS_PATH) as decisions:
+        decisions.decide(
+            id=deleted.id,
+            reviewed_at=datetime.datetime.fromisoformat("2020-01-05 00:00:00+00:00"),
+            must_be_deleted=True,
+        )
+
+    def stored_ids(table: str) -> list[str]:
+        with sqlite3.connect(sqlite_path) as db:
+            return [id for (id,) in db.execute(f"SELECT id FROM {table} ORDER BY id")]
+
+    async def run() -> None:
+        task = asyncio.create_task(
+            watch(
+                search_dir=backups_dir,
+                settle_seconds=0.05,
+                poll_interval=0.05,
+                flush_interval=0.05,
+                sqlite_path=sqlite_path,
+            )
+        )
+        while not _consolidated_sources(tmp_path):
+            await asyncio.sleep(0.05)
+        assert stored_ids("completed_activities") == ["cpa_000001", "cpa_000002"]
+
+        write_backup(
+            backups_dir / "fitness-tracker__backup_2.json",
+            build_backup(
+                date=datetime.datetime.fromisoformat("2020-02-01 00:00:00+00:00"),
+                activities=[build_activity(id="act_000001")],
+                completed_activities=[kept],
+            ),
+        )
+        try:
+            while len(_consolidated_sources(tmp_path)) < 2:
+                await asyncio.sleep(0.05)
+        finally:
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+    manifest = read_manifest(directory=tmp_path)
+    assert manifest
+    consolidated = read_backup_file(path=tmp_path / manifest.consolidated_backup)
+    assert (
+        stored_ids("activities")
+        == [activity.id for activity in consolidated.activities]
+        == ["act_000001"]
+    )
+    assert (
+        stored_ids("completed_activities")
+        == [
+            completed_activity.id
+            for completed_activity in consolidated.completed_activities
+        ]
+        == ["cpa_000001"]
+    )